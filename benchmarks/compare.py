@@ -0,0 +1,51 @@
+import argparse
+import json
+from pathlib import Path
+from typing import Any
+from typing import Final
+
+
+def _key(result: dict[str, Any]) -> str:
+    parameters: Final = ", ".join(f"{name}={value}" for name, value in sorted(result["parameters"].items()))
+    return f"{result['group']}/{result['name']}({parameters})"
+
+
+def _load(path: Path) -> dict[str, dict[str, Any]]:
+    report: Final = json.loads(path.read_text(encoding="utf-8"))
+    return {_key(result): result for result in report["results"]}
+
+
+def main() -> None:
+    parser: Final = argparse.ArgumentParser(description="Compare two benchmark result files.")
+    parser.add_argument("baseline", type=Path)
+    parser.add_argument("candidate", type=Path)
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=1.10,
+        help="report a regression if the candidate's median is slower by at least this factor",
+    )
+    arguments: Final = parser.parse_args()
+
+    baseline: Final = _load(arguments.baseline)
+    candidate: Final = _load(arguments.candidate)
+    regressions = 0
+    for key in sorted(baseline.keys() & candidate.keys()):
+        ratio = candidate[key]["median"] / baseline[key]["median"]
+        marker = ""
+        if ratio >= arguments.threshold:
+            marker = "  REGRESSION"
+            regressions += 1
+        elif ratio <= 1 / arguments.threshold:
+            marker = "  improvement"
+        print(
+            f"{key:<70} {baseline[key]['median'] * 1e3:10.3f} ms -> {candidate[key]['median'] * 1e3:10.3f} ms"
+            + f"  x{ratio:.2f}{marker}"
+        )
+    for key in sorted(baseline.keys() - candidate.keys()):
+        print(f"{key:<70} missing in candidate")
+    raise SystemExit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
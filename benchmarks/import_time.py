@@ -0,0 +1,95 @@
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any
+from typing import Final
+from typing import NamedTuple
+from typing import final
+
+# Modules that must not be loaded by the execution-only import path.
+FORBIDDEN_MODULES: Final = (
+    "nassi_shneiderman_generator",
+    "nessi.diagram_generator",
+    "nessi.svg_generator",
+)
+
+
+@final
+class ImportSample(NamedTuple):
+    wall_seconds: float
+    cumulative_microseconds: dict[str, int]
+
+
+def _sample(statement: str) -> ImportSample:
+    start: Final = time.perf_counter()
+    completed: Final = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    wall_seconds: Final = time.perf_counter() - start
+    cumulative: dict[str, int] = {}
+    # Lines look like: "import time:       self [us] |  cumulative | imported package"
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        _, cumulative_part, module_part = line.removeprefix("import time:").split("|")
+        cumulative[module_part.strip()] = int(cumulative_part)
+    return ImportSample(wall_seconds, cumulative)
+
+
+def measure(module: str, *, repeat: int) -> dict[str, Any]:
+    samples: Final = [_sample(f"import {module}") for _ in range(repeat)]
+    interpreter_samples: Final = [_sample("pass") for _ in range(repeat)]
+    loaded_modules: Final = sorted(samples[0].cumulative_microseconds)
+    return {
+        "module": module,
+        "repeat": repeat,
+        "import_ms_median": statistics.median(sample.cumulative_microseconds[module] / 1e3 for sample in samples),
+        "process_ms_median": statistics.median(sample.wall_seconds * 1e3 for sample in samples),
+        "bare_interpreter_ms_median": statistics.median(sample.wall_seconds * 1e3 for sample in interpreter_samples),
+        "loaded_modules": loaded_modules,
+        "forbidden_modules_loaded": [
+            loaded
+            for loaded in loaded_modules
+            if any(loaded == forbidden or loaded.startswith(f"{forbidden}.") for forbidden in FORBIDDEN_MODULES)
+        ],
+    }
+
+
+def main() -> None:
+    parser: Final = argparse.ArgumentParser(
+        description="Measure the cold-start import time of the execution-only nessi modules."
+    )
+    parser.add_argument("--module", default="nessi.program", help="module to import")
+    parser.add_argument("--repeat", type=int, default=10, help="number of fresh interpreter processes")
+    parser.add_argument("--max-ms", type=float, help="fail if the median import time exceeds this value")
+    parser.add_argument("--output", type=Path, help="write the results as JSON to this file")
+    arguments: Final = parser.parse_args()
+
+    result: Final = measure(arguments.module, repeat=arguments.repeat)
+    print(f"import {result['module']}: {result['import_ms_median']:.2f} ms (median of {result['repeat']})")
+    print(
+        f"process start-up incl. import: {result['process_ms_median']:.2f} ms, "
+        + f"bare interpreter: {result['bare_interpreter_ms_median']:.2f} ms"
+    )
+    if arguments.output is not None:
+        arguments.output.write_text(json.dumps(result, indent=2) + "\n", encoding="utf-8")
+
+    failures: list[str] = []
+    if result["forbidden_modules_loaded"]:
+        failures.append(f"diagram modules were loaded: {', '.join(result['forbidden_modules_loaded'])}")
+    if arguments.max_ms is not None and result["import_ms_median"] > arguments.max_ms:
+        failures.append(f"median import time {result['import_ms_median']:.2f} ms exceeds {arguments.max_ms} ms")
+    for failure in failures:
+        print(f"FAILED: {failure}", file=sys.stderr)
+    raise SystemExit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
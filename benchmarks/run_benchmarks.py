@@ -0,0 +1,96 @@
+import argparse
+import gc
+import json
+import platform
+import statistics
+import sys
+import time
+from datetime import datetime
+from datetime import timezone
+from importlib.metadata import PackageNotFoundError
+from importlib.metadata import version
+from pathlib import Path
+from typing import Any
+from typing import Final
+
+from workloads import Workload
+from workloads import all_workloads
+
+QUICK_SIZES: Final = [10, 100]
+DEFAULT_SIZES: Final = [10, 100, 1_000]
+FULL_SIZES: Final = [10, 100, 1_000, 10_000]
+
+
+def _nessi_version() -> str:
+    try:
+        return version("nessi")
+    except PackageNotFoundError:
+        return "unknown"
+
+
+def measure(workload: Workload, *, repeat: int, warmup: int) -> dict[str, Any]:
+    for _ in range(warmup):
+        workload.prepare()()
+    timings_ns: list[int] = []
+    for _ in range(repeat):
+        function = workload.prepare()
+        gc.collect()
+        start = time.perf_counter_ns()
+        function()
+        timings_ns.append(time.perf_counter_ns() - start)
+    seconds: Final = [timing / 1e9 for timing in timings_ns]
+    return {
+        "name": workload.name,
+        "group": workload.group,
+        "parameters": workload.parameters,
+        "repeat": repeat,
+        "min": min(seconds),
+        "median": statistics.median(seconds),
+        "mean": statistics.fmean(seconds),
+        "stdev": statistics.stdev(seconds) if len(seconds) > 1 else 0.0,
+        "timings": seconds,
+    }
+
+
+def main() -> None:
+    parser: Final = argparse.ArgumentParser(description="Run the nessi benchmark suite.")
+    parser.add_argument("--output", type=Path, default=Path("benchmark_results.json"), help="JSON result file")
+    parser.add_argument("--repeat", type=int, default=5, help="measured repetitions per workload")
+    parser.add_argument("--warmup", type=int, default=1, help="unmeasured repetitions per workload")
+    parser.add_argument("--group", action="append", help="only run workloads of this group (repeatable)")
+    parser.add_argument("--filter", default="", help="only run workloads whose name contains this string")
+    size_group: Final = parser.add_mutually_exclusive_group()
+    size_group.add_argument("--quick", action="store_true", help=f"use input sizes {QUICK_SIZES}")
+    size_group.add_argument("--full", action="store_true", help=f"use input sizes {FULL_SIZES} (slow)")
+    size_group.add_argument("--sizes", type=int, nargs="+", help="explicit input sizes for scalable workloads")
+    arguments: Final = parser.parse_args()
+
+    sizes: Final = arguments.sizes or (
+        QUICK_SIZES if arguments.quick else FULL_SIZES if arguments.full else DEFAULT_SIZES
+    )
+    results: list[dict[str, Any]] = []
+    for workload in all_workloads(sizes):
+        if arguments.group and workload.group not in arguments.group:
+            continue
+        if arguments.filter not in workload.name:
+            continue
+        result = measure(workload, repeat=arguments.repeat, warmup=arguments.warmup)
+        results.append(result)
+        print(f"{workload.group:>13} {workload.name:<22} {workload.parameters!s:<28} {result['median'] * 1e3:12.3f} ms")
+
+    report: Final = {
+        "nessi_version": _nessi_version(),
+        "python_version": sys.version,
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "created": datetime.now(timezone.utc).isoformat(),
+        "sizes": sizes,
+        "results": results,
+    }
+    arguments.output.write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+    print(f"Results written to '{arguments.output}'.")
+
+
+if __name__ == "__main__":
+    main()
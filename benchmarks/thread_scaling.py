@@ -0,0 +1,92 @@
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Any
+from typing import Final
+
+from workloads import bubble_sort_program
+
+from nessi.batch import run_many
+from nessi.value import Value
+
+# Measures how the throughput of `run_many()` scales with the number of threads. On a
+# free-threaded interpreter (e.g. `python3.13t`), the speedup should grow with the number of
+# cores. With the GIL, all thread counts have about the same throughput.
+
+
+def _is_gil_enabled() -> bool:
+    is_gil_enabled: Final = getattr(sys, "_is_gil_enabled", None)
+    return True if is_gil_enabled is None else is_gil_enabled()
+
+
+def _default_thread_counts() -> list[int]:
+    cpu_count: Final = os.process_cpu_count() or 1
+    counts: Final = [1]
+    while counts[-1] * 2 <= cpu_count:
+        counts.append(counts[-1] * 2)
+    if counts[-1] != cpu_count:
+        counts.append(cpu_count)
+    return counts
+
+
+def measure(*, threads: int, runs: int, size: int, repeat: int) -> dict[str, Any]:
+    program: Final = bubble_sort_program()
+    generator: Final = random.Random(42)
+    input_sets: Final[list[dict[str, Value]]] = [
+        {"n": size, "numbers": [generator.randint(-1000, 1000) for _ in range(size)]} for _ in range(runs)
+    ]
+    timings: list[float] = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        outcomes = run_many(program, input_sets, workers=threads)
+        timings.append(time.perf_counter() - start)
+        failures = [outcome.error for outcome in outcomes if outcome.error is not None]
+        if failures:
+            raise RuntimeError(f"Benchmark program failed: {failures[0]}")
+    seconds: Final = min(timings)
+    return {"threads": threads, "seconds": seconds, "runs_per_second": runs / seconds}
+
+
+def main() -> None:
+    parser: Final = argparse.ArgumentParser(description="Measure multi-threaded scaling of nessi.batch.run_many().")
+    parser.add_argument("--threads", type=int, action="append", help="thread count to measure (repeatable)")
+    parser.add_argument("--runs", type=int, default=64, help="number of program runs per measurement")
+    parser.add_argument("--size", type=int, default=100, help="number of elements to sort per run")
+    parser.add_argument("--repeat", type=int, default=3, help="repetitions per thread count (the best is reported)")
+    parser.add_argument("--output", type=Path, help="write the results as JSON to this file")
+    arguments: Final = parser.parse_args()
+
+    is_gil_enabled: Final = _is_gil_enabled()
+    print(f"Python {platform.python_version()} ({sys.implementation.name}), GIL enabled: {is_gil_enabled}")
+    if is_gil_enabled:
+        print("Note: with the GIL, threads cannot run in parallel. Use a free-threaded build (e.g. python3.13t).")
+
+    results: Final[list[dict[str, Any]]] = []
+    for threads in arguments.threads or _default_thread_counts():
+        result = measure(threads=threads, runs=arguments.runs, size=arguments.size, repeat=arguments.repeat)
+        result["speedup"] = result["runs_per_second"] / (results[0] if results else result)["runs_per_second"]
+        results.append(result)
+        print(
+            f"  {threads:>3} thread(s): {result['runs_per_second']:10.1f} runs/s"
+            + f"  speedup {result['speedup']:5.2f}x  efficiency {result['speedup'] / threads:6.1%}"
+        )
+
+    if arguments.output is not None:
+        report: Final = {
+            "python": platform.python_version(),
+            "gil_enabled": is_gil_enabled,
+            "cpu_count": os.process_cpu_count(),
+            "runs": arguments.runs,
+            "size": arguments.size,
+            "results": results,
+        }
+        arguments.output.write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
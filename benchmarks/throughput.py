@@ -0,0 +1,84 @@
+import argparse
+import json
+import os
+import platform
+import time
+from collections.abc import Callable
+from pathlib import Path
+from typing import Final
+
+from workloads import array_statistics_program
+from workloads import binary_to_decimal_program
+from workloads import bubble_sort_program
+from workloads import running_sum_program
+
+from nessi.batch import run_jobs
+from nessi.input_generator import InputGenerator
+from nessi.input_generator import choices
+from nessi.input_generator import generate_jobs
+from nessi.input_generator import uniform_ints
+from nessi.program import Program
+
+# Measures the batch throughput (runs per second) for inputs that are generated from the
+# `Input` declarations of a program while the runs are executed, so that the number of runs
+# is not limited by memory.
+
+_PROGRAMS: Final[dict[str, Callable[[], Program]]] = {
+    "array_statistics": array_statistics_program,
+    "binary_to_decimal": binary_to_decimal_program,
+    "bubble_sort": bubble_sort_program,
+    "running_sum": running_sum_program,
+}
+
+
+def main() -> None:
+    parser: Final = argparse.ArgumentParser(description="Measure the batch throughput with generated inputs.")
+    parser.add_argument("--program", choices=sorted(_PROGRAMS), default="bubble_sort", help="program to run")
+    parser.add_argument("--runs", type=int, default=10_000, help="total number of runs")
+    parser.add_argument("--min-size", type=int, default=10, help="minimum array (and input stream) size")
+    parser.add_argument("--max-size", type=int, default=100, help="maximum array (and input stream) size")
+    parser.add_argument("--runs-per-job", type=int, default=100, help="number of runs per batch job")
+    parser.add_argument("--workers", type=int, help="number of workers (default: CPU count)")
+    parser.add_argument("--threads", action="store_true", help="run the workers as threads")
+    parser.add_argument("--seed", type=int, default=42, help="seed of the input generator")
+    parser.add_argument("--output", type=Path, help="write the results as JSON to this file")
+    arguments: Final = parser.parse_args()
+
+    program: Final = _PROGRAMS[arguments.program]()
+    generator: Final = InputGenerator(
+        program,
+        size=uniform_ints(arguments.min_size, arguments.max_size),
+        inputs={"binary": choices([0, 1])},
+        seed=arguments.seed,
+    )
+    jobs: Final = generate_jobs(program, iter(generator), arguments.runs, runs_per_job=arguments.runs_per_job)
+
+    start: Final = time.perf_counter()
+    runs = 0
+    failures = 0
+    for result in run_jobs(jobs, workers=arguments.workers, threads=arguments.threads):
+        runs += len(result.runs)
+        failures += sum(run.error is not None for run in result.runs)
+    seconds: Final = time.perf_counter() - start
+
+    print(f"Python {platform.python_version()}, {arguments.program}, sizes {arguments.min_size}-{arguments.max_size}")
+    print(f"  {runs} runs in {seconds:.2f} s: {runs / seconds:,.0f} runs/s ({failures} failed)")
+
+    if arguments.output is not None:
+        report: Final = {
+            "python": platform.python_version(),
+            "program": arguments.program,
+            "min_size": arguments.min_size,
+            "max_size": arguments.max_size,
+            "workers": arguments.workers or os.process_cpu_count(),
+            "threads": arguments.threads,
+            "runs": runs,
+            "failures": failures,
+            "seconds": seconds,
+            "runs_per_second": runs / seconds,
+        }
+        arguments.output.write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
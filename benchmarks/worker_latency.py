@@ -0,0 +1,111 @@
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any
+from typing import Final
+
+from workloads import binary_to_decimal_program
+
+from nessi.batch import Job
+from nessi.batch import job_to_json
+from nessi.worker_client import WorkerClient
+
+# Compares the latency of running one submission in a fresh Python process (`nessi batch`)
+# with sending it to a warm `nessi serve` worker over a new connection.
+
+
+def _job_line(size: int) -> str:
+    job: Final = Job("latency", binary_to_decimal_program(), [{"n": size, "binary": [1, 0] * (size // 2)}])
+    return json.dumps(job_to_json(job))
+
+
+def _cold_start(line: str) -> None:
+    subprocess.run(
+        [sys.executable, "-m", "nessi.cli", "batch", "--threads", "--workers", "1"],
+        input=line + "\n",
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+
+def _warm(socket_path: Path, line: str) -> None:
+    with WorkerClient(socket_path, timeout=10) as client:
+        client.run_json(line)
+
+
+def _wait_for_server(socket_path: Path, server: subprocess.Popen[bytes]) -> None:
+    deadline: Final = time.monotonic() + 30
+    while True:
+        try:
+            WorkerClient(socket_path, timeout=1).close()
+            return
+        except OSError:
+            if server.poll() is not None or time.monotonic() > deadline:
+                raise RuntimeError("The worker server did not start.")
+            time.sleep(0.05)
+
+
+def _latencies(run: Callable[[], None], requests: int) -> dict[str, float]:
+    milliseconds: Final[list[float]] = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        run()
+        milliseconds.append((time.perf_counter() - start) * 1e3)
+    milliseconds.sort()
+    return {
+        "median_ms": statistics.median(milliseconds),
+        "p95_ms": milliseconds[min(len(milliseconds) - 1, int(len(milliseconds) * 0.95))],
+        "min_ms": milliseconds[0],
+    }
+
+
+def main() -> None:
+    parser: Final = argparse.ArgumentParser(description="Compare cold-start and warm-worker latency.")
+    parser.add_argument("--requests", type=int, default=50, help="number of submissions per mode")
+    parser.add_argument("--size", type=int, default=16, help="number of bits of the binary_to_decimal input")
+    parser.add_argument("--workers", type=int, default=2, help="number of worker processes of the server")
+    parser.add_argument("--output", type=Path, help="write the results as JSON to this file")
+    arguments: Final = parser.parse_args()
+    line: Final = _job_line(arguments.size)
+
+    with tempfile.TemporaryDirectory() as directory:
+        socket_path: Final = Path(directory) / "nessi.sock"
+        server: Final = subprocess.Popen(
+            [sys.executable, "-m", "nessi.cli", "serve", str(socket_path), "--workers", str(arguments.workers)]
+        )
+        try:
+            _wait_for_server(socket_path, server)
+            warm: Final = _latencies(lambda: _warm(socket_path, line), arguments.requests)
+        finally:
+            server.terminate()
+            server.wait()
+    cold: Final = _latencies(lambda: _cold_start(line), arguments.requests)
+
+    print(f"Python {platform.python_version()}, {arguments.requests} submissions per mode")
+    for name, result in (("cold start", cold), ("warm worker", warm)):
+        print(f"  {name:>11}: median {result['median_ms']:8.2f} ms  p95 {result['p95_ms']:8.2f} ms")
+    speedup: Final = cold["median_ms"] / warm["median_ms"]
+    print(f"  speedup (median): {speedup:.1f}x")
+
+    if arguments.output is not None:
+        report: Final[dict[str, Any]] = {
+            "python": platform.python_version(),
+            "requests": arguments.requests,
+            "size": arguments.size,
+            "cold_start": cold,
+            "warm_worker": warm,
+            "speedup": speedup,
+        }
+        arguments.output.write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
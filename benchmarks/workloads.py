@@ -0,0 +1,342 @@
+import copy
+import random
+from collections.abc import Callable
+from collections.abc import Iterator
+from typing import Final
+from typing import NamedTuple
+from typing import final
+
+from nessi.array_type import ArrayType
+from nessi.expressions import Bool
+from nessi.expressions import Expression
+from nessi.expressions import Integer
+from nessi.expressions import Variable
+from nessi.interpolated_string import InterpolatedString
+from nessi.program import Program
+from nessi.statement_visitor import Statement
+from nessi.statements import Assign
+from nessi.statements import Break
+from nessi.statements import If
+from nessi.statements import Input
+from nessi.statements import Match
+from nessi.statements import MatchArm
+from nessi.statements import Print
+from nessi.statements import RelativeOperator
+from nessi.statements import While
+from nessi.value import Value
+
+_SEED: Final = 42
+
+
+@final
+class Workload(NamedTuple):
+    name: str
+    group: str
+    parameters: dict[str, int]
+    # Called before every measured repetition. Returns the callable that is timed, so that
+    # per-repetition setup (e.g. copying inputs that the interpreter mutates) is not measured.
+    prepare: Callable[[], Callable[[], object]]
+
+
+def _run(program: Program, input_values: dict[str, Value]) -> Callable[[], Callable[[], object]]:
+    def prepare() -> Callable[[], object]:
+        fresh_input_values: Final = copy.deepcopy(input_values)
+        return lambda: program.run(fresh_input_values)
+
+    return prepare
+
+
+def _random_numbers(n: int) -> list[int]:
+    generator: Final = random.Random(_SEED)
+    return [generator.randrange(1_000_000) for _ in range(n)]
+
+
+def binary_to_decimal_program() -> Program:
+    return Program(
+        [
+            Input("n", int),
+            Input("binary", ArrayType(int, "n")),
+            Assign("decimal", 0),
+            Assign("power_of_2", 1),
+            Assign("i", Variable("n") - 1),
+            While(Variable("i") >= 0).Repeat(
+                Assign(
+                    "decimal",
+                    Variable("decimal") + Variable("binary")[Variable("i")] * Variable("power_of_2"),
+                ),
+                Assign("power_of_2", Variable("power_of_2") * 2),
+                Assign("i", Variable("i") - 1),
+            ),
+            Print("Die Dezimalzahl ist {decimal}."),
+        ]
+    )
+
+
+def running_sum_program() -> Program:
+    return Program(
+        [
+            Assign("sum", 0.0),
+            Assign("count", 0),
+            Input("number", float),
+            While(Variable("number") >= 0).Repeat(
+                Assign("sum", Variable("sum") + Variable("number")),
+                Assign("count", Variable("count") + 1),
+                Input("number", float),
+            ),
+            Print("{sum}, {count}"),
+        ]
+    )
+
+
+def array_assign_program(n: int) -> Program:
+    return Program(
+        [
+            Input("numbers", ArrayType(int, n)),
+            Input("index", int),
+            Input("value", int),
+            Assign(Variable("numbers")[Variable("index")], Variable("value")),
+            Assign("i", 0),
+            While(Variable("i") < n).Repeat(
+                Print("{numbers[i]}"),
+                Assign("i", Variable("i") + 1),
+            ),
+        ]
+    )
+
+
+def bubble_sort_program() -> Program:
+    return Program(
+        [
+            Input("n", int),
+            Input("numbers", ArrayType(int, "n")),
+            Assign("i", 0),
+            While(Variable("i") < Variable("n") - 1, label="Schleife").Repeat(
+                Assign("j", 0),
+                Assign("did_swap", False),
+                While(Variable("j") < Variable("n") - Variable("i") - 1).Repeat(
+                    If(Variable("numbers")[Variable("j")] > Variable("numbers")[Variable("j") + 1]).Then(
+                        Assign("temp", Variable("numbers")[Variable("j")]),
+                        Assign(Variable("numbers")[Variable("j")], Variable("numbers")[Variable("j") + 1]),
+                        Assign(Variable("numbers")[Variable("j") + 1], Variable("temp")),
+                        Assign("did_swap", True),
+                    ),
+                    Assign("j", Variable("j") + 1),
+                ),
+                If(Variable("did_swap") == Bool(False)).Then(
+                    Break(label="Schleife"),
+                ),
+                Assign("i", Variable("i") + 1),
+            ),
+            Assign("i", 0),
+            While(Variable("i") < Variable("n")).Repeat(
+                Print("{numbers[i]}"),
+                Assign("i", Variable("i") + 1),
+            ),
+        ]
+    )
+
+
+def array_statistics_program() -> Program:
+    return Program(
+        [
+            Input("n", int),
+            Input("numbers", ArrayType(int, "n")),
+            Assign("sum", 0),
+            Assign("maximum", Variable("numbers")[Integer(0)]),
+            Assign("i", 0),
+            While(Variable("i") < Variable("n")).Repeat(
+                Assign("sum", Variable("sum") + Variable("numbers")[Variable("i")]),
+                If(Variable("numbers")[Variable("i")] > Variable("maximum")).Then(
+                    Assign("maximum", Variable("numbers")[Variable("i")]),
+                ),
+                Assign("i", Variable("i") + 1),
+            ),
+            Print("{sum}, {maximum}"),
+        ]
+    )
+
+
+def print_heavy_program() -> Program:
+    return Program(
+        [
+            Input("n", int),
+            Input("numbers", ArrayType(int, "n")),
+            Assign("i", 0),
+            While(Variable("i") < Variable("n")).Repeat(
+                Print("Element {i} von {n}: {numbers[i]}"),
+                Assign("i", Variable("i") + 1),
+            ),
+        ]
+    )
+
+
+def deep_nesting_program(depth: int) -> Program:
+    # A counting loop whose body is a chain of `depth` nested conditionals that are all taken.
+    body: Statement = Assign("hits", Variable("hits") + 1)
+    for level in range(depth):
+        body = If(Variable("i") >= level - depth).Then(body).Else(Assign("misses", Variable("misses") + 1))
+    return Program(
+        [
+            Input("n", int),
+            Assign("hits", 0),
+            Assign("misses", 0),
+            Assign("i", 0),
+            While(Variable("i") < Variable("n")).Repeat(
+                body,
+                Assign("i", Variable("i") + 1),
+            ),
+            Print("{hits}, {misses}"),
+        ]
+    )
+
+
+def many_arm_match_program(arms: int) -> Program:
+    return Program(
+        [
+            Input("n", int),
+            Assign("total", 0),
+            Assign("i", 0),
+            While(Variable("i") < Variable("n")).Repeat(
+                Match(
+                    Variable("i") % arms,
+                    [
+                        MatchArm(RelativeOperator.EQUALS, Integer(arm), Assign("total", Variable("total") + arm))
+                        for arm in range(arms)
+                    ],
+                ),
+                Assign("i", Variable("i") + 1),
+            ),
+            Print("{total}"),
+        ]
+    )
+
+
+def _deep_expression(depth: int) -> Expression:
+    expression: Expression = Variable("x")
+    for i in range(depth):
+        expression = (expression + Variable("y")) * 3 - i if i % 2 == 0 else expression % 1_000_003 + Variable("x")
+    return expression
+
+
+def interpreter_workloads(sizes: list[int]) -> Iterator[Workload]:
+    for n in sizes:
+        yield Workload(
+            "binary_to_decimal",
+            "interpreter",
+            {"n": n},
+            _run(binary_to_decimal_program(), {"n": n, "binary": [bit % 2 for bit in _random_numbers(n)]}),
+        )
+        yield Workload(
+            "running_sum",
+            "interpreter",
+            {"n": n},
+            _run(running_sum_program(), {"number": [float(number) for number in _random_numbers(n)] + [-1.0]}),
+        )
+        yield Workload(
+            "array_assign",
+            "interpreter",
+            {"n": n},
+            _run(array_assign_program(n), {"numbers": _random_numbers(n), "index": n // 2, "value": -1}),
+        )
+        yield Workload(
+            "bubble_sort",
+            "interpreter",
+            {"n": n},
+            _run(bubble_sort_program(), {"n": n, "numbers": _random_numbers(n)}),
+        )
+        yield Workload(
+            "array_statistics",
+            "interpreter",
+            {"n": n},
+            _run(array_statistics_program(), {"n": n, "numbers": _random_numbers(n)}),
+        )
+        yield Workload(
+            "print_heavy",
+            "interpreter",
+            {"n": n},
+            _run(print_heavy_program(), {"n": n, "numbers": _random_numbers(n)}),
+        )
+    for depth in (1, 8, 32):
+        yield Workload(
+            "deep_nesting",
+            "interpreter",
+            {"depth": depth, "n": 1_000},
+            _run(deep_nesting_program(depth), {"n": 1_000}),
+        )
+    for arms in (2, 10, 50):
+        yield Workload(
+            "many_arm_match",
+            "interpreter",
+            {"arms": arms, "n": 1_000},
+            _run(many_arm_match_program(arms), {"n": 1_000}),
+        )
+
+
+def expression_workloads() -> Iterator[Workload]:
+    for depth in (10, 50, 150):
+        expression = _deep_expression(depth)
+        context: dict[str, Value] = {"x": 7, "y": 11}
+        yield Workload(
+            "expression_evaluate",
+            "expressions",
+            {"depth": depth},
+            lambda expression=expression, context=context: lambda: expression.evaluate(context),
+        )
+        yield Workload(
+            "expression_to_latex",
+            "expressions",
+            {"depth": depth},
+            lambda expression=expression: expression.to_latex,
+        )
+
+
+def interpolation_workloads() -> Iterator[Workload]:
+    for placeholders in (1, 10, 100):
+        values: dict[str, Value] = {f"v{i}": i for i in range(placeholders)}
+        values["numbers"] = list(range(placeholders))
+        values["k"] = placeholders // 2
+        text = " ".join(f"{{v{i}}} und {{numbers[k]}}" for i in range(placeholders))
+        string = InterpolatedString(text)
+        yield Workload(
+            "interpolate",
+            "interpolation",
+            {"placeholders": placeholders},
+            lambda string=string, values=values: lambda: string.interpolate(values),
+        )
+
+
+def _wide_program(statements: int) -> Program:
+    return Program(
+        [
+            Input("n", int),
+            *(
+                If(Variable("n") > i).Then(Assign(f"value_{i}", Variable("n") * i)).Else(Print(f"{{n}} <= {i}"))
+                for i in range(statements)
+            ),
+        ]
+    )
+
+
+def diagram_workloads() -> Iterator[Workload]:
+    programs: Final = [
+        ("bubble_sort", 1, bubble_sort_program()),
+        ("deep_nesting", 32, deep_nesting_program(32)),
+        ("wide", 100, _wide_program(100)),
+        ("wide", 1_000, _wide_program(1_000)),
+    ]
+    for name, size, program in programs:
+        yield Workload(f"diagram_{name}", "diagrams", {"size": size}, lambda program=program: program.generate_diagram)
+        yield Workload(
+            f"latex_{name}",
+            "diagrams",
+            {"size": size},
+            lambda program=program: program.generate_diagram().emit,
+        )
+        yield Workload(f"svg_{name}", "diagrams", {"size": size}, lambda program=program: program.generate_svg)
+
+
+def all_workloads(sizes: list[int]) -> Iterator[Workload]:
+    yield from interpreter_workloads(sizes)
+    yield from expression_workloads()
+    yield from interpolation_workloads()
+    yield from diagram_workloads()
@@ -0,0 +1,178 @@
+from collections.abc import Iterator
+from typing import Final
+from typing import Optional
+
+from nessi.expressions import ArrayElement
+from nessi.expressions import BinaryExpression
+from nessi.expressions import Expression
+from nessi.expressions import Integer
+from nessi.expressions import Operator
+from nessi.expressions import Variable
+from nessi.statement_visitor import Statement
+from nessi.statements import Assign
+from nessi.statements import Block
+from nessi.statements import Break
+from nessi.statements import Do
+from nessi.statements import DocumentedBlock
+from nessi.statements import If
+from nessi.statements import Input
+from nessi.statements import Loop
+from nessi.statements import Match
+from nessi.statements import While
+
+# `a > b` is `b < a`, ...
+FLIPPED_COMPARISONS: Final = {
+    Operator.GREATER_THAN: Operator.LESS_THAN,
+    Operator.LESS_THAN: Operator.GREATER_THAN,
+    Operator.GREATER_THAN_OR_EQUAL: Operator.LESS_THAN_OR_EQUAL,
+    Operator.LESS_THAN_OR_EQUAL: Operator.GREATER_THAN_OR_EQUAL,
+}
+
+
+def expression_children(expression: Expression) -> list[Expression]:
+    match expression:
+        case BinaryExpression():
+            return [expression.left, expression.right]
+        case ArrayElement():
+            return [expression.index]
+        case _:
+            return []
+
+
+def walk_expression(expression: Expression) -> Iterator[Expression]:
+    # Pre-order traversal of an expression and all of its sub-expressions.
+    yield expression
+    for child in expression_children(expression):
+        yield from walk_expression(child)
+
+
+def expression_variables(expression: Expression) -> set[str]:
+    # All variables (including arrays) whose values the expression depends on.
+    variables: Final[set[str]] = set()
+    for sub_expression in walk_expression(expression):
+        match sub_expression:
+            case Variable():
+                variables.add(sub_expression.name)
+            case ArrayElement():
+                variables.add(sub_expression.array_name)
+    return variables
+
+
+def reads_array_element(expression: Expression) -> bool:
+    return any(isinstance(sub_expression, ArrayElement) for sub_expression in walk_expression(expression))
+
+
+def statement_expressions(statement: Statement) -> list[Expression]:
+    # The expressions that are evaluated by the statement itself, excluding nested statements.
+    match statement:
+        case Assign():
+            if isinstance(statement.target, ArrayElement):
+                return [statement.value, statement.target.index]
+            return [statement.value]
+        case If() | While():
+            return [statement.condition]
+        case Do():
+            return [] if statement.condition is None else [statement.condition]
+        case Match():
+            return [statement.value, *(arm.condition for arm in statement.arms)]
+        case _:
+            return []
+
+
+def child_blocks(statement: Statement) -> list[Block]:
+    match statement:
+        case If():
+            return [statement.then_block, statement.else_block]
+        case While() | Do() | Loop():
+            return [statement.body]
+        case DocumentedBlock():
+            return [statement.block]
+        case Match():
+            return [arm.body for arm in statement.arms]
+        case _:
+            return []
+
+
+def walk_statements(block: Block) -> Iterator[Statement]:
+    # Pre-order traversal of all statements in the block, including nested ones.
+    for statement in block:
+        yield statement
+        for child_block in child_blocks(statement):
+            yield from walk_statements(child_block)
+
+
+def statement_ids(block: Block) -> dict[Statement, int]:
+    # Numbers the statements of the block in the order of `walk_statements()`, e.g. to refer
+    # to them in traces and coverage data.
+    ids: Final[dict[Statement, int]] = {}
+    for statement in walk_statements(block):
+        ids.setdefault(statement, len(ids))
+    return ids
+
+
+def assigned_variables(block: Block) -> set[str]:
+    # All variables that are (re-)bound anywhere in the block. Writes to array elements
+    # don't rebind the array variable and are reported by `writes_array_elements()`.
+    variables: Final[set[str]] = set()
+    for statement in walk_statements(block):
+        match statement:
+            case Assign(target=str() as target):
+                variables.add(target)
+            case Input():
+                variables.add(statement.target)
+    return variables
+
+
+def definitely_assigned_variables(block: Block) -> set[str]:
+    # The variables that are bound whenever the block runs to its end, i.e. without an error
+    # and without breaking out of it.
+    variables: Final[set[str]] = set()
+    for statement in block:
+        match statement:
+            case Assign(target=str() as target):
+                variables.add(target)
+            case Input():
+                variables.add(statement.target)
+            case If():
+                variables.update(
+                    definitely_assigned_variables(statement.then_block)
+                    & definitely_assigned_variables(statement.else_block)
+                )
+            case DocumentedBlock():
+                variables.update(definitely_assigned_variables(statement.block))
+            case Match() if statement.arms:
+                variables.update(set.intersection(*(definitely_assigned_variables(arm.body) for arm in statement.arms)))
+            case Do() if not contains_break(statement.body):
+                # A `While` body may not run at all and a `Loop` is only left by a break.
+                variables.update(definitely_assigned_variables(statement.body))
+    return variables
+
+
+def writes_array_elements(block: Block) -> bool:
+    return any(
+        isinstance(statement, Assign) and isinstance(statement.target, ArrayElement)
+        for statement in walk_statements(block)
+    )
+
+
+def contains_break(block: Block) -> bool:
+    return any(isinstance(statement, Break) for statement in walk_statements(block))
+
+
+def offset_step(induction: str, value: Expression) -> Optional[int]:
+    # The step of an increment `induction + step` (or `step + induction`, `induction - step`).
+    match value:
+        case BinaryExpression(left=Variable(name=name), operator=Operator.ADD, right=Integer(value=step)) if (
+            name == induction
+        ):
+            return step if step > 0 else None
+        case BinaryExpression(left=Integer(value=step), operator=Operator.ADD, right=Variable(name=name)) if (
+            name == induction
+        ):
+            return step if step > 0 else None
+        case BinaryExpression(left=Variable(name=name), operator=Operator.SUBTRACT, right=Integer(value=step)) if (
+            name == induction
+        ):
+            return -step if step > 0 else None
+        case _:
+            return None
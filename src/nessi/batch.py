@@ -0,0 +1,501 @@
+import hashlib
+import itertools
+import json
+import os
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from collections.abc import Callable
+from collections.abc import Iterable
+from collections.abc import Iterator
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import Executor
+from concurrent.futures import Future
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
+from typing import Any
+from typing import Final
+from typing import NamedTuple
+from typing import Optional
+from typing import final
+
+from nessi.canonical import CanonicalProgram
+from nessi.canonical import canonicalize
+from nessi.canonical import may_contain_canonical_names
+from nessi.metrics import BATCH_JOB_ERRORS
+from nessi.metrics import BATCH_JOBS
+from nessi.metrics import record_cache_lookup
+from nessi.metrics import record_run
+from nessi.output import encoded_length
+from nessi.program import Program
+from nessi.program_cache import ProgramCache
+from nessi.serialization import Json
+from nessi.serialization import SerializationError
+from nessi.serialization import deserialize_block
+from nessi.serialization import serialize_block
+from nessi.value import Value
+
+DIAGRAM_FORMATS: Final = ("latex", "svg")
+
+
+@final
+class Job(NamedTuple):
+    id: str
+    program: Program
+    input_sets: list[dict[str, Value]]
+    fuel: Optional[int] = None
+    time_limit: Optional[float] = None
+    diagram_format: Optional[str] = None
+    max_output_bytes: Optional[int] = None
+    memory_limit: Optional[int] = None
+
+
+@final
+class RunOutcome(NamedTuple):
+    output: Optional[str]
+    error: Optional[str]
+    statements_executed: int
+    seconds: float
+    # The approximate peak memory of runs with a memory limit, the memory at the end otherwise.
+    memory_used: int = 0
+
+
+@final
+class JobResult(NamedTuple):
+    id: str
+    runs: list[RunOutcome]
+    diagram: Optional[str] = None
+    error: Optional[str] = None
+
+
+def _describe_error(error: Exception) -> str:
+    return f"{type(error).__name__}: {error}"
+
+
+def _render_diagram(program: Program, diagram_format: str) -> str:
+    match diagram_format:
+        case "latex":
+            return program.generate_diagram().emit()
+        case "svg":
+            return program.generate_svg()
+        case _:
+            raise ValueError(f"Unknown diagram format '{diagram_format}'.")
+
+
+def run_once(
+    program: Program,
+    input_values: dict[str, Value],
+    *,
+    fuel: Optional[int] = None,
+    time_limit: Optional[float] = None,
+    max_output_bytes: Optional[int] = None,
+    memory_limit: Optional[int] = None,
+) -> RunOutcome:
+    start: Final = time.perf_counter()
+    result, error = program.try_execute(
+        input_values,
+        fuel=fuel,
+        time_limit=time_limit,
+        max_output_bytes=max_output_bytes,
+        memory_limit=memory_limit,
+    )
+    # Failed runs keep their output and executed statements up to the error.
+    return RunOutcome(
+        result.output,
+        None if error is None else _describe_error(error),
+        result.statements_executed,
+        time.perf_counter() - start,
+        result.memory_used if result.peak_memory is None else result.peak_memory,
+    )
+
+
+# Errors that depend on the load of the machine rather than on the program and its inputs.
+_TRANSIENT_ERRORS: Final = ("TimeLimitExceededError:", "MemoryError:")
+
+
+@final
+class ExecutionCache:
+    # Serves runs of programs that are equal up to the names of their variables and labels,
+    # their docstrings and their diagram settings (see `nessi.canonical`), e.g. many
+    # submissions of the same solution, from the outcome of one run with the same inputs and
+    # limits. Runs that exceeded their time limit or ran out of memory are not cached.
+    #
+    # The cache holds the `max_entries` most recently used outcomes in memory. Pickled caches
+    # (e.g. as part of a `JsonJobRunner`) refer to one cache per worker process. With a
+    # `program_cache`, the canonical programs are prepared by it (see `ProgramCache.load()`).
+    def __init__(self, max_entries: int = 4096, *, program_cache: Optional[ProgramCache] = None) -> None:
+        self._id: Final = (os.getpid(), next(_execution_cache_ids))
+        self._max_entries: Final = max_entries
+        self._program_cache: Final = program_cache
+        self._outcomes: Final[OrderedDict[tuple[object, ...], RunOutcome]] = OrderedDict()
+        # The canonical form of programs and the program that runs it.
+        self._canonical_programs: Final[weakref.WeakKeyDictionary[Program, tuple[CanonicalProgram, Program]]] = (
+            weakref.WeakKeyDictionary()
+        )
+        self._lock: Final = threading.Lock()
+
+    def __reduce__(self) -> tuple[object, ...]:
+        return _process_execution_cache, (self._id, self._max_entries, self._program_cache)
+
+    def __len__(self) -> int:
+        return len(self._outcomes)
+
+    def _canonicalize(self, program: Program) -> tuple[CanonicalProgram, Program]:
+        with self._lock:
+            entry = self._canonical_programs.get(program)
+        if entry is None:
+            canonical: Final = canonicalize(program)
+            prepared: Final = (
+                canonical.program if self._program_cache is None else self._program_cache.load(canonical.program)
+            )
+            entry = canonical, prepared
+            with self._lock:
+                self._canonical_programs[program] = entry
+        return entry
+
+    def run(
+        self,
+        program: Program,
+        input_values: dict[str, Value],
+        *,
+        fuel: Optional[int] = None,
+        time_limit: Optional[float] = None,
+        max_output_bytes: Optional[int] = None,
+        memory_limit: Optional[int] = None,
+    ) -> RunOutcome:
+        # Like `run_once()`.
+        limits: Final = {
+            "fuel": fuel,
+            "time_limit": time_limit,
+            "max_output_bytes": max_output_bytes,
+            "memory_limit": memory_limit,
+        }
+        if any(may_contain_canonical_names(value) for value in input_values.values()):
+            # The names in the output and in error messages could not be mapped back.
+            return run_once(program, input_values, **limits)
+        start: Final = time.perf_counter()
+        canonical, prepared = self._canonicalize(program)
+        canonical_inputs: Final = canonical.canonical_inputs(input_values)
+        inputs_hash: Final = hashlib.sha256(
+            json.dumps(canonical_inputs, sort_keys=True, separators=(",", ":"), default=list).encode()
+        ).hexdigest()
+        key: Final = (canonical.hash, inputs_hash, fuel, time_limit, max_output_bytes, memory_limit)
+        with self._lock:
+            outcome = self._outcomes.get(key)
+            if outcome is not None:
+                self._outcomes.move_to_end(key)
+        record_cache_lookup("executions", outcome is not None)
+        if outcome is None:
+            outcome = run_once(prepared, canonical_inputs, **limits)
+            if outcome.error is None or not outcome.error.startswith(_TRANSIENT_ERRORS):
+                with self._lock:
+                    self._outcomes[key] = outcome
+                    while len(self._outcomes) > self._max_entries:
+                        self._outcomes.popitem(last=False)
+        return outcome._replace(
+            output=None if outcome.output is None else canonical.restore_output(outcome.output),
+            error=None if outcome.error is None else canonical.restore_message(outcome.error),
+            seconds=time.perf_counter() - start,
+        )
+
+
+_execution_cache_ids: Final = itertools.count()
+# The caches of this process by the id of the cache they were pickled from.
+_execution_caches: Final[dict[tuple[int, int], ExecutionCache]] = {}
+_execution_caches_lock: Final = threading.Lock()
+
+
+def _process_execution_cache(
+    id_: tuple[int, int],
+    max_entries: int,
+    program_cache: Optional[ProgramCache],
+) -> ExecutionCache:
+    with _execution_caches_lock:
+        cache = _execution_caches.get(id_)
+        if cache is None:
+            cache = _execution_caches[id_] = ExecutionCache(max_entries, program_cache=program_cache)
+        return cache
+
+
+def run_job(job: Job, execution_cache: Optional[ExecutionCache] = None) -> JobResult:
+    run: Final = run_once if execution_cache is None else execution_cache.run
+    runs: Final = [
+        run(
+            job.program,
+            input_values,
+            fuel=job.fuel,
+            time_limit=job.time_limit,
+            max_output_bytes=job.max_output_bytes,
+            memory_limit=job.memory_limit,
+        )
+        for input_values in job.input_sets
+    ]
+    if job.diagram_format is None:
+        return JobResult(job.id, runs)
+    try:
+        return JobResult(job.id, runs, diagram=_render_diagram(job.program, job.diagram_format))
+    except Exception as error:
+        return JobResult(job.id, runs, error=f"Diagram rendering failed: {_describe_error(error)}")
+
+
+def record_job_result(result: JobResult, *, runs: bool = True) -> None:
+    # Records a finished job in `nessi.metrics`. Its runs are only recorded with `runs=True`,
+    # i.e. if they ran in another process (`Program.execute()` records them otherwise).
+    BATCH_JOBS.inc()
+    if result.error is not None:
+        BATCH_JOB_ERRORS.inc()
+    if runs:
+        for run in result.runs:
+            record_run(
+                run.seconds,
+                run.statements_executed,
+                0 if run.output is None else encoded_length(run.output),
+                None if run.error is None else run.error.partition(":")[0],
+            )
+
+
+def _recorded(results: Iterator[JobResult], *, runs: bool) -> Iterator[JobResult]:
+    for result in results:
+        record_job_result(result, runs=runs)
+        yield result
+
+
+def job_from_json(
+    data: Json,
+    *,
+    default_id: str,
+    default_fuel: Optional[int] = None,
+    default_time_limit: Optional[float] = None,
+    default_diagram_format: Optional[str] = None,
+    default_max_output_bytes: Optional[int] = None,
+    default_memory_limit: Optional[int] = None,
+) -> Job:
+    # Expected format:
+    #   {"id": "...", "program": [<statements>], "inputs": [{<input values>}, ...],
+    #    "fuel": 100000, "time_limit": 1.5, "diagram": "latex" | "svg", "max_output_bytes": 65536,
+    #    "memory_limit": 67108864}
+    # All keys except "program" are optional.
+    if not isinstance(data, dict):
+        raise SerializationError(f"expected a job object, got {data!r}")
+    input_sets: Final = data.get("inputs", [{}])
+    if not isinstance(input_sets, list) or not all(isinstance(input_values, dict) for input_values in input_sets):
+        raise SerializationError("'inputs' must be a list of objects")
+    diagram_format: Final = data.get("diagram", default_diagram_format)
+    if diagram_format is not None and diagram_format not in DIAGRAM_FORMATS:
+        raise SerializationError(f"unknown diagram format {diagram_format!r}")
+    return Job(
+        id=str(data.get("id", default_id)),
+        program=Program(deserialize_block(data.get("program"))),
+        input_sets=input_sets,
+        fuel=data.get("fuel", default_fuel),
+        time_limit=data.get("time_limit", default_time_limit),
+        diagram_format=diagram_format,
+        max_output_bytes=data.get("max_output_bytes", default_max_output_bytes),
+        memory_limit=data.get("memory_limit", default_memory_limit),
+    )
+
+
+def job_to_json(job: Job) -> Json:
+    data: Final[dict[str, Any]] = {
+        "id": job.id,
+        "program": serialize_block(job.program.statements),
+        "inputs": job.input_sets,
+    }
+    for key, value in (
+        ("fuel", job.fuel),
+        ("time_limit", job.time_limit),
+        ("diagram", job.diagram_format),
+        ("max_output_bytes", job.max_output_bytes),
+        ("memory_limit", job.memory_limit),
+    ):
+        if value is not None:
+            data[key] = value
+    return data
+
+
+def job_result_to_json(result: JobResult) -> Json:
+    data: Final[dict[str, Any]] = {
+        "id": result.id,
+        "results": [run._asdict() for run in result.runs],
+    }
+    if result.diagram is not None:
+        data["diagram"] = result.diagram
+    if result.error is not None:
+        data["error"] = result.error
+    return data
+
+
+def job_result_from_json(data: Json) -> JobResult:
+    if not isinstance(data, dict) or not isinstance(data.get("results"), list):
+        raise SerializationError(f"expected a job result object, got {data!r}")
+    return JobResult(
+        str(data.get("id")),
+        [RunOutcome(**run) for run in data["results"]],
+        diagram=data.get("diagram"),
+        error=data.get("error"),
+    )
+
+
+@final
+class JsonJobRunner:
+    # Parses and runs one JSONL job line. Parsing happens inside the worker processes, so
+    # that the main process only has to shuffle strings around.
+    def __init__(
+        self,
+        *,
+        fuel: Optional[int] = None,
+        time_limit: Optional[float] = None,
+        diagram_format: Optional[str] = None,
+        max_output_bytes: Optional[int] = None,
+        memory_limit: Optional[int] = None,
+        program_cache: Optional[ProgramCache] = None,
+        execution_cache: Optional[ExecutionCache] = None,
+    ) -> None:
+        # With a `program_cache`, programs are validated and their compiled loops are shared
+        # with all processes that use the same cache directory. With an `execution_cache`,
+        # runs of equivalent programs are shared (its own program cache prepares them).
+        self._fuel = fuel
+        self._time_limit = time_limit
+        self._diagram_format = diagram_format
+        self._max_output_bytes = max_output_bytes
+        self._memory_limit = memory_limit
+        self._program_cache = program_cache
+        self._execution_cache = execution_cache
+
+    def __call__(self, numbered_line: tuple[int, str]) -> str:
+        line_number, line = numbered_line
+        try:
+            data = json.loads(line)
+        except ValueError as error:
+            return JsonJobRunner._error_line(str(line_number), error)
+        job_id: Final = str(data.get("id", line_number)) if isinstance(data, dict) else str(line_number)
+        try:
+            job = job_from_json(
+                data,
+                default_id=job_id,
+                default_fuel=self._fuel,
+                default_time_limit=self._time_limit,
+                default_diagram_format=self._diagram_format,
+                default_max_output_bytes=self._max_output_bytes,
+                default_memory_limit=self._memory_limit,
+            )
+        except (ValueError, TypeError) as error:
+            return JsonJobRunner._error_line(job_id, error)
+        if self._execution_cache is not None:
+            return json.dumps(job_result_to_json(run_job(job, self._execution_cache)))
+        if self._program_cache is not None:
+            job = job._replace(program=self._program_cache.load(job.program))
+        return json.dumps(job_result_to_json(run_job(job)))
+
+    @staticmethod
+    def _error_line(job_id: str, error: Exception) -> str:
+        return json.dumps(job_result_to_json(JobResult(job_id, [], error=_describe_error(error))))
+
+
+def _map_unordered[T, R](
+    function: Callable[[T], R],
+    items: Iterable[T],
+    *,
+    workers: Optional[int],
+    max_pending: Optional[int],
+    threads: bool = False,
+) -> Iterator[R]:
+    # Like `Executor.map()`, but yields results in completion order and consumes `items`
+    # lazily, so that arbitrarily long job streams can be processed in bounded memory.
+    worker_count: Final = workers if workers is not None else os.process_cpu_count() or 1
+    pending_limit: Final = max_pending if max_pending is not None else 4 * worker_count
+    executor: Final[Executor] = (
+        ThreadPoolExecutor(max_workers=worker_count) if threads else ProcessPoolExecutor(max_workers=worker_count)
+    )
+    with executor:
+        pending: set[Future[R]] = set()
+        for item in items:
+            if len(pending) >= pending_limit:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+            pending.add(executor.submit(function, item))
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+
+
+def run_jobs(
+    jobs: Iterable[Job],
+    *,
+    workers: Optional[int] = None,
+    max_pending: Optional[int] = None,
+    threads: bool = False,
+) -> Iterator[JobResult]:
+    # With `threads=True`, jobs run on a thread pool instead of worker processes. This
+    # avoids pickling and process start-up, but only runs in parallel on free-threaded
+    # Python builds (3.13t and later).
+    return _recorded(
+        _map_unordered(run_job, jobs, workers=workers, max_pending=max_pending, threads=threads),
+        runs=not threads,
+    )
+
+
+def run_many(
+    program: Program,
+    input_sets: Iterable[dict[str, Value]],
+    *,
+    workers: Optional[int] = None,
+    fuel: Optional[int] = None,
+    time_limit: Optional[float] = None,
+    max_output_bytes: Optional[int] = None,
+    memory_limit: Optional[int] = None,
+) -> list[RunOutcome]:
+    # Runs one program for many input sets on a thread pool and returns the outcomes in
+    # input order. Programs are immutable and every run has its own interpreter state, so
+    # the runs share nothing but the program. They run in parallel on free-threaded Python
+    # builds and interleave otherwise.
+    with ThreadPoolExecutor(max_workers=workers if workers is not None else os.process_cpu_count()) as executor:
+        return list(
+            executor.map(
+                lambda input_values: run_once(
+                    program,
+                    input_values,
+                    fuel=fuel,
+                    time_limit=time_limit,
+                    max_output_bytes=max_output_bytes,
+                    memory_limit=memory_limit,
+                ),
+                input_sets,
+            )
+        )
+
+
+def run_json_jobs(
+    lines: Iterable[str],
+    *,
+    workers: Optional[int] = None,
+    max_pending: Optional[int] = None,
+    fuel: Optional[int] = None,
+    time_limit: Optional[float] = None,
+    diagram_format: Optional[str] = None,
+    max_output_bytes: Optional[int] = None,
+    memory_limit: Optional[int] = None,
+    program_cache: Optional[ProgramCache] = None,
+    execution_cache: Optional[ExecutionCache] = None,
+    threads: bool = False,
+) -> Iterator[str]:
+    numbered_lines: Final = ((line_number, line) for line_number, line in enumerate(lines, start=1) if line.strip())
+    return _map_unordered(
+        JsonJobRunner(
+            fuel=fuel,
+            time_limit=time_limit,
+            diagram_format=diagram_format,
+            max_output_bytes=max_output_bytes,
+            memory_limit=memory_limit,
+            program_cache=program_cache,
+            execution_cache=execution_cache,
+        ),
+        numbered_lines,
+        workers=workers,
+        max_pending=max_pending,
+        threads=threads,
+    )
@@ -0,0 +1,303 @@
+import array
+import ast
+import mmap
+import operator
+import struct
+import sys
+from collections.abc import Buffer
+from collections.abc import Iterator
+from collections.abc import Sequence
+from os import PathLike
+from pathlib import Path
+from typing import TYPE_CHECKING
+from typing import Final
+from typing import Optional
+from typing import Self
+from typing import final
+from typing import override
+
+if TYPE_CHECKING:
+    from multiprocessing.shared_memory import SharedMemory
+
+# Array values that live in a buffer instead of a Python list: one-dimensional buffers of
+# booleans, integers or floats (`array.array`, `bytes`, NumPy arrays, shared memory,
+# memory-mapped files, ...).
+# Binding them as inputs doesn't copy the elements. Unless a buffer array is explicitly
+# `writable`, the interpreter copies it into a list before the first element assignment
+# (copy on write), so that runs sharing the same buffer don't see each other's writes.
+
+type ElementType = type[bool] | type[int] | type[float]
+
+_ELEMENT_TYPES: Final[dict[str, ElementType]] = {
+    "?": bool,
+    **dict.fromkeys("bBhHiIlLqQnN", int),
+    **dict.fromkeys("fd", float),
+}
+# The buffer formats used for newly created arrays and raw array files.
+_FORMATS: Final[dict[ElementType, str]] = {bool: "?", int: "q", float: "d"}
+# Element assignments to writable arrays must behave like assignments to lists, so
+# narrower formats, which would reject or round values, are not writable. Integers beyond
+# 64 bits are rejected with a `ValueError`.
+_WRITABLE_FORMATS: Final = frozenset(
+    {*_FORMATS.values(), *(format_ for format_ in "ln" if struct.calcsize(format_) == 8)}
+)
+_INT64_RANGE: Final = range(-(2**63), 2**63)
+
+_NPY_MAGIC: Final = b"\x93NUMPY"
+_NPY_FORMATS: Final = {
+    "b1": "?",
+    "i1": "b",
+    "u1": "B",
+    "i2": "h",
+    "u2": "H",
+    "i4": "i",
+    "u4": "I",
+    "i8": "q",
+    "u8": "Q",
+    "f4": "f",
+    "f8": "d",
+}
+_NATIVE_BYTE_ORDERS: Final = ("|", "=", "<" if sys.byteorder == "little" else ">")
+# Mapping modes as in `numpy.memmap`: read-only, copy on write (writes only change the
+# mapping, not the file) and read/write.
+_MAPPING_ACCESS: Final = {"r": mmap.ACCESS_READ, "c": mmap.ACCESS_COPY, "r+": mmap.ACCESS_WRITE}
+
+
+@final
+class InvalidArrayFileError(ValueError):
+    def __init__(self, path: str | PathLike[str], message: str) -> None:
+        super().__init__(f"Invalid array file '{path}': {message}")
+
+
+def _cast(buffer: Buffer, format_: str) -> memoryview:
+    # The overloads of `memoryview.cast()` only accept literal formats.
+    return memoryview(buffer).cast(format_)  # type: ignore[no-matching-overload]
+
+
+def _shared_buffer(shared_memory: "SharedMemory") -> memoryview:
+    buffer: Final = shared_memory.buf
+    if buffer is None:
+        raise ValueError(f"Shared memory block '{shared_memory.name}' is closed.")
+    return buffer
+
+
+class BufferArray(Sequence[bool | int | float]):
+    def __init__(self, buffer: Buffer, *, writable: bool = False) -> None:
+        view: Final = memoryview(buffer)
+        if view.ndim != 1:
+            raise ValueError(f"Array buffers must be one-dimensional, got {view.ndim} dimensions.")
+        element_type: Final = _ELEMENT_TYPES.get(view.format)
+        if element_type is None:
+            raise ValueError(f"Unsupported array buffer format '{view.format}'.")
+        if writable and view.readonly:
+            raise ValueError("Cannot create a writable array from a read-only buffer.")
+        if writable and view.format not in _WRITABLE_FORMATS:
+            raise ValueError(
+                "Writable arrays must have the format '?', 'q' or 'd' (booleans, 64-bit integers or "
+                + f"doubles), got '{view.format}'."
+            )
+        self._view = view if writable else view.toreadonly()
+        self._element_type = element_type
+
+    @property
+    def element_type(self) -> ElementType:
+        return self._element_type
+
+    @property
+    def is_readonly(self) -> bool:
+        return self._view.readonly
+
+    @override
+    def __len__(self) -> int:
+        return len(self._view)
+
+    @override
+    def __getitem__(self, index: int) -> bool | int | float:  # type: ignore[override]
+        return self._view[index]
+
+    def __setitem__(self, index: int, value: bool | int | float) -> None:
+        if self._element_type is int and value not in _INT64_RANGE:
+            raise ValueError(f"Cannot assign {value} to an element of an array of 64-bit integers.")
+        self._view[index] = value  # type: ignore[unsupported-operation]
+
+    @override
+    def __iter__(self) -> Iterator[bool | int | float]:
+        return iter(self._view)
+
+    @override
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, (BufferArray, list)):
+            return NotImplemented
+        return len(self) == len(other) and all(map(operator.eq, self, other))
+
+    __hash__ = None  # type: ignore[assignment]
+
+    @override
+    def __str__(self) -> str:
+        # Printed like the equivalent list.
+        return str(list(self))
+
+    @override
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self._element_type.__name__}, length={len(self)})"
+
+    def __reduce__(self) -> tuple[object, ...]:
+        return _rebuild_buffer_array, (self._view.tobytes(), self._view.format, not self._view.readonly)
+
+
+def _rebuild_buffer_array(data: bytes, format_: str, writable: bool) -> BufferArray:
+    buffer: Final = _cast(bytearray(data) if writable else data, format_)
+    return BufferArray(buffer, writable=writable)
+
+
+@final
+class SharedArray(BufferArray):
+    # An array in a named block of shared memory. Pickling a shared array (e.g. to pass it
+    # to a worker process) only transfers the name of the block, and the unpickled array
+    # maps the same memory. Shared arrays are read-only. The process that created the array
+    # with `share_array()` has to `unlink()` it once no process needs it anymore.
+    def __init__(self, shared_memory: "SharedMemory", length: int, element_type: ElementType) -> None:
+        format_: Final = _FORMATS[element_type]
+        super().__init__(_cast(_shared_buffer(shared_memory)[: length * struct.calcsize(format_)], format_))
+        # Assigned after the view, so that the view is released before the memory is closed.
+        self._shared_memory = shared_memory
+
+    @property
+    def name(self) -> str:
+        return self._shared_memory.name
+
+    def close(self) -> None:
+        self._view.release()
+        self._shared_memory.close()
+
+    def unlink(self) -> None:
+        self._shared_memory.unlink()
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, *_: object) -> None:
+        self.close()
+        self.unlink()
+
+    @override
+    def __reduce__(self) -> tuple[object, ...]:
+        return _attach_shared_array, (self.name, len(self), self._element_type)
+
+
+def _attach_shared_array(name: str, length: int, element_type: ElementType) -> SharedArray:
+    from multiprocessing.shared_memory import SharedMemory
+
+    # Only the creating process tracks (and eventually unlinks) the block.
+    return SharedArray(SharedMemory(name, track=False), length, element_type)
+
+
+def share_array(values: Sequence[bool] | Sequence[int] | Sequence[float], element_type: ElementType) -> SharedArray:
+    # Imported here (and in `_attach_shared_array()`) because it's slow to import and most
+    # processes never share arrays.
+    from multiprocessing.shared_memory import SharedMemory
+
+    wrong_type: Final[Optional[type]] = next((type(value) for value in values if type(value) is not element_type), None)
+    if wrong_type is not None:
+        raise TypeError(f"Cannot share {wrong_type.__name__} values in an array of {element_type.__name__}.")
+    data: Final = (
+        bytes(values)  # type: ignore[bad-argument-type]
+        if element_type is bool
+        else array.array(_FORMATS[element_type], values).tobytes()
+    )
+    # Shared memory blocks can't be empty.
+    shared_memory: Final = SharedMemory(create=True, size=max(len(data), 1))
+    _shared_buffer(shared_memory)[: len(data)] = data
+    return SharedArray(shared_memory, len(values), element_type)
+
+
+@final
+class MappedArray(BufferArray):
+    # An array in a memory-mapped file. Only the pages that are actually accessed are read
+    # into memory. With mode "c" or "r+", element assignments write to the mapping (and with
+    # "r+" to the file); with mode "r", the interpreter copies the array on the first write.
+    # Pickling a mapped array transfers the file name, and the unpickled array maps the file
+    # again.
+    def __init__(self, path: str | PathLike[str], format_: str, offset: int, length: int, mode: str) -> None:
+        access: Final = _MAPPING_ACCESS.get(mode)
+        if access is None:
+            raise ValueError(f"Unknown mapping mode '{mode}', expected one of {', '.join(_MAPPING_ACCESS)}.")
+        size: Final = length * struct.calcsize(format_)
+        if size == 0:
+            # Empty files can't be mapped.
+            mapping: Optional[mmap.mmap] = None
+            buffer = _cast(bytearray(), format_)
+        else:
+            with open(path, "r+b" if mode == "r+" else "rb") as file:
+                # Mappings have to start at a multiple of the allocation granularity.
+                start: Final = offset - offset % mmap.ALLOCATIONGRANULARITY
+                mapping = mmap.mmap(file.fileno(), offset - start + size, access=access, offset=start)
+            buffer = _cast(memoryview(mapping)[offset - start :], format_)
+        super().__init__(buffer, writable=mode != "r")
+        # Assigned after the view, so that the view is released before the mapping is closed.
+        self._mapping = mapping
+        self._arguments: Final = (path, format_, offset, length, mode)
+
+    def close(self) -> None:
+        self._view.release()
+        if self._mapping is not None:
+            self._mapping.close()
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, *_: object) -> None:
+        self.close()
+
+    @override
+    def __reduce__(self) -> tuple[object, ...]:
+        return MappedArray, self._arguments
+
+
+def _read_npy_header(path: str | PathLike[str]) -> tuple[str, int, int]:
+    # Returns the buffer format, offset and length of the array in a `.npy` file.
+    with open(path, "rb") as file:
+        prefix: Final = file.read(len(_NPY_MAGIC) + 2)
+        if len(prefix) < len(_NPY_MAGIC) + 2 or not prefix.startswith(_NPY_MAGIC):
+            raise InvalidArrayFileError(path, "not a .npy file")
+        header_length_format: Final = "<H" if prefix[len(_NPY_MAGIC)] == 1 else "<I"
+        header_length_data: Final = file.read(struct.calcsize(header_length_format))
+        if len(header_length_data) != struct.calcsize(header_length_format):
+            raise InvalidArrayFileError(path, "truncated header")
+        (header_length,) = struct.unpack(header_length_format, header_length_data)
+        try:
+            header = ast.literal_eval(file.read(header_length).decode("latin-1"))
+        except (SyntaxError, ValueError):
+            raise InvalidArrayFileError(path, "malformed header")
+        offset: Final = file.tell()
+    if not isinstance(header, dict) or not isinstance(descr := header.get("descr"), str):
+        raise InvalidArrayFileError(path, "malformed header")
+    shape: Final = header.get("shape")
+    if not isinstance(shape, tuple) or len(shape) != 1 or not isinstance(shape[0], int):
+        raise InvalidArrayFileError(path, f"expected a one-dimensional array, got shape {shape}")
+    format_: Final = _NPY_FORMATS.get(descr[1:])
+    if format_ is None or descr[0] not in _NATIVE_BYTE_ORDERS:
+        raise InvalidArrayFileError(path, f"unsupported element type '{descr}'")
+    return format_, offset, shape[0]
+
+
+def map_array_file(
+    path: str | PathLike[str],
+    element_type: Optional[ElementType] = None,
+    *,
+    mode: str = "r",
+) -> MappedArray:
+    # Maps a `.npy` file or a raw file of native 64-bit integers, 64-bit floats or one-byte
+    # booleans (`element_type` is required for raw files).
+    if Path(path).suffix == ".npy":
+        format_, offset, length = _read_npy_header(path)
+        if element_type is not None and _ELEMENT_TYPES[format_] is not element_type:
+            raise InvalidArrayFileError(path, f"expected elements of type {element_type.__name__}")
+        return MappedArray(path, format_, offset, length, mode)
+    if element_type is None:
+        raise ValueError("The element type is required for raw array files.")
+    raw_format: Final = _FORMATS[element_type]
+    size: Final = Path(path).stat().st_size
+    if size % struct.calcsize(raw_format) != 0:
+        raise InvalidArrayFileError(path, f"size {size} is not a multiple of the element size")
+    return MappedArray(path, raw_format, 0, size // struct.calcsize(raw_format), mode)
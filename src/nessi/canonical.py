@@ -0,0 +1,193 @@
+import re
+from collections.abc import Mapping
+from typing import Final
+from typing import Optional
+from typing import final
+
+from nessi.array_type import ArrayType
+from nessi.expressions import ArrayElement
+from nessi.expressions import BinaryExpression
+from nessi.expressions import Expression
+from nessi.expressions import Variable
+from nessi.program import Program
+from nessi.program_cache import structural_hash
+from nessi.statement_visitor import Statement
+from nessi.statements import Assign
+from nessi.statements import Block
+from nessi.statements import Break
+from nessi.statements import Do
+from nessi.statements import DocumentedBlock
+from nessi.statements import If
+from nessi.statements import Input
+from nessi.statements import Loop
+from nessi.statements import Match
+from nessi.statements import MatchArm
+from nessi.statements import Print
+from nessi.statements import While
+from nessi.value import Value
+
+# Canonical forms of programs that differ only in names and presentation, e.g. submissions
+# that call their loop variable `i` or `idx`: variables are renamed to `_v0`, `_v1`, ... and
+# loop labels to `_l0`, `_l1`, ... in the order of their first occurrence, and docstrings and
+# `hidden_in_latex` flags are dropped. Equivalent programs have the same canonical hash, and
+# a run of the canonical program with the renamed inputs behaves like a run of the original
+# program, except for the names in the output of placeholders that could not be resolved
+# and in error messages. `CanonicalProgram` maps those back.
+
+_PLACEHOLDER: Final = re.compile(r"\{(?P<key>[A-Za-z_]\w*)(?:\[(?P<index>[^]]+)])?}")
+_CANONICAL_NAME: Final = re.compile(r"(?<![\w$])_[vl]\d+(?!\w)")
+
+
+@final
+class _Canonicalizer:
+    def __init__(self) -> None:
+        self.names: Final[dict[str, str]] = {}
+        self.labels: Final[dict[str, str]] = {}
+
+    def name(self, name: str) -> str:
+        canonical = self.names.get(name)
+        if canonical is None:
+            canonical = self.names[name] = f"_v{len(self.names)}"
+        return canonical
+
+    def label(self, label: str) -> str:
+        canonical = self.labels.get(label)
+        if canonical is None:
+            canonical = self.labels[label] = f"_l{len(self.labels)}"
+        return canonical
+
+    def expression(self, expression: Expression) -> Expression:
+        match expression:
+            case Variable():
+                return Variable(self.name(expression.name))
+            case ArrayElement():
+                return self._element(expression)
+            case BinaryExpression():
+                return BinaryExpression(
+                    self.expression(expression.left),
+                    expression.operator,
+                    self.expression(expression.right),
+                )
+            case _:
+                return expression  # Literals.
+
+    def _element(self, element: ArrayElement) -> ArrayElement:
+        return ArrayElement(self.name(element.array_name), self.expression(element.index))
+
+    def _optional_label(self, label: Optional[str]) -> Optional[str]:
+        return None if label is None else self.label(label)
+
+    def _text(self, text: str) -> str:
+        def rename(match_: re.Match[str]) -> str:
+            key: Final = self.name(match_.group("key"))
+            index: Final = match_.group("index")
+            return f"{{{key}}}" if index is None else f"{{{key}[{self.name(index)}]}}"
+
+        return _PLACEHOLDER.sub(rename, text)
+
+    def block(self, block: Block) -> list[Statement]:
+        return [self.statement(statement) for statement in block]
+
+    def statement(self, statement: Statement) -> Statement:
+        match statement:
+            case Input():
+                target: Final = self.name(statement.target)
+                type_: Final = statement.type_
+                if isinstance(type_, ArrayType) and isinstance(type_.length, str):
+                    return Input(target, ArrayType(type_.type_, self.name(type_.length)))
+                return Input(target, type_)
+            case Print():
+                return Print(self._text(statement.text.text))
+            case Assign():
+                assign_target: Final = (
+                    self.name(statement.target)
+                    if isinstance(statement.target, str)
+                    else self._element(statement.target)
+                )
+                return Assign(assign_target, self.expression(statement.value))
+            case If():
+                return (
+                    If(self.expression(statement.condition))
+                    .Then(*self.block(statement.then_block))
+                    .Else(*self.block(statement.else_block))
+                )
+            case While():
+                label: Final = self._optional_label(statement.label)
+                return While(self.expression(statement.condition), label=label).Repeat(*self.block(statement.body))
+            case Do():
+                do_label: Final = self._optional_label(statement.label)
+                do: Final = Do(*self.block(statement.body), label=do_label)
+                return do if statement.condition is None else do.While(self.expression(statement.condition))
+            case Loop():
+                loop_label: Final = self._optional_label(statement.label)
+                return Loop(*self.block(statement.body), label=loop_label)
+            case Break():
+                return Break(self.label(statement.label))
+            case DocumentedBlock():
+                return DocumentedBlock("", self.block(statement.block))
+            case Match():
+                value: Final = self.expression(statement.value)
+                arms: Final = [
+                    MatchArm(arm.operator, self.expression(arm.condition), self.block(arm.body))
+                    for arm in statement.arms
+                ]
+                return Match(value, arms)
+            case _:
+                raise NotImplementedError(f"Canonicalization of statement type '{type(statement)}' not implemented.")
+
+
+@final
+class CanonicalProgram:
+    def __init__(self, program: Program, names: dict[str, str], labels: dict[str, str]) -> None:
+        self._program: Final = program
+        self._hash: Final = structural_hash(program.statements)
+        self._names: Final = names
+        # Canonical names and labels to original ones.
+        self._originals: Final = {canonical: name for name, canonical in (*names.items(), *labels.items())}
+
+    @property
+    def program(self) -> Program:
+        return self._program
+
+    @property
+    def hash(self) -> str:
+        return self._hash
+
+    @property
+    def names(self) -> dict[str, str]:
+        # Original variable names to canonical ones.
+        return dict(self._names)
+
+    def canonical_inputs(self, input_values: Mapping[str, Value]) -> dict[str, Value]:
+        # Inputs that the program never mentions are dropped, they can't change a run.
+        return {self._names[name]: value for name, value in input_values.items() if name in self._names}
+
+    def restore_output(self, output: str) -> str:
+        if "{_v" not in output:
+            return output
+
+        def restore(match_: re.Match[str]) -> str:
+            key: Final = self._originals.get(match_.group("key"), match_.group("key"))
+            index: Final = match_.group("index")
+            return f"{{{key}}}" if index is None else f"{{{key}[{self._originals.get(index, index)}]}}"
+
+        return _PLACEHOLDER.sub(restore, output)
+
+    def restore_message(self, message: str) -> str:
+        return _CANONICAL_NAME.sub(lambda match_: self._originals.get(match_.group(0), match_.group(0)), message)
+
+
+def may_contain_canonical_names(value: Value) -> bool:
+    # Whether an input value could be mistaken for a canonical name when restoring outputs
+    # or error messages.
+    if isinstance(value, str):
+        return _CANONICAL_NAME.search(value) is not None
+    return isinstance(value, list) and any(
+        isinstance(element, str) and may_contain_canonical_names(element) for element in value
+    )
+
+
+def canonicalize(program: Program) -> CanonicalProgram:
+    canonicalizer: Final = _Canonicalizer()
+    statements: Final = canonicalizer.block(program.statements)
+    return CanonicalProgram(Program(statements), canonicalizer.names, canonicalizer.labels)
@@ -0,0 +1,334 @@
+import argparse
+import json
+import sys
+import time
+from typing import Final
+from typing import Optional
+from typing import TextIO
+
+from nessi.batch import DIAGRAM_FORMATS
+from nessi.batch import ExecutionCache
+from nessi.batch import job_from_json
+from nessi.batch import job_result_from_json
+from nessi.batch import job_to_json
+from nessi.batch import record_job_result
+from nessi.batch import run_json_jobs
+from nessi.metrics import REGISTRY
+from nessi.program_cache import CACHE_DIRECTORY_VARIABLE
+from nessi.program_cache import ProgramCache
+
+
+def _open_input(path: str) -> TextIO:
+    return sys.stdin if path == "-" else open(path, encoding="utf-8")
+
+
+def _open_output(path: str) -> TextIO:
+    return sys.stdout if path == "-" else open(path, "w", encoding="utf-8")
+
+
+def _run_memory_limit(arguments: argparse.Namespace) -> Optional[int]:
+    return None if arguments.run_memory_limit is None else arguments.run_memory_limit * 1024 * 1024
+
+
+def _program_cache(arguments: argparse.Namespace) -> Optional[ProgramCache]:
+    if arguments.no_cache:
+        return None
+    return ProgramCache(arguments.cache_dir, max_bytes=arguments.cache_size * 1024 * 1024)
+
+
+def _execution_cache(arguments: argparse.Namespace, program_cache: Optional[ProgramCache]) -> Optional[ExecutionCache]:
+    if not arguments.execution_cache:
+        return None
+    return ExecutionCache(arguments.execution_cache, program_cache=program_cache)
+
+
+def _add_cache_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--cache-dir",
+        help=f"directory of the compiled-program cache (default: ${CACHE_DIRECTORY_VARIABLE} or ~/.cache/nessi)",
+    )
+    parser.add_argument("--cache-size", type=int, default=64, help="maximum size of the cache in MiB (default: 64)")
+    parser.add_argument("--no-cache", action="store_true", help="don't cache compiled programs")
+    parser.add_argument(
+        "--execution-cache",
+        type=int,
+        default=0,
+        metavar="ENTRIES",
+        help="share the outcomes of runs of equivalent programs, keeping this many per worker (default: off)",
+    )
+
+
+# The interval in seconds in which `--metrics-file` is rewritten.
+_METRICS_INTERVAL: Final = 5.0
+
+
+def _batch(arguments: argparse.Namespace) -> None:
+    input_file: Final = _open_input(arguments.input)
+    output_file: Final = _open_output(arguments.output)
+    metrics_file: Final = arguments.metrics_file
+    program_cache: Final = _program_cache(arguments)
+    next_metrics_write = time.monotonic() + _METRICS_INTERVAL
+    try:
+        for line in run_json_jobs(
+            input_file,
+            workers=arguments.workers,
+            max_pending=arguments.max_pending,
+            fuel=arguments.fuel,
+            time_limit=arguments.time_limit,
+            diagram_format=arguments.diagram,
+            max_output_bytes=arguments.max_output_bytes,
+            memory_limit=_run_memory_limit(arguments),
+            program_cache=program_cache,
+            execution_cache=_execution_cache(arguments, program_cache),
+            threads=arguments.threads,
+        ):
+            output_file.write(line + "\n")
+            output_file.flush()
+            if metrics_file is not None:
+                record_job_result(job_result_from_json(json.loads(line)), runs=not arguments.threads)
+                if time.monotonic() >= next_metrics_write:
+                    REGISTRY.write(metrics_file)
+                    next_metrics_write = time.monotonic() + _METRICS_INTERVAL
+    finally:
+        if metrics_file is not None:
+            REGISTRY.write(metrics_file)
+        if input_file is not sys.stdin:
+            input_file.close()
+        if output_file is not sys.stdout:
+            output_file.close()
+
+
+def _serve(arguments: argparse.Namespace) -> None:
+    from nessi.worker_server import WorkerServer
+
+    program_cache: Final = _program_cache(arguments)
+    server: Final = WorkerServer(
+        arguments.socket,
+        workers=arguments.workers,
+        fuel=arguments.fuel,
+        time_limit=arguments.time_limit,
+        max_output_bytes=arguments.max_output_bytes,
+        memory_limit=None if arguments.memory_limit is None else arguments.memory_limit * 1024 * 1024,
+        max_jobs_per_worker=arguments.max_jobs_per_worker,
+        program_cache=program_cache,
+        run_memory_limit=_run_memory_limit(arguments),
+        execution_cache=_execution_cache(arguments, program_cache),
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+def _queue_add(arguments: argparse.Namespace) -> None:
+    from nessi.work_queue import WorkQueue
+
+    input_file: Final = _open_input(arguments.input)
+    try:
+        with WorkQueue(arguments.queue) as queue:
+            added: Final = queue.enqueue(input_file)
+    finally:
+        if input_file is not sys.stdin:
+            input_file.close()
+    print(f"Added {added} jobs.", file=sys.stderr)
+
+
+def _queue_work(arguments: argparse.Namespace) -> None:
+    from nessi.batch import JsonJobRunner
+    from nessi.work_queue import run_workers
+
+    program_cache: Final = _program_cache(arguments)
+    runner: Final = JsonJobRunner(
+        fuel=arguments.fuel,
+        time_limit=arguments.time_limit,
+        diagram_format=arguments.diagram,
+        max_output_bytes=arguments.max_output_bytes,
+        memory_limit=_run_memory_limit(arguments),
+        program_cache=program_cache,
+        execution_cache=_execution_cache(arguments, program_cache),
+    )
+    counts: Final = run_workers(
+        arguments.queue,
+        workers=arguments.workers,
+        runner=runner,
+        visibility_timeout=arguments.visibility_timeout,
+        max_attempts=arguments.max_attempts,
+    )
+    print(f"{counts.done} jobs done, {counts.failed} failed.", file=sys.stderr)
+
+
+def _queue_status(arguments: argparse.Namespace) -> None:
+    from nessi.work_queue import WorkQueue
+
+    with WorkQueue(arguments.queue) as queue:
+        print(json.dumps(queue.counts()._asdict()))
+
+
+def _queue_results(arguments: argparse.Namespace) -> None:
+    from nessi.work_queue import WorkQueue
+
+    output_file: Final = _open_output(arguments.output)
+    try:
+        with WorkQueue(arguments.queue) as queue:
+            for line in queue.results():
+                output_file.write(line + "\n")
+    finally:
+        if output_file is not sys.stdout:
+            output_file.close()
+
+
+def _minimize(arguments: argparse.Namespace) -> None:
+    from nessi.coverage import coverable_points
+    from nessi.coverage import minimize_suite
+
+    input_file: Final = _open_input(arguments.input)
+    try:
+        job: Final = job_from_json(json.load(input_file), default_id="job")
+    finally:
+        if input_file is not sys.stdin:
+            input_file.close()
+    suite: Final = minimize_suite(job.program, job.input_sets, fuel=arguments.fuel, time_limit=arguments.time_limit)
+    output_file: Final = _open_output(arguments.output)
+    try:
+        reduced_job: Final = job._replace(input_sets=[job.input_sets[index] for index in suite.selected])
+        output_file.write(json.dumps(job_to_json(reduced_job)) + "\n")
+    finally:
+        if output_file is not sys.stdout:
+            output_file.close()
+    print(
+        f"Selected {len(suite.selected)} of {len(job.input_sets)} input sets, covering "
+        + f"{len(suite.covered)} of {len(coverable_points(job.program))} coverage points.",
+        file=sys.stderr,
+    )
+
+
+def _create_parser() -> argparse.ArgumentParser:
+    parser: Final = argparse.ArgumentParser(prog="nessi", description="Run and visualize nessi programs.")
+    subparsers: Final = parser.add_subparsers(dest="command", required=True)
+
+    batch: Final = subparsers.add_parser(
+        "batch",
+        help="run a stream of JSONL jobs",
+        description=(
+            "Read jobs (one JSON object per line with a serialized program and its input sets), run them "
+            + "on a pool of worker processes and write one JSON result line per job in completion order."
+        ),
+    )
+    batch.add_argument("input", nargs="?", default="-", help="JSONL job file ('-' for stdin, the default)")
+    batch.add_argument("-o", "--output", default="-", help="JSONL result file ('-' for stdout, the default)")
+    batch.add_argument("-w", "--workers", type=int, help="number of worker processes (default: CPU count)")
+    batch.add_argument(
+        "--threads",
+        action="store_true",
+        help="run the workers as threads of a single process (parallel on free-threaded Python builds only)",
+    )
+    batch.add_argument("--max-pending", type=int, help="maximum number of jobs in flight (default: 4 per worker)")
+    batch.add_argument("--fuel", type=int, help="default maximum number of executed statements per run")
+    batch.add_argument("--time-limit", type=float, help="default time limit per run in seconds")
+    batch.add_argument("--max-output-bytes", type=int, help="default maximum output size per run in bytes")
+    batch.add_argument("--run-memory-limit", type=int, help="default maximum memory of the variables per run in MiB")
+    batch.add_argument("--diagram", choices=DIAGRAM_FORMATS, help="also render a diagram for every job")
+    batch.add_argument(
+        "--metrics-file",
+        help="write metrics in the Prometheus text format to this file (every 5 seconds and at the end)",
+    )
+    _add_cache_arguments(batch)
+    batch.set_defaults(handler=_batch)
+
+    serve: Final = subparsers.add_parser(
+        "serve",
+        help="run jobs for clients on a Unix socket",
+        description=(
+            "Preload nessi and run JSONL jobs (see 'batch') sent over a Unix-domain socket in pre-forked "
+            + "worker processes, answering each job line with a result line. Runs until interrupted."
+        ),
+    )
+    serve.add_argument("socket", help="path of the Unix socket to listen on")
+    serve.add_argument("-w", "--workers", type=int, help="number of worker processes (default: CPU count)")
+    serve.add_argument("--fuel", type=int, help="default maximum number of executed statements per run")
+    serve.add_argument("--time-limit", type=float, help="default time limit per run in seconds")
+    serve.add_argument("--max-output-bytes", type=int, help="default maximum output size per run in bytes")
+    serve.add_argument("--run-memory-limit", type=int, help="default maximum memory of the variables per run in MiB")
+    serve.add_argument("--memory-limit", type=int, help="maximum address space per worker in MiB")
+    serve.add_argument(
+        "--max-jobs-per-worker",
+        type=int,
+        default=1000,
+        help="replace a worker after this many jobs (default: 1000)",
+    )
+    _add_cache_arguments(serve)
+    serve.set_defaults(handler=_serve)
+
+    queue: Final = subparsers.add_parser(
+        "queue",
+        help="run jobs from a work queue shared by several machines",
+        description=(
+            "Run batch jobs (see 'batch') from an SQLite work queue on shared storage. Jobs are added once, "
+            + "any number of 'queue work' processes on any number of machines lease and run them, and the "
+            + "results are read once all jobs are done."
+        ),
+    )
+    queue_commands: Final = queue.add_subparsers(dest="queue_command", required=True)
+    queue_add: Final = queue_commands.add_parser("add", help="add JSONL jobs, skipping jobs that were already added")
+    queue_add.add_argument("queue", help="path of the queue database")
+    queue_add.add_argument("input", nargs="?", default="-", help="JSONL job file ('-' for stdin, the default)")
+    queue_add.set_defaults(handler=_queue_add)
+    queue_work: Final = queue_commands.add_parser("work", help="run jobs until the queue is finished")
+    queue_work.add_argument("queue", help="path of the queue database")
+    queue_work.add_argument("-w", "--workers", type=int, help="number of worker processes (default: CPU count)")
+    queue_work.add_argument(
+        "--visibility-timeout",
+        type=float,
+        default=300.0,
+        help="seconds after which the lease of an unfinished job expires (default: 300)",
+    )
+    queue_work.add_argument(
+        "--max-attempts",
+        type=int,
+        default=3,
+        help="fail a job once this many of its leases expired (default: 3)",
+    )
+    queue_work.add_argument("--fuel", type=int, help="default maximum number of executed statements per run")
+    queue_work.add_argument("--time-limit", type=float, help="default time limit per run in seconds")
+    queue_work.add_argument("--max-output-bytes", type=int, help="default maximum output size per run in bytes")
+    queue_work.add_argument(
+        "--run-memory-limit",
+        type=int,
+        help="default maximum memory of the variables per run in MiB",
+    )
+    queue_work.add_argument("--diagram", choices=DIAGRAM_FORMATS, help="also render a diagram for every job")
+    _add_cache_arguments(queue_work)
+    queue_work.set_defaults(handler=_queue_work)
+    queue_status: Final = queue_commands.add_parser("status", help="print the number of jobs per state as JSON")
+    queue_status.add_argument("queue", help="path of the queue database")
+    queue_status.set_defaults(handler=_queue_status)
+    queue_results: Final = queue_commands.add_parser("results", help="write the results in the order of the jobs")
+    queue_results.add_argument("queue", help="path of the queue database")
+    queue_results.add_argument("-o", "--output", default="-", help="JSONL result file ('-' for stdout, the default)")
+    queue_results.set_defaults(handler=_queue_results)
+
+    minimize: Final = subparsers.add_parser(
+        "minimize",
+        help="select input sets that keep the coverage of a reference program",
+        description=(
+            "Read a job (see 'batch') with a reference program and its test input sets, and write the job "
+            + "with a small subset of the input sets that covers the same statements and branches, in the "
+            + "order they were selected."
+        ),
+    )
+    minimize.add_argument("input", nargs="?", default="-", help="JSON job file ('-' for stdin, the default)")
+    minimize.add_argument("-o", "--output", default="-", help="JSON job file ('-' for stdout, the default)")
+    minimize.add_argument("--fuel", type=int, help="maximum number of executed statements per run")
+    minimize.add_argument("--time-limit", type=float, help="time limit per run in seconds")
+    minimize.set_defaults(handler=_minimize)
+
+    return parser
+
+
+def main(argv: list[str] | None = None) -> None:
+    arguments: Final = _create_parser().parse_args(argv)
+    arguments.handler(arguments)
+
+
+if __name__ == "__main__":
+    main()
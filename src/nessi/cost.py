@@ -0,0 +1,195 @@
+import math
+from collections.abc import Mapping
+from typing import Final
+from typing import Optional
+from typing import final
+
+from nessi.analysis import FLIPPED_COMPARISONS
+from nessi.analysis import assigned_variables
+from nessi.analysis import offset_step
+from nessi.analysis import walk_statements
+from nessi.array_type import ArrayType
+from nessi.context import Context
+from nessi.expressions import BinaryExpression
+from nessi.expressions import Expression
+from nessi.expressions import Operator
+from nessi.expressions import Variable
+from nessi.statement_visitor import Statement
+from nessi.statements import Assign
+from nessi.statements import Block
+from nessi.statements import Do
+from nessi.statements import DocumentedBlock
+from nessi.statements import If
+from nessi.statements import Input
+from nessi.statements import Loop
+from nessi.statements import Match
+from nessi.statements import While
+from nessi.value import Value
+from nessi.value import is_array
+
+# Estimates the number of statements a run executes (comparable to
+# `RunResult.statements_executed`) without running the program, e.g. for scheduling.
+#
+# The estimate follows the straight-line code with the values of the inputs and of the
+# variables whose values are known. A `While` or `Do` loop whose condition compares an
+# induction variable (`i = i + step` in the body) with a bound runs as many iterations as
+# these values imply; its body is estimated with the induction variable at the middle of its
+# range, so that nested loops over `i` (like `j < n - i`) are estimated well. Other loops run
+# as many iterations as the input stream they read has values, or `default_size`. Branches
+# cost as much as their most expensive block, and breaks are ignored, so the estimate tends
+# to be an upper bound.
+
+_COMPARISONS: Final = (
+    Operator.LESS_THAN,
+    Operator.LESS_THAN_OR_EQUAL,
+    Operator.GREATER_THAN,
+    Operator.GREATER_THAN_OR_EQUAL,
+)
+
+
+def estimate_cost(
+    statements: Block,
+    input_values: Optional[Mapping[str, Value]] = None,
+    *,
+    default_size: int = 100,
+) -> int:
+    # Without input values (or for missing ones), integer inputs are assumed to be
+    # `default_size` and arrays to have that many elements.
+    estimator: Final = _CostEstimator(input_values or {}, default_size)
+    return math.ceil(estimator.block_cost(statements, {}))
+
+
+def _evaluate(expression: Expression, known: Context) -> Optional[Value]:
+    try:
+        return expression.evaluate(known)
+    except (ArithmeticError, LookupError, TypeError, ValueError):
+        return None
+
+
+@final
+class _CostEstimator:
+    def __init__(self, input_values: Mapping[str, Value], default_size: int) -> None:
+        self._input_values = input_values
+        self._default_size = default_size
+
+    def block_cost(self, block: Block, known: Context) -> float:
+        # Updates `known` to the values after the block.
+        return sum(self._statement_cost(statement, known) for statement in block)
+
+    def _statement_cost(self, statement: Statement, known: Context) -> float:
+        match statement:
+            case Assign(target=str() as target):
+                value = _evaluate(statement.value, known)
+                if value is None:
+                    known.pop(target, None)
+                else:
+                    known[target] = value
+                return 1
+            case Input(target=target):
+                value = self._input_value(statement)
+                if value is None:
+                    known.pop(target, None)
+                else:
+                    known[target] = value
+                return 1
+            case If():
+                return 1 + self._branches_cost([statement.then_block, statement.else_block], known)
+            case Match():
+                return 1 + self._branches_cost([arm.body for arm in statement.arms], known)
+            case DocumentedBlock():
+                return 1 + self.block_cost(statement.block, known)
+            case While() | Do() | Loop():
+                return 1 + self._loop_cost(statement, known)
+            case _:
+                return 1
+
+    def _input_value(self, statement: Input) -> Optional[Value]:
+        value: Final = self._input_values.get(statement.target)
+        if isinstance(statement.type_, ArrayType):
+            return value if is_array(value) else None
+        if value is None:
+            return self._default_size if statement.type_ is int else None
+        # Values of input streams change with every read.
+        return None if isinstance(value, list) else value
+
+    def _branches_cost(self, blocks: list[Block], known: Context) -> float:
+        costs: Final = [self.block_cost(block, dict(known)) for block in blocks]
+        for block in blocks:
+            for name in assigned_variables(block):
+                known.pop(name, None)
+        return max(costs, default=0)
+
+    def _loop_cost(self, loop: While | Do | Loop, known: Context) -> float:
+        body: Final = loop.body
+        induction: Final = self._induction(loop)
+        iterations: Optional[int] = None
+        start: Optional[Value] = None
+        if induction is not None:
+            name, step, comparison, bound_expression = induction
+            start = known.get(name)
+            bound = _evaluate(bound_expression, known)
+            if isinstance(start, int) and isinstance(bound, (int, float)):
+                iterations = _iteration_count(start, bound, step, comparison)
+        if iterations is None:
+            iterations = self._stream_length(body)
+        if isinstance(loop, Do):
+            iterations = max(1, iterations)
+        for name in assigned_variables(body):
+            known.pop(name, None)
+        body_known: Final = dict(known)
+        if induction is not None and isinstance(start, int):
+            # The middle of the range of the induction variable.
+            body_known[induction[0]] = start + induction[1] * (iterations // 2)
+        cost: Final = iterations * self.block_cost(body, body_known)
+        if induction is not None and isinstance(start, int):
+            known[induction[0]] = start + induction[1] * iterations
+        return cost
+
+    def _stream_length(self, body: Block) -> int:
+        # The number of values of an input stream that is read in the loop.
+        for statement in walk_statements(body):
+            if isinstance(statement, Input) and not isinstance(statement.type_, ArrayType):
+                value = self._input_values.get(statement.target)
+                if isinstance(value, list):
+                    return len(value)
+        return self._default_size
+
+    @staticmethod
+    def _induction(loop: While | Do | Loop) -> Optional[tuple[str, int, Operator, Expression]]:
+        # The induction variable, its step, the comparison and the bound of the loop
+        # condition `induction <comparison> bound`.
+        condition: Final = loop.condition if isinstance(loop, (While, Do)) else None
+        if not isinstance(condition, BinaryExpression) or condition.operator not in _COMPARISONS:
+            return None
+        for statement in loop.body:
+            if not isinstance(statement, Assign) or not isinstance(statement.target, str):
+                continue
+            step = offset_step(statement.target, statement.value)
+            if step is None:
+                continue
+            if isinstance(condition.left, Variable) and condition.left.name == statement.target:
+                return statement.target, step, condition.operator, condition.right
+            if isinstance(condition.right, Variable) and condition.right.name == statement.target:
+                return statement.target, step, FLIPPED_COMPARISONS[condition.operator], condition.left
+        return None
+
+
+def _iteration_count(start: int, bound: int | float, step: int, comparison: Operator) -> Optional[int]:
+    # Returns `None` unless the step is positive for `<` and `<=`, and negative for `>` and
+    # `>=`, i.e. if the loop can't terminate because of the induction variable.
+    if (step > 0) != (comparison in (Operator.LESS_THAN, Operator.LESS_THAN_OR_EQUAL)):
+        return None
+    distance: Final = bound - start if step > 0 else start - bound
+    step_size: Final = abs(step)
+    if isinstance(distance, float):
+        if not math.isfinite(distance):
+            return None  # An infinite or NaN bound, e.g. `Infinity` in a JSON input.
+        ceiling, floor = math.ceil(distance / step_size), math.floor(distance / step_size)
+    else:
+        # Integer division is exact for arbitrarily large integers.
+        ceiling, floor = -(-distance // step_size), distance // step_size
+    match comparison:
+        case Operator.LESS_THAN | Operator.GREATER_THAN:
+            return max(0, ceiling)
+        case _:
+            return max(0, floor + 1)
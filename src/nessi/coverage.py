@@ -0,0 +1,163 @@
+from collections.abc import Iterable
+from enum import Enum
+from typing import TYPE_CHECKING
+from typing import Final
+from typing import NamedTuple
+from typing import Optional
+from typing import final
+
+from nessi.analysis import statement_ids
+from nessi.statement_visitor import Statement
+from nessi.statements import Do
+from nessi.statements import If
+from nessi.statements import Loop
+from nessi.statements import Match
+from nessi.statements import While
+from nessi.value import Value
+
+if TYPE_CHECKING:
+    from nessi.program import Program
+
+# Statement and branch coverage of program runs, e.g. to find the input sets of a test suite
+# that exercise the same paths of a reference program. Statements are identified by their
+# index in a pre-order traversal of the program (like in `nessi.tracing`). A run covers:
+#
+# - every statement it executes (a `Break` is taken whenever it is executed),
+# - the 'then' or 'else' block of every `If` it executes,
+# - the matched arm of every `Match`,
+# - whether the body of every loop it executes ran zero, one or many times.
+#
+# Coverage is recorded by the interpreter, so runs with coverage interpret all loops instead
+# of compiling them (see `nessi.tiering`).
+
+
+class CoverageKind(Enum):
+    STATEMENT = "statement"
+    THEN = "then"
+    ELSE = "else"
+    ARM = "arm"
+    NO_ITERATIONS = "no iterations"
+    ONE_ITERATION = "one iteration"
+    MANY_ITERATIONS = "many iterations"
+
+
+_ITERATION_KINDS: Final = (CoverageKind.NO_ITERATIONS, CoverageKind.ONE_ITERATION, CoverageKind.MANY_ITERATIONS)
+
+
+@final
+class CoveragePoint(NamedTuple):
+    statement_id: int
+    kind: CoverageKind
+    # The index of the arm for `CoverageKind.ARM`.
+    arm: Optional[int] = None
+
+    def __str__(self) -> str:
+        arm: Final = "" if self.arm is None else f" {self.arm}"
+        return f"statement {self.statement_id}: {self.kind.value}{arm}"
+
+
+def coverable_points(program: "Program") -> set[CoveragePoint]:
+    # All points that runs of the program could cover. Whether they can actually be reached
+    # is not checked.
+    points: Final[set[CoveragePoint]] = set()
+    for statement, statement_id in statement_ids(program.statements).items():
+        points.add(CoveragePoint(statement_id, CoverageKind.STATEMENT))
+        match statement:
+            case If():
+                points.add(CoveragePoint(statement_id, CoverageKind.THEN))
+                points.add(CoveragePoint(statement_id, CoverageKind.ELSE))
+            case Match():
+                points.update(CoveragePoint(statement_id, CoverageKind.ARM, arm) for arm in range(len(statement.arms)))
+            case While():
+                points.update(CoveragePoint(statement_id, kind) for kind in _ITERATION_KINDS)
+            case Do() | Loop():
+                # The body runs at least once.
+                points.update(CoveragePoint(statement_id, kind) for kind in _ITERATION_KINDS[1:])
+    return points
+
+
+@final
+class Coverage:
+    # Opt-in recorder for `Program.execute(..., coverage=...)`. A coverage accumulates the
+    # points of all runs it is used for.
+    def __init__(self, program: "Program") -> None:
+        self._statement_ids: Final = statement_ids(program.statements)
+        self._statements: Final[set[Statement]] = set()
+        # (statement, branch index or number of iterations capped at two)
+        self._branches: Final[set[tuple[Statement, int]]] = set()
+        self._loops: Final[set[tuple[Statement, int]]] = set()
+
+    def record_statement(self, statement: Statement) -> None:
+        self._statements.add(statement)
+
+    def record_branch(self, statement: Statement, branch: int) -> None:
+        # 0 for the 'then' block and 1 for the 'else' block of `If` statements, the index of
+        # the arm for `Match` statements.
+        self._branches.add((statement, branch))
+
+    def record_loop(self, statement: Statement, iterations: int) -> None:
+        # The number of times the body of the loop ran.
+        self._loops.add((statement, min(iterations, 2)))
+
+    @property
+    def points(self) -> set[CoveragePoint]:
+        ids: Final = self._statement_ids
+        points: Final = {CoveragePoint(ids[statement], CoverageKind.STATEMENT) for statement in self._statements}
+        for statement, branch in self._branches:
+            if isinstance(statement, If):
+                points.add(CoveragePoint(ids[statement], CoverageKind.ELSE if branch else CoverageKind.THEN))
+            else:
+                points.add(CoveragePoint(ids[statement], CoverageKind.ARM, branch))
+        points.update(
+            CoveragePoint(ids[statement], _ITERATION_KINDS[iterations]) for statement, iterations in self._loops
+        )
+        return points
+
+
+@final
+class SuiteCoverage(NamedTuple):
+    # The indices of the selected input sets in the order they were selected, the points
+    # covered by all input sets and the points of every input set.
+    selected: list[int]
+    covered: set[CoveragePoint]
+    points: list[set[CoveragePoint]]
+
+
+def collect_coverage(
+    program: "Program",
+    input_values: dict[str, Value],
+    *,
+    fuel: Optional[int] = None,
+    time_limit: Optional[float] = None,
+) -> set[CoveragePoint]:
+    # The points covered by a run, including the statements executed before it failed.
+    coverage: Final = Coverage(program)
+    try:
+        program.execute(input_values, fuel=fuel, time_limit=time_limit, coverage=coverage)
+    except Exception:
+        pass
+    return coverage.points
+
+
+def minimize_suite(
+    program: "Program",
+    input_sets: Iterable[dict[str, Value]],
+    *,
+    fuel: Optional[int] = None,
+    time_limit: Optional[float] = None,
+) -> SuiteCoverage:
+    # Selects input sets that together cover the same points of `program` as all of them,
+    # greedily: the next input set is the one that covers the most points not covered yet.
+    # The greedy choice is within a factor of ln(points) of the smallest such subset.
+    points: Final = [
+        collect_coverage(program, input_values, fuel=fuel, time_limit=time_limit) for input_values in input_sets
+    ]
+    covered: Final[set[CoveragePoint]] = set().union(*points)
+    uncovered: Final = set(covered)
+    selected: Final[list[int]] = []
+    while uncovered:
+        # Ties go to the earlier input set.
+        best = max(range(len(points)), key=lambda index: (len(points[index] & uncovered), -index))
+        selected.append(best)
+        uncovered.difference_update(points[best])
+    return SuiteCoverage(selected, covered, points)
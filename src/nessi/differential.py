@@ -0,0 +1,169 @@
+import copy
+import queue
+import threading
+from typing import Final
+from typing import NamedTuple
+from typing import Optional
+from typing import final
+from typing import override
+
+from nessi.interpreter import Interpreter
+from nessi.output import OutputSink
+from nessi.program import Program
+from nessi.statements import Print
+from nessi.value import Value
+
+# Runs a candidate program side by side with a reference program and compares their
+# output line by line while they run. Both programs execute in lockstep on their own
+# threads: every printed line blocks its program until the line has been compared, so
+# that a diverging candidate is stopped right away (instead of after printing millions of
+# wrong lines) and its variables can be inspected in exactly the state that produced the
+# first wrong line.
+
+
+@final
+class ProgramState(NamedTuple):
+    # The line is `None` if the program ended (normally or with `error`) before printing it.
+    line: Optional[str]
+    statement: Optional[Print]
+    variables: dict[str, Value]
+    error: Optional[str] = None
+
+
+@final
+class Divergence(NamedTuple):
+    line_number: int
+    reference: ProgramState
+    candidate: ProgramState
+
+
+@final
+class DifferentialResult(NamedTuple):
+    lines_compared: int
+    divergence: Optional[Divergence]
+
+    @property
+    def is_equivalent(self) -> bool:
+        return self.divergence is None
+
+
+class _Aborted(Exception):
+    pass
+
+
+@final
+class _Event(NamedTuple):
+    # A printed line, or the end of the program (`line is None`).
+    line: Optional[str]
+    statement: Optional[Print] = None
+    error: Optional[str] = None
+
+
+@final
+class _LockstepSink(OutputSink):
+    def __init__(self) -> None:
+        self.events: Final[queue.Queue[_Event]] = queue.Queue(maxsize=1)
+        self.resume: Final[queue.Queue[bool]] = queue.Queue(maxsize=1)
+
+    @override
+    def write(self, statement: Print, text: str) -> None:
+        for line in text.removesuffix("\n").split("\n"):
+            self.events.put(_Event(line, statement))
+            if not self.resume.get():
+                raise _Aborted()
+
+
+@final
+class _LockstepRun:
+    def __init__(
+        self,
+        program: Program,
+        input_values: dict[str, Value],
+        *,
+        fuel: Optional[int],
+        time_limit: Optional[float],
+    ) -> None:
+        self._program = program
+        self._sink: Final = _LockstepSink()
+        # Each program gets its own copy of the inputs, because reading inputs consumes them.
+        self._interpreter: Final = Interpreter(
+            copy.deepcopy(input_values),
+            output=self._sink,
+            fuel=fuel,
+            time_limit=time_limit,
+        )
+        self._thread: Final = threading.Thread(target=self._run, daemon=True)
+        self._is_running = False
+
+    def start(self) -> None:
+        self._is_running = True
+        self._thread.start()
+
+    def next_event(self) -> _Event:
+        event: Final = self._sink.events.get()
+        self._is_running = event.line is not None
+        return event
+
+    def resume(self) -> None:
+        self._sink.resume.put(True)
+
+    def stop(self) -> None:
+        if self._is_running:
+            self._is_running = False
+            self._sink.resume.put(False)
+        self._thread.join()
+
+    def state(self, event: _Event) -> ProgramState:
+        # Only called while the program is blocked on a printed line or has ended.
+        return ProgramState(event.line, event.statement, copy.deepcopy(self._interpreter.variables), event.error)
+
+    def _run(self) -> None:
+        try:
+            for statement in self._program.statements:
+                statement.accept(self._interpreter)
+        except _Aborted:
+            return
+        except Exception as error:
+            self._sink.events.put(_Event(None, error=f"{type(error).__name__}: {error}"))
+        else:
+            self._sink.events.put(_Event(None))
+
+
+def run_differential(
+    reference: Program,
+    candidate: Program,
+    input_values: dict[str, Value],
+    *,
+    fuel: Optional[int] = None,
+    time_limit: Optional[float] = None,
+) -> DifferentialResult:
+    # `fuel` and `time_limit` apply to each program separately. Note that the time a
+    # program spends waiting for the other one counts towards its time limit.
+    runs: Final = [
+        _LockstepRun(program, input_values, fuel=fuel, time_limit=time_limit) for program in (reference, candidate)
+    ]
+    reference_run, candidate_run = runs
+    lines_compared = 0
+    try:
+        for run in runs:
+            run.start()
+        while True:
+            reference_event = reference_run.next_event()
+            candidate_event = candidate_run.next_event()
+            if (reference_event.line, reference_event.error) != (candidate_event.line, candidate_event.error):
+                return DifferentialResult(
+                    lines_compared,
+                    Divergence(
+                        lines_compared + 1,
+                        reference_run.state(reference_event),
+                        candidate_run.state(candidate_event),
+                    ),
+                )
+            if reference_event.line is None:
+                return DifferentialResult(lines_compared, None)
+            lines_compared += 1
+            reference_run.resume()
+            candidate_run.resume()
+    finally:
+        for run in runs:
+            run.stop()
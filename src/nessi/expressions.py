@@ -7,6 +7,7 @@ from typing import override
 
 from nessi.context import Context
 from nessi.value import Value
+from nessi.value import is_array
 
 
 class Expression(ABC):
@@ -18,6 +19,10 @@ class Expression(ABC):
     def to_latex(self) -> str:
         pass
 
+    @abstractmethod
+    def to_text(self) -> str:
+        pass
+
     @abstractmethod
     def __str__(self) -> str:
         pass
@@ -157,17 +162,18 @@ class Expression(ABC):
 
 @final
 class Operator(Enum):
-    ADD = ("+", "+")
-    SUBTRACT = ("-", "-")
-    MULTIPLY = ("*", r"\cdot")
-    DIVIDE = ("/", "/")
-    MODULUS = ("MOD", r"\:\texttt{MOD}\:")
-    GREATER_THAN = (">", ">")
-    LESS_THAN = ("<", "<")
-    EQUALS = ("==", "=")
-    NOT_EQUALS = ("!=", r"\neq")
-    GREATER_THAN_OR_EQUAL = (">=", r"\geq")
-    LESS_THAN_OR_EQUAL = ("<=", r"\leq")
+    # (source, LaTeX, plain text)
+    ADD = ("+", "+", "+")
+    SUBTRACT = ("-", "-", "-")
+    MULTIPLY = ("*", r"\cdot", "·")
+    DIVIDE = ("/", "/", "/")
+    MODULUS = ("MOD", r"\:\texttt{MOD}\:", "MOD")
+    GREATER_THAN = (">", ">", ">")
+    LESS_THAN = ("<", "<", "<")
+    EQUALS = ("==", "=", "=")
+    NOT_EQUALS = ("!=", r"\neq", "≠")
+    GREATER_THAN_OR_EQUAL = (">=", r"\geq", "≥")
+    LESS_THAN_OR_EQUAL = ("<=", r"\leq", "≤")
 
 
 def _precedence(operator: Operator) -> int:
@@ -196,6 +202,18 @@ class BinaryExpression(Expression):
         self._operator = operator
         self._right = right
 
+    @property
+    def left(self) -> Expression:
+        return self._left
+
+    @property
+    def operator(self) -> Operator:
+        return self._operator
+
+    @property
+    def right(self) -> Expression:
+        return self._right
+
     @override
     def evaluate(self, context: Context) -> Value:
         left: Final = self._left.evaluate(context)
@@ -247,6 +265,16 @@ class BinaryExpression(Expression):
         operator: Final = self._operator.value[1]
         return f"{left} {operator} {right}"
 
+    @override
+    def to_text(self) -> str:
+        left: Final = (
+            f"({self._left.to_text()})" if self._does_child_need_parentheses(self._left) else self._left.to_text()
+        )
+        right: Final = (
+            f"({self._right.to_text()})" if self._does_child_need_parentheses(self._right) else self._right.to_text()
+        )
+        return f"{left} {self._operator.value[2]} {right}"
+
     def _does_child_need_parentheses(self, child: Expression) -> bool:
         return isinstance(child, BinaryExpression) and _precedence(child._operator) < _precedence(self._operator)
 
@@ -260,6 +288,10 @@ class Variable(Expression):
     def __init__(self, name: str) -> None:
         self._name = name
 
+    @property
+    def name(self) -> str:
+        return self._name
+
     @override
     def evaluate(self, context: Context) -> Value:
         value: Final = context.get(self._name)
@@ -271,6 +303,10 @@ class Variable(Expression):
     def to_latex(self) -> str:
         return rf"\texttt{{{self._name.replace('_', r'\_')}}}"
 
+    @override
+    def to_text(self) -> str:
+        return self._name
+
     @override
     def __str__(self) -> str:
         return f"Variable({self._name})"
@@ -284,6 +320,10 @@ class Bool(Expression):
     def __init__(self, value: bool) -> None:
         self._value = value
 
+    @property
+    def value(self) -> bool:
+        return self._value
+
     @override
     def evaluate(self, context: Context) -> Value:
         return self._value
@@ -292,6 +332,10 @@ class Bool(Expression):
     def to_latex(self) -> str:
         return rf"\texttt{{{'true' if self._value else 'false'}}}"
 
+    @override
+    def to_text(self) -> str:
+        return "true" if self._value else "false"
+
     @override
     def __str__(self) -> str:
         return "true" if self._value else "false"
@@ -302,6 +346,10 @@ class Integer(Expression):
     def __init__(self, value: int) -> None:
         self._value = value
 
+    @property
+    def value(self) -> int:
+        return self._value
+
     @override
     def evaluate(self, context: Context) -> Value:
         return self._value
@@ -310,6 +358,10 @@ class Integer(Expression):
     def to_latex(self) -> str:
         return str(self._value)
 
+    @override
+    def to_text(self) -> str:
+        return str(self._value)
+
     @override
     def __str__(self) -> str:
         return str(self._value)
@@ -320,6 +372,10 @@ class Float(Expression):
     def __init__(self, value: float) -> None:
         self._value = value
 
+    @property
+    def value(self) -> float:
+        return self._value
+
     @override
     def evaluate(self, context: Context) -> Value:
         return self._value
@@ -330,6 +386,10 @@ class Float(Expression):
             return str(int(self._value))
         return str(self._value).replace(".", ",")
 
+    @override
+    def to_text(self) -> str:
+        return self.to_latex()
+
     @override
     def __str__(self) -> str:
         return str(self._value)
@@ -355,7 +415,7 @@ class ArrayElement(Expression):
         if array is None:
             msg = f"Array '{self._array_name}' not found in context"
             raise KeyError(msg)
-        if not isinstance(array, list):
+        if not is_array(array):
             msg = f"Array '{self._array_name}' is not a list"
             raise KeyError(msg)
         index_value: Final = self._index.evaluate(context)
@@ -370,6 +430,10 @@ class ArrayElement(Expression):
         index: Final = self._index.to_latex()
         return rf"\texttt{{{self._array_name.replace('_', r'\_')}}}[{index}]"
 
+    @override
+    def to_text(self) -> str:
+        return f"{self._array_name}[{self._index.to_text()}]"
+
     @override
     def __str__(self) -> str:
         return f"{self._array_name}[{self._index}]"
@@ -0,0 +1,558 @@
+import functools
+import itertools
+import operator
+import threading
+import weakref
+from collections import deque
+from collections.abc import Callable
+from collections.abc import Sequence
+from typing import Final
+from typing import NamedTuple
+from typing import Optional
+from typing import final
+
+from nessi.analysis import FLIPPED_COMPARISONS
+from nessi.analysis import expression_variables
+from nessi.analysis import offset_step
+from nessi.buffer_array import BufferArray
+from nessi.context import Context
+from nessi.expressions import ArrayElement
+from nessi.expressions import BinaryExpression
+from nessi.expressions import Bool
+from nessi.expressions import Expression
+from nessi.expressions import Float
+from nessi.expressions import Integer
+from nessi.expressions import Operator
+from nessi.expressions import Variable
+from nessi.metrics import record_cache_lookup
+from nessi.statement_visitor import Statement
+from nessi.statements import Assign
+from nessi.statements import If
+from nessi.statements import While
+from nessi.value import Value
+from nessi.value import is_array
+
+# Recognizes counting loops over arrays and runs them as a few C-level operations (`map()`,
+# `itertools.accumulate()`, `max()`, ...) over all iterations at once instead of one
+# iteration at a time. A loop is recognized if it has the form
+#
+#     While(i < bound).Repeat(<statements>, Assign("i", i + step))
+#
+# (or counts down with `i - step` and `>`/`>=`), where `bound` doesn't change in the loop
+# and each statement is one of
+#
+#     Assign("v", v + x)                          # also `-` and `*`: reductions and recurrences
+#     Assign("v", x)                              # temporaries
+#     Assign(array[index], x)                     # maps
+#     If(x > v).Then(Assign("v", x))              # maximum (`<`: minimum)
+#
+# Every variable and array may only be assigned once, arrays that are written may not be read,
+# and variables may only be read after their assignment in the body, unless they are
+# recurrences with a loop-invariant operand (like `power_of_2 = power_of_2 * 2`).
+#
+# A kernel first computes the values of all iterations and only then updates the variables.
+# Whenever a value has an unexpected type, an index is out of bounds, an operation fails or
+# the fuel doesn't suffice, nothing is updated and the loop is interpreted instead, so that
+# errors are raised exactly like by the interpreter.
+
+_NUMERIC_TYPES: Final = frozenset({bool, int, float})
+_INTEGRAL_TYPES: Final = frozenset({bool, int})
+_OPERATOR_FUNCTIONS: Final = {
+    Operator.ADD: operator.add,
+    Operator.SUBTRACT: operator.sub,
+    Operator.MULTIPLY: operator.mul,
+    Operator.MODULUS: operator.mod,
+    Operator.GREATER_THAN: operator.gt,
+    Operator.LESS_THAN: operator.lt,
+    Operator.EQUALS: operator.eq,
+    Operator.NOT_EQUALS: operator.ne,
+    Operator.GREATER_THAN_OR_EQUAL: operator.ge,
+    Operator.LESS_THAN_OR_EQUAL: operator.le,
+}
+
+
+class _Fallback(Exception):
+    pass
+
+
+@final
+class _Scalar(NamedTuple):
+    # A value that is the same in every iteration.
+    value: Value
+
+
+# The values of an expression: the same in every iteration, or one per iteration.
+type _Values = _Scalar | Sequence[Value]
+
+
+@final
+class _Accumulate(NamedTuple):
+    # `target = target <operator> operand` (or `operand <operator> target` for `+` and `*`).
+    target: str
+    operator: Operator
+    operand: Expression
+
+
+@final
+class _Set(NamedTuple):
+    target: str
+    value: Expression
+
+
+@final
+class _Store(NamedTuple):
+    array_name: str
+    index: Expression
+    value: Expression
+
+
+@final
+class _Extremum(NamedTuple):
+    # `If(value > target).Then(Assign(target, value))`, or `<` for the minimum.
+    target: str
+    value: Expression
+    is_maximum: bool
+
+
+type _Step = _Accumulate | _Set | _Store | _Extremum
+
+
+def _types(values: _Values) -> set[type]:
+    match values:
+        case _Scalar():
+            return {type(values.value)}
+        case range():
+            return {int}
+        case _:
+            return set(map(type, values))
+
+
+def _require_numeric(values: _Values) -> None:
+    if not _types(values) <= _NUMERIC_TYPES:
+        raise _Fallback()
+
+
+def _fits_int64(values: Sequence[Value]) -> bool:
+    return -(2**63) <= min(values) and max(values) < 2**63  # type: ignore[bad-specialization, unsupported-operation]
+
+
+def _per_iteration(values: _Values, count: int) -> Sequence[Value]:
+    return [values.value] * count if isinstance(values, _Scalar) else values
+
+
+def _reduce(
+    function: Callable[[Value, Value], Value],
+    initial: _Scalar,
+    operands: _Values,
+    count: int,
+) -> Value:
+    # `initial <function> operand_1 <function> operand_2 ...`
+    if function is operator.add and _types(initial) | _types(operands) <= _INTEGRAL_TYPES:
+        # Integer sums are exact and `sum()` doesn't create intermediate objects.
+        return sum(_per_iteration(operands, count), initial.value)  # type: ignore[no-matching-overload]
+    return functools.reduce(function, _per_iteration(operands, count), initial.value)
+
+
+def _binary_function(operator_: Operator, left: _Values, right: _Values) -> Callable[[Value, Value], Value]:
+    # The function that evaluates the operator like `BinaryExpression.evaluate()` for all
+    # combinations of the given values.
+    left_types: Final = _types(left)
+    right_types: Final = _types(right)
+    if not left_types <= _NUMERIC_TYPES or not right_types <= _NUMERIC_TYPES:
+        raise _Fallback()
+    match operator_:
+        case Operator.DIVIDE:
+            if left_types <= _INTEGRAL_TYPES and right_types <= _INTEGRAL_TYPES:
+                return operator.floordiv
+            if left_types.isdisjoint(_INTEGRAL_TYPES) or right_types.isdisjoint(_INTEGRAL_TYPES):
+                return operator.truediv
+            raise _Fallback()  # Integer and float division would have to be mixed.
+        case Operator.MODULUS if float in left_types and float in right_types:
+            raise _Fallback()  # The interpreter raises a `TypeError`.
+        case _:
+            # The operands are numbers, which the functions accept.
+            return _OPERATOR_FUNCTIONS[operator_]  # type: ignore[bad-return]
+
+
+@final
+class Kernel:
+    def __init__(
+        self,
+        induction: str,
+        step: int,
+        comparison: Operator,
+        bound: Expression,
+        steps: tuple[_Step, ...],
+        recurrences: frozenset[str],
+        read_targets: frozenset[str],
+        written_arrays: frozenset[str],
+        read_variables: frozenset[str],
+    ) -> None:
+        # The loop runs while `induction <comparison> bound`.
+        self._induction = induction
+        self._step = step
+        self._comparison = comparison
+        self._bound = bound
+        self._steps = steps
+        self._recurrences = recurrences
+        # Only the final values of variables that no statement in the loop reads are needed.
+        self._read_targets = read_targets
+        self._written_arrays = written_arrays
+        self._read_variables = read_variables
+        self._targets: Final = frozenset(step.target for step in steps if not isinstance(step, _Store))
+        # Including the increment of the induction variable.
+        self._statements_per_iteration: Final = len(steps) + 1
+
+    def run(self, variables: Context, statements_executed: int, fuel: int) -> Optional[int]:
+        # Runs the whole loop and returns the number of executed statements afterwards, or
+        # returns `None` without changing any variables if the loop has to be interpreted.
+        try:
+            return self._run(variables, statements_executed, fuel)
+        except (_Fallback, ArithmeticError, LookupError, TypeError):
+            return None
+
+    def _run(self, variables: Context, statements_executed: int, fuel: int) -> int:
+        self._check_aliases(variables)
+        start: Final = variables.get(self._induction)
+        bound: Final = self._bound.evaluate(variables)
+        if type(start) is not int or type(bound) is not int:
+            raise _Fallback()
+        count: Final = self._iteration_count(start, bound)
+        executed = statements_executed + count * self._statements_per_iteration
+        if executed > fuel:
+            raise _Fallback()
+        if count == 0:
+            return executed
+        iterations: Final = range(start, start + count * self._step, self._step)
+
+        # The values of the variables assigned in the loop at the current point of the body.
+        current: Final[dict[str, Sequence[Value]]] = {}
+        # Array elements read in several statements are only gathered once.
+        gathered: Final[dict[str, Sequence[Value]]] = {}
+        recurrence_values: Final[dict[str, list[Value]]] = {}
+        for step in self._steps:
+            if isinstance(step, _Accumulate) and step.target in self._recurrences:
+                operand = _Scalar(step.operand.evaluate(variables))
+                initial = _Scalar(variables[step.target])
+                function = _binary_function(step.operator, initial, operand)
+                values = list(itertools.accumulate([operand.value] * count, function, initial=initial.value))
+                recurrence_values[step.target] = values
+                current[step.target] = values[:-1]
+
+        stores: Final[list[tuple[str, Sequence[Value], Sequence[Value]]]] = []
+        for step in self._steps:
+            match step:
+                case _Accumulate(target=target) if target in self._recurrences:
+                    current[target] = recurrence_values[target][1:]
+                case _Accumulate(target=target, operator=operator_, operand=operand_expression):
+                    operand_values = self._values(operand_expression, variables, current, gathered, iterations)
+                    initial_value = _Scalar(variables[target])
+                    function = _binary_function(operator_, initial_value, operand_values)
+                    if target not in self._read_targets:
+                        current[target] = [_reduce(function, initial_value, operand_values, count)]
+                        continue
+                    accumulated = list(
+                        itertools.accumulate(
+                            _per_iteration(operand_values, count),
+                            function,
+                            initial=initial_value.value,
+                        )
+                    )
+                    del accumulated[0]
+                    current[target] = accumulated
+                case _Set(target=target, value=value_expression):
+                    assigned_values = self._values(value_expression, variables, current, gathered, iterations)
+                    current[target] = _per_iteration(assigned_values, count)
+                case _Store(array_name=array_name, index=index_expression, value=value_expression):
+                    indices = _per_iteration(
+                        self._indices(index_expression, array_name, variables, current, gathered, iterations),
+                        count,
+                    )
+                    values = _per_iteration(
+                        self._values(value_expression, variables, current, gathered, iterations),
+                        count,
+                    )
+                    self._check_store(variables[array_name], values)
+                    stores.append((array_name, indices, values))
+                case _Extremum(target=target, value=value_expression, is_maximum=is_maximum):
+                    candidates = self._values(value_expression, variables, current, gathered, iterations)
+                    initial_extremum = _Scalar(variables[target])
+                    _require_numeric(candidates)
+                    _require_numeric(initial_extremum)
+                    # `max(a, b)` returns `b` only if `b > a`, and `min(a, b)` only if `b < a`,
+                    # exactly like the `If` statement.
+                    extrema = list(
+                        itertools.accumulate(
+                            _per_iteration(candidates, count),
+                            max if is_maximum else min,
+                            initial=initial_extremum.value,
+                        )
+                    )
+                    # Every update assigns a different value (object).
+                    executed += sum(map(operator.is_not, itertools.islice(extrema, 1, None), extrema))
+                    del extrema[0]
+                    current[target] = extrema
+        if executed > fuel:
+            raise _Fallback()
+
+        for step in self._steps:
+            if not isinstance(step, _Store):
+                variables[step.target] = current[step.target][-1]
+        for array_name, indices, values in stores:
+            array = variables[array_name]
+            if isinstance(array, BufferArray) and array.is_readonly:
+                array = variables[array_name] = list(array)  # Copy on write.
+            deque(map(array.__setitem__, indices, values), maxlen=0)  # type: ignore[union-attr]
+        variables[self._induction] = start + count * self._step
+        return executed
+
+    def _check_aliases(self, variables: Context) -> None:
+        # All reads happen before the stores, and the stores are applied array by array, so a
+        # written array must not be reachable under any other name of the loop.
+        written_ids: Final = {id(variables.get(name)) for name in self._written_arrays}
+        if len(written_ids) != len(self._written_arrays):
+            raise _Fallback()
+        for name in self._read_variables:
+            value = variables.get(name)
+            if is_array(value) and id(value) in written_ids:
+                raise _Fallback()
+
+    def _iteration_count(self, start: int, bound: int) -> int:
+        # The step is positive for `<` and `<=`, and negative for `>` and `>=`.
+        distance: Final = bound - start if self._step > 0 else start - bound
+        step: Final = abs(self._step)
+        match self._comparison:
+            case Operator.LESS_THAN | Operator.GREATER_THAN:
+                return max(0, -(-distance // step))
+            case _:
+                return max(0, distance // step + 1)
+
+    def _values(
+        self,
+        expression: Expression,
+        variables: Context,
+        current: dict[str, Sequence[Value]],
+        gathered: dict[str, Sequence[Value]],
+        iterations: range,
+    ) -> _Values:
+        match expression:
+            case Integer() | Float() | Bool():
+                return _Scalar(expression.evaluate(variables))
+            case Variable(name=name) if name == self._induction:
+                return iterations
+            case Variable(name=name) if name in current:
+                return current[name]
+            case Variable():
+                return _Scalar(expression.evaluate(variables))
+            case ArrayElement(array_name=array_name, index=index_expression):
+                indices = self._indices(index_expression, array_name, variables, current, gathered, iterations)
+                if isinstance(indices, _Scalar):
+                    return _Scalar(expression.evaluate(variables))
+                key: Final = str(expression)
+                elements = gathered.get(key)
+                if elements is None:
+                    elements = list(map(variables[array_name].__getitem__, indices))  # type: ignore[union-attr]
+                    # The elements don't change if the index doesn't depend on assigned variables.
+                    if expression_variables(index_expression).isdisjoint(self._targets):
+                        gathered[key] = elements
+                return elements
+            case BinaryExpression():
+                left: Final = self._values(expression.left, variables, current, gathered, iterations)
+                right: Final = self._values(expression.right, variables, current, gathered, iterations)
+                function: Final = _binary_function(expression.operator, left, right)
+                if isinstance(left, _Scalar) and isinstance(right, _Scalar):
+                    return _Scalar(function(left.value, right.value))
+                return list(
+                    map(
+                        function,
+                        itertools.repeat(left.value) if isinstance(left, _Scalar) else left,
+                        itertools.repeat(right.value) if isinstance(right, _Scalar) else right,
+                    )
+                )
+            case _:
+                raise _Fallback()
+
+    def _indices(
+        self,
+        expression: Expression,
+        array_name: str,
+        variables: Context,
+        current: dict[str, Sequence[Value]],
+        gathered: dict[str, Sequence[Value]],
+        iterations: range,
+    ) -> _Scalar | Sequence[Value]:
+        # Checks that all indices are within the bounds of the array.
+        array: Final = variables.get(array_name)
+        if not is_array(array):
+            raise _Fallback()
+        indices: Final = self._values(expression, variables, current, gathered, iterations)
+        if not _types(indices) <= _INTEGRAL_TYPES:
+            raise _Fallback()
+        if isinstance(indices, _Scalar):
+            if indices.value not in range(len(array)):
+                raise _Fallback()
+        elif isinstance(indices, range):
+            if indices[0] not in range(len(array)) or indices[-1] not in range(len(array)):
+                raise _Fallback()
+        elif min(indices) < 0 or max(indices) >= len(array):  # type: ignore[bad-specialization, unsupported-operation]
+            raise _Fallback()
+        return indices
+
+    @staticmethod
+    def _check_store(array: Value, values: Sequence[Value]) -> None:
+        # Every assignment checks that all elements of the array have the type of the value.
+        value_types: Final = set(map(type, values))
+        if len(value_types) != 1:
+            raise _Fallback()
+        if isinstance(array, BufferArray):
+            element_types = {array.element_type}
+            if array.element_type is int and not array.is_readonly and not _fits_int64(values):
+                raise _Fallback()  # The assignment raises a `ValueError`.
+        elif isinstance(array, list):
+            element_types = set(map(type, array))
+        else:
+            raise _Fallback()
+        if element_types != value_types:
+            raise _Fallback()
+
+
+def _recognize_step(statement: Statement) -> Optional[_Step]:
+    match statement:
+        case Assign(target=str() as target, value=value):
+            match value:
+                case BinaryExpression(
+                    left=Variable(name=name),
+                    operator=Operator.ADD | Operator.SUBTRACT | Operator.MULTIPLY as operator_,
+                    right=operand,
+                ) if name == target and target not in expression_variables(operand):
+                    return _Accumulate(target, operator_, operand)
+                case BinaryExpression(
+                    left=operand,
+                    operator=Operator.ADD | Operator.MULTIPLY as operator_,
+                    right=Variable(name=name),
+                ) if name == target and target not in expression_variables(operand):
+                    # Addition and multiplication of numbers are commutative.
+                    return _Accumulate(target, operator_, operand)
+                case _ if target not in expression_variables(value):
+                    return _Set(target, value)
+                case _:
+                    return None
+        case Assign(target=ArrayElement() as element, value=value):
+            return _Store(element.array_name, element.index, value)
+        case If(
+            condition=BinaryExpression() as condition,
+            then_block=[Assign(target=str() as target, value=value)],
+            else_block=[],
+        ) if target not in expression_variables(value):
+            if isinstance(condition.right, Variable) and condition.right.name == target:
+                candidate, comparison = condition.left, condition.operator
+            elif isinstance(condition.left, Variable) and condition.left.name == target:
+                candidate = condition.right
+                comparison = FLIPPED_COMPARISONS.get(condition.operator, condition.operator)
+            else:
+                return None
+            if str(candidate) != str(value) or comparison not in (Operator.GREATER_THAN, Operator.LESS_THAN):
+                return None
+            return _Extremum(target, value, comparison == Operator.GREATER_THAN)
+        case _:
+            return None
+
+
+def _step_reads(step: _Step) -> set[str]:
+    match step:
+        case _Accumulate():
+            return expression_variables(step.operand)
+        case _Set() | _Extremum():
+            return expression_variables(step.value)
+        case _Store():
+            return expression_variables(step.index) | expression_variables(step.value)
+        case _:
+            raise NotImplementedError(f"Kernel step type '{type(step)}' not implemented.")
+
+
+def _recognize(loop: While) -> Optional[Kernel]:
+    condition: Final = loop.condition
+    if not loop.body or not isinstance(condition, BinaryExpression):
+        return None
+    increment: Final = loop.body[-1]
+    if not isinstance(increment, Assign) or not isinstance(increment.target, str):
+        return None
+    induction: Final = increment.target
+    step_size: Final = offset_step(induction, increment.value)
+    if step_size is None:
+        return None
+    if isinstance(condition.left, Variable) and condition.left.name == induction:
+        comparison, bound = condition.operator, condition.right
+    elif isinstance(condition.right, Variable) and condition.right.name == induction:
+        comparison, bound = FLIPPED_COMPARISONS.get(condition.operator, condition.operator), condition.left
+    else:
+        return None
+    if comparison not in (
+        (Operator.LESS_THAN, Operator.LESS_THAN_OR_EQUAL)
+        if step_size > 0
+        else (Operator.GREATER_THAN, Operator.GREATER_THAN_OR_EQUAL)
+    ):
+        return None  # The loop runs forever or not at all.
+
+    steps: Final[list[_Step]] = []
+    for statement in loop.body[:-1]:
+        step = _recognize_step(statement)
+        if step is None:
+            return None
+        steps.append(step)
+    targets: Final = [step.target for step in steps if not isinstance(step, _Store)]
+    stored_arrays: Final = [step.array_name for step in steps if isinstance(step, _Store)]
+    written_arrays: Final = set(stored_arrays)
+    if len(set(targets)) != len(targets) or induction in targets or len(written_arrays) != len(stored_arrays):
+        return None
+    loop_variant: Final = {induction, *targets, *written_arrays}
+    recurrences: Final = frozenset(
+        step.target
+        for step in steps
+        if isinstance(step, _Accumulate) and expression_variables(step.operand).isdisjoint(loop_variant)
+    )
+    extrema: Final = {step.target for step in steps if isinstance(step, _Extremum)}
+    if not expression_variables(bound).isdisjoint(loop_variant):
+        return None
+    assigned_before: set[str] = set(recurrences)
+    read_targets: Final[set[str]] = set()
+    read_variables: Final = expression_variables(bound)
+    for step in steps:
+        reads = _step_reads(step)
+        read_targets.update(reads)
+        read_variables.update(reads)
+        if (reads & written_arrays) or (reads & extrema) or not reads.isdisjoint(set(targets) - assigned_before):
+            return None
+        if not isinstance(step, _Store):
+            assigned_before.add(step.target)
+    return Kernel(
+        induction,
+        step_size,
+        comparison,
+        bound,
+        tuple(steps),
+        recurrences,
+        frozenset(read_targets.intersection(targets)),
+        frozenset(written_arrays),
+        frozenset(read_variables),
+    )
+
+
+@final
+class _NoKernel:
+    pass
+
+
+_NO_KERNEL: Final = _NoKernel()
+# Recognized kernels are shared by all interpreters (and threads) running the same statements.
+_kernels: Final[weakref.WeakKeyDictionary[Statement, Kernel | _NoKernel]] = weakref.WeakKeyDictionary()
+_kernels_lock: Final = threading.Lock()
+
+
+def find_kernel(loop: While) -> Optional[Kernel]:
+    kernel = _kernels.get(loop)
+    record_cache_lookup("kernels", kernel is not None)
+    if kernel is None:
+        with _kernels_lock:
+            kernel = _kernels.setdefault(loop, _recognize(loop) or _NO_KERNEL)
+    return kernel if isinstance(kernel, Kernel) else None
@@ -0,0 +1,218 @@
+import math
+import random
+import string
+from collections.abc import Callable
+from collections.abc import Iterator
+from collections.abc import Mapping
+from collections.abc import Sequence
+from typing import Final
+from typing import NamedTuple
+from typing import Optional
+from typing import final
+
+from nessi.analysis import child_blocks
+from nessi.array_type import ArrayType
+from nessi.batch import Job
+from nessi.program import Program
+from nessi.statements import Block
+from nessi.statements import Do
+from nessi.statements import Input
+from nessi.statements import Loop
+from nessi.statements import While
+from nessi.value import Value
+
+# Generates input values for a program from its `Input` declarations, e.g. for load tests:
+#
+# - Scalar inputs get one value, unless they are read more than once or inside a loop. Then
+#   they get a stream (list) of values, one per read, whose length is drawn like an array size.
+# - Arrays get elements of their element type. Their lengths are either fixed or drawn from
+#   the size distribution and assigned to the input variable that the array type refers to.
+#
+# Values are drawn from per-type distributions, which can be replaced per type or per input
+# (for arrays, the distribution of an input applies to each element).
+
+type ValueDistribution = Callable[[random.Random], Value]
+type SizeDistribution = Callable[[random.Random], int]
+
+
+def uniform_ints(low: int, high: int) -> Callable[[random.Random], int]:
+    # Integers from `low` to `high` (inclusive).
+    return lambda generator: generator.randint(low, high)
+
+
+def log_uniform_ints(low: int, high: int) -> Callable[[random.Random], int]:
+    # Integers from `low` to `high` (inclusive, `low` >= 1) whose orders of magnitude are
+    # uniformly distributed, e.g. for array sizes that vary over orders of magnitude.
+    return lambda generator: min(high, int(math.exp(generator.uniform(math.log(low), math.log(high + 1)))))
+
+
+def uniform_floats(low: float, high: float) -> Callable[[random.Random], float]:
+    return lambda generator: generator.uniform(low, high)
+
+
+def normal_floats(mean: float, deviation: float) -> Callable[[random.Random], float]:
+    return lambda generator: generator.gauss(mean, deviation)
+
+
+def choices(values: Sequence[Value]) -> ValueDistribution:
+    return lambda generator: generator.choice(values)
+
+
+def _words(generator: random.Random) -> str:
+    return "".join(generator.choices(string.ascii_lowercase, k=generator.randint(1, 10)))
+
+
+DEFAULT_DISTRIBUTIONS: Final[Mapping[type, ValueDistribution]] = {
+    bool: choices([False, True]),
+    int: uniform_ints(-1000, 1000),
+    float: uniform_floats(-1000.0, 1000.0),
+    str: _words,
+}
+
+
+@final
+class UnsupportedInputError(ValueError):
+    def __init__(self, name: str, message: str) -> None:
+        super().__init__(f"Cannot generate values for input '{name}': {message}")
+
+
+@final
+class InputDeclaration(NamedTuple):
+    name: str
+    type_: type | ArrayType
+    # The number of `Input` statements that read the input.
+    reads: int
+    is_read_in_loop: bool
+
+    @property
+    def is_stream(self) -> bool:
+        return not isinstance(self.type_, ArrayType) and (self.reads > 1 or self.is_read_in_loop)
+
+
+def _collect_inputs(block: Block, is_in_loop: bool, declarations: dict[str, InputDeclaration]) -> None:
+    for statement in block:
+        if isinstance(statement, Input):
+            declaration = declarations.get(statement.target)
+            if declaration is None:
+                declarations[statement.target] = InputDeclaration(statement.target, statement.type_, 1, is_in_loop)
+            elif declaration.type_ != statement.type_:
+                raise UnsupportedInputError(statement.target, "it is declared with different types")
+            else:
+                declarations[statement.target] = declaration._replace(
+                    reads=declaration.reads + 1,
+                    is_read_in_loop=declaration.is_read_in_loop or is_in_loop,
+                )
+        for child_block in child_blocks(statement):
+            _collect_inputs(child_block, is_in_loop or isinstance(statement, (While, Do, Loop)), declarations)
+
+
+def input_declarations(statements: Block) -> list[InputDeclaration]:
+    # The inputs of the statements in the order in which they are first read.
+    declarations: Final[dict[str, InputDeclaration]] = {}
+    _collect_inputs(statements, False, declarations)
+    return list(declarations.values())
+
+
+@final
+class InputGenerator:
+    def __init__(
+        self,
+        program: Program,
+        *,
+        size: int | SizeDistribution = 100,
+        distributions: Optional[Mapping[type, ValueDistribution]] = None,
+        inputs: Optional[Mapping[str, ValueDistribution]] = None,
+        seed: Optional[int] = None,
+    ) -> None:
+        # `size` is the length of arrays with variable lengths and of input streams.
+        # `distributions` replace the default distributions per type, `inputs` per input.
+        self._declarations: Final = input_declarations(program.statements)
+        self._size: Final = size
+        self._distributions: Final = {**DEFAULT_DISTRIBUTIONS, **(distributions or {})}
+        self._inputs: Final = dict(inputs or {})
+        self._generator: Final = random.Random(seed)
+        declared: Final = {declaration.name: declaration for declaration in self._declarations}
+        # The inputs that hold the lengths of arrays.
+        self._length_inputs: Final[set[str]] = set()
+        for declaration in self._declarations:
+            if isinstance(declaration.type_, ArrayType) and isinstance(declaration.type_.length, str):
+                length_declaration = declared.get(declaration.type_.length)
+                if (
+                    length_declaration is None
+                    or length_declaration.type_ is not int
+                    or length_declaration.is_stream
+                    or self._declarations.index(length_declaration) > self._declarations.index(declaration)
+                ):
+                    raise UnsupportedInputError(
+                        declaration.name,
+                        f"its length '{declaration.type_.length}' is not an integer input that is read once before",
+                    )
+                self._length_inputs.add(length_declaration.name)
+        for declaration in self._declarations:
+            type_ = declaration.type_.type_ if isinstance(declaration.type_, ArrayType) else declaration.type_
+            if declaration.name not in self._inputs and type_ not in self._distributions:
+                raise UnsupportedInputError(declaration.name, f"no distribution for {type_.__name__} values")
+
+    @property
+    def declarations(self) -> list[InputDeclaration]:
+        return list(self._declarations)
+
+    def generate(self) -> dict[str, Value]:
+        input_values: Final[dict[str, Value]] = {}
+        lengths: Final[dict[str, int]] = {}
+        for declaration in self._declarations:
+            name = declaration.name
+            type_ = declaration.type_
+            if name in self._length_inputs:
+                input_values[name] = lengths[name] = self._draw_size()
+            elif isinstance(type_, ArrayType):
+                length = type_.length if isinstance(type_.length, int) else lengths[type_.length]
+                input_values[name] = self._draw_values(name, type_.type_, length)  # type: ignore[assignment]
+            elif declaration.is_stream:
+                input_values[name] = self._draw_values(name, type_, self._draw_size())  # type: ignore[assignment]
+            else:
+                input_values[name] = self._distribution(name, type_)(self._generator)
+        return input_values
+
+    def __iter__(self) -> Iterator[dict[str, Value]]:
+        # An endless stream of input sets.
+        while True:
+            yield self.generate()
+
+    def _draw_size(self) -> int:
+        return self._size if isinstance(self._size, int) else self._size(self._generator)
+
+    def _distribution(self, name: str, type_: type) -> ValueDistribution:
+        return self._inputs.get(name) or self._distributions[type_]
+
+    def _draw_values(self, name: str, type_: type, count: int) -> list[Value]:
+        distribution: Final = self._distribution(name, type_)
+        generator: Final = self._generator
+        return [distribution(generator) for _ in range(count)]
+
+
+def generate_jobs(
+    program: Program,
+    input_sets: Iterator[dict[str, Value]],
+    runs: int,
+    *,
+    runs_per_job: int = 100,
+    fuel: Optional[int] = None,
+    time_limit: Optional[float] = None,
+    max_output_bytes: Optional[int] = None,
+    memory_limit: Optional[int] = None,
+) -> Iterator[Job]:
+    # Lazily groups `runs` input sets into jobs for `nessi.batch.run_jobs()`, which consumes
+    # them as workers become free, so that the number of runs is only limited by time.
+    job_count: Final = -(-runs // runs_per_job)
+    for job_index in range(job_count):
+        job_runs = min(runs_per_job, runs - job_index * runs_per_job)
+        yield Job(
+            str(job_index),
+            program,
+            [next(input_sets) for _ in range(job_runs)],
+            fuel=fuel,
+            time_limit=time_limit,
+            max_output_bytes=max_output_bytes,
+            memory_limit=memory_limit,
+        )
@@ -0,0 +1,107 @@
+from collections.abc import Sequence
+from typing import Final
+from typing import final
+
+from nessi.array_type import ArrayType
+from nessi.buffer_array import BufferArray
+from nessi.context import Context
+from nessi.statements import Input
+from nessi.value import Value
+from nessi.value import is_array
+
+# The input values of a run. Each input is validated only once per type it is read as, so
+# that reading an input costs O(1) after the first read:
+#
+# - A list that is read by scalar `Input` statements is a stream of values. A read fails if
+#   any of the remaining values doesn't have the input's type, so only the position of the
+#   last mismatching value is computed, and the values are consumed by advancing a cursor
+#   instead of removing them from the list.
+# - The types of the values of a list are collected in one C-level pass
+#   (`frozenset(map(type, ...))`). Element assignments keep the element types of an array,
+#   so they stay valid when the array is read again.
+#
+# Errors are still raised by the `Input` statement that reads an invalid value.
+
+
+@final
+class InputExhaustedError(IndexError):
+    def __init__(self, name: str) -> None:
+        super().__init__(f"All input values for '{name}' have already been read.")
+
+
+@final
+class InputValues:
+    def __init__(self, input_values: dict[str, Value]) -> None:
+        # Reading inputs consumes list values and input arrays become (mutable) variables, so
+        # every run works on its own copy. Buffer arrays (see `nessi.buffer_array`) are bound
+        # without copying.
+        self._values: Final = {
+            name: list(value) if isinstance(value, list) else value for name, value in input_values.items()
+        }
+        # The number of values of a stream that have been read.
+        self._positions: Final[dict[str, int]] = {}
+        # The index of the last value of a stream that isn't of a given type (or -1).
+        self._last_mismatches: Final[dict[str, dict[type, int]]] = {}
+        self._value_types: Final[dict[str, frozenset[type]]] = {}
+
+    def __contains__(self, name: str) -> bool:
+        return self._values.get(name) is not None
+
+    def read(self, statement: Input, context: Context) -> Value:
+        # Returns the value that `statement` assigns to its target, which has to be
+        # contained in the input values.
+        name: Final = statement.target
+        value: Final = self._values[name]
+        type_: Final = statement.type_
+        if isinstance(type_, ArrayType):
+            return self._read_array(name, type_, context)
+        if not isinstance(value, list):
+            if not isinstance(value, type_):
+                raise TypeError(f"Cannot assign {value} to {name}: expected {type_.__name__}")
+            return value
+        position: Final = self._positions.get(name, 0)
+        if self._last_mismatch(name, value, type_) >= position:
+            raise TypeError(f"Cannot assign {value[position:]} to {name}: expected {type_.__name__}")
+        if position == len(value):
+            raise InputExhaustedError(name)
+        self._positions[name] = position + 1
+        return value[position]
+
+    def _last_mismatch(self, name: str, values: Sequence[Value], type_: type) -> int:
+        last_mismatches: Final = self._last_mismatches.setdefault(name, {})
+        last_mismatch = last_mismatches.get(type_)
+        if last_mismatch is None:
+            if all(issubclass(value_type, type_) for value_type in self._types(name, values)):
+                last_mismatch = -1
+            else:
+                last_mismatch = next(
+                    index for index in range(len(values) - 1, -1, -1) if not isinstance(values[index], type_)
+                )
+            last_mismatches[type_] = last_mismatch
+        return last_mismatch
+
+    def _read_array(self, name: str, type_: ArrayType, context: Context) -> Value:
+        value = self._values[name]
+        if not is_array(value):
+            raise TypeError(f"Cannot assign {value} to {name}: expected list")
+        position: Final = self._positions.pop(name, 0)
+        if position > 0:
+            # Reading an array after reading values of the same input as a stream.
+            del value[:position]  # type: ignore[union-attr]
+            self._last_mismatches.pop(name, None)
+            self._value_types.pop(name, None)
+        array_length: Final = type_.length if isinstance(type_.length, int) else context[type_.length]
+        if len(value) != array_length:
+            raise ValueError(
+                f"Cannot assign {value!r} to {name}: expected list of length {array_length}, got {len(value)}"
+            )
+        if not all(issubclass(element_type, type_.type_) for element_type in self._types(name, value)):
+            raise TypeError(f"Cannot assign {value!r} to {name}: expected list of {type_.type_.__name__}")
+        return value
+
+    def _types(self, name: str, values: Sequence[Value]) -> frozenset[type]:
+        types = self._value_types.get(name)
+        if types is None:
+            types = frozenset((values.element_type,) if isinstance(values, BufferArray) else map(type, values))
+            self._value_types[name] = types
+        return types
@@ -3,6 +3,7 @@ from typing import final
 from typing import override
 
 from nessi.value import Value
+from nessi.value import is_array
 
 
 @final
@@ -46,7 +47,7 @@ class InterpolatedString:
                     result_parts.append(match_.group(0))
                     continue
                 index_value = values[index]
-                if not isinstance(value, list):
+                if not is_array(value):
                     raise TypeError(f"Value for key '{key}' is not a list.")
                 if not isinstance(index_value, int):
                     raise TypeError(f"Index value for key '{index}' is not an integer.")
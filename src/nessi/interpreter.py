@@ -1,13 +1,21 @@
+import sys
+import time
+from typing import TYPE_CHECKING
 from typing import Final
 from typing import Optional
 from typing import final
 from typing import override
 
-from nessi.array_type import ArrayType
+from nessi.buffer_array import BufferArray
 from nessi.expressions import ArrayElement
+from nessi.idioms import find_kernel
+from nessi.inputs import InputValues
+from nessi.output import OutputSink
+from nessi.output import StringSink
 from nessi.statement_visitor import Statement
 from nessi.statement_visitor import StatementVisitor
 from nessi.statements import Assign
+from nessi.statements import Block
 from nessi.statements import Break
 from nessi.statements import Do
 from nessi.statements import DocumentedBlock
@@ -17,8 +25,15 @@ from nessi.statements import Loop
 from nessi.statements import Match
 from nessi.statements import Print
 from nessi.statements import While
-from nessi.statements import is_match_arm_condition_satisfied
+from nessi.tiering import HOT_LOOP_THRESHOLD
+from nessi.tiering import find_compiled_loop
 from nessi.value import Value
+from nessi.value import is_array
+from nessi.value import value_size
+
+if TYPE_CHECKING:
+    from nessi.coverage import Coverage
+    from nessi.tracing import Tracer
 
 
 @final
@@ -40,27 +55,95 @@ class UnexhaustiveMatchError(ValueError):
 
 
 @final
-class Interpreter(StatementVisitor[str]):
-    def __init__(self, input_values: dict[str, Value]) -> None:
-        self._input_values = input_values
+class FuelExhaustedError(RuntimeError):
+    def __init__(self, fuel: int) -> None:
+        super().__init__(f"Program did not finish within {fuel} executed statements.")
+
+
+@final
+class TimeLimitExceededError(RuntimeError):
+    def __init__(self, time_limit: float) -> None:
+        super().__init__(f"Program did not finish within {time_limit:g} seconds.")
+
+
+@final
+class MemoryLimitExceededError(RuntimeError):
+    def __init__(self, memory_limit: int) -> None:
+        super().__init__(f"Program exceeded the memory limit of {memory_limit} bytes.")
+
+
+@final
+class Interpreter(StatementVisitor[None]):
+    # Reading the clock is comparatively expensive, so the time limit is only checked
+    # every this many statements.
+    _TIME_LIMIT_CHECK_INTERVAL = 1024
+
+    def __init__(
+        self,
+        input_values: dict[str, Value],
+        *,
+        output: Optional[OutputSink] = None,
+        fuel: Optional[int] = None,
+        time_limit: Optional[float] = None,
+        tracer: Optional["Tracer"] = None,
+        checked: bool = True,
+        tiering: bool = True,
+        memory_limit: Optional[int] = None,
+        coverage: Optional["Coverage"] = None,
+    ) -> None:
+        # `checked=False` skips the checks of the program's structure (break labels, empty
+        # 'then' blocks) and may only be used for programs that passed validation (see
+        # `nessi.validation`). With `tiering`, hot loops are compiled to Python code (see
+        # `nessi.tiering`), unless statements are traced or their `coverage` is recorded.
+        # With a `memory_limit` (in bytes), the approximate size of the variables and of the
+        # output that the sink keeps in memory is tracked, and the program is stopped with a
+        # `MemoryLimitExceededError` once it exceeds the limit. Compiled loops are checked
+        # when they are left and whenever they check the other limits.
+        # Every run works on its own copy of the input values (see `nessi.inputs`). This
+        # allows running a program concurrently.
+        self._input_values: Final = InputValues(input_values)
+        self._output: Final = output if output is not None else StringSink()
         self._variables: dict[str, Value] = {}
+        self._element_types: Final[dict[int, tuple[list[int] | list[float], Optional[type]]]] = {}
         self._loop_label_stack: list[str] = []
         self._current_break_label: Optional[str] = None
+        self._statements_executed = 0
+        self._fuel = fuel
+        self._start_time = time.monotonic()
+        self._deadline = None if time_limit is None else self._start_time + time_limit
+        self._tracer = tracer
+        self._checked = checked
+        self._coverage = coverage
+        self._tiering = tiering and tracer is None and coverage is None
+        self._memory_limit = memory_limit
+        self._variable_sizes: Final[dict[str, int]] = {}
+        self._variables_memory = 0
+        self._peak_memory = 0
 
     @override
-    def visit(self, statement: Statement) -> str:
+    def visit(self, statement: Statement) -> None:
+        self._statements_executed += 1
+        if self._fuel is not None and self._statements_executed > self._fuel:
+            raise FuelExhaustedError(self._fuel)
+        if (
+            self._deadline is not None
+            and self._statements_executed % Interpreter._TIME_LIMIT_CHECK_INTERVAL == 0
+            and time.monotonic() > self._deadline
+        ):
+            raise TimeLimitExceededError(self._deadline - self._start_time)
+        if self._tracer is not None:
+            self._tracer.record_statement(statement)
+        if self._coverage is not None:
+            self._coverage.record_statement(statement)
         match statement:
             case Input():
-                input_value: Final = self._get_input_value(statement.target)
-                statement.raise_if_not_assignable(input_value, self.variables)
-                if isinstance(input_value, list) and not isinstance(statement.type_, ArrayType):
-                    first_value: Final = input_value.pop(0)
-                    self._store_value(statement.target, first_value)
-                else:
-                    self._store_value(statement.target, input_value)
-                return ""  # No output.
+                if statement.target not in self._input_values:
+                    raise MissingValueForInputError(statement.target)
+                self._store_value(statement.target, self._input_values.read(statement, self.variables))
             case Print():
-                return f"{statement.render(self.variables)}\n"
+                self._output.write(statement, f"{statement.render(self.variables)}\n")
+                if self._memory_limit is not None:
+                    self._check_memory()
             case Assign():
                 value: Final = statement.value.evaluate(self.variables)
                 # No type checking here. ¯\_(ツ)_/¯
@@ -70,90 +153,122 @@ class Interpreter(StatementVisitor[str]):
                     case ArrayElement() as array_element:
                         array_name: Final = array_element.array_name
                         index: Final = array_element.index.evaluate(context=self.variables)
-                        array_value: Final = self.variables.get(array_name)
-                        if not isinstance(array_value, list):
+                        array_value = self.variables.get(array_name)
+                        if not is_array(array_value):
                             raise TypeError(f"Variable '{array_name}' is not an array.")
                         if not isinstance(index, int):
                             raise TypeError(f"Array index must be an integer, got {type(index)}.")
                         if index not in range(len(array_value)):
                             raise IndexError(f"Array index {index} out of bounds for array of size {len(array_value)}.")
-                        if any(type(item) is not type(value) for item in array_value):
+                        if type(value) is not (
+                            array_value.element_type
+                            if isinstance(array_value, BufferArray)
+                            else self._element_type(array_value)
+                        ):
                             raise TypeError(f"Array '{array_name}' contains elements of different types.")
+                        if isinstance(array_value, BufferArray) and array_value.is_readonly:
+                            # Copy on write.
+                            array_value = self._variables[array_name] = list(array_value)
+                            if self._memory_limit is not None:
+                                self._account(array_name, array_value)
+                        if self._memory_limit is not None:
+                            self._account_element(array_name, array_value[index], value)
                         # We just checked that the arrays are compatible (or empty, but 🤫). Therefore,
                         # we ignore the error in the next line.
                         array_value[index] = value  # type: ignore[unsupported-operation]
-                return ""  # No output.
+                        if self._tracer is not None:
+                            self._tracer.record_element_write(array_name, index, value)
             case If():
                 is_condition_satisfied = statement.condition.evaluate(self.variables)
                 if not isinstance(is_condition_satisfied, bool):
                     raise TypeError(f"Condition must evaluate to a boolean, got {type(is_condition_satisfied)}.")
-                if not statement.then_block:
+                if self._checked and not statement.then_block:
                     raise ValueError("If statement must have a 'then' block.")
-                return self._evaluate_block(statement.then_block if is_condition_satisfied else statement.else_block)
+                if self._tracer is not None:
+                    self._tracer.record_branch(statement, 0 if is_condition_satisfied else 1)
+                if self._coverage is not None:
+                    self._coverage.record_branch(statement, 0 if is_condition_satisfied else 1)
+                self._evaluate_block(statement.then_block if is_condition_satisfied else statement.else_block)
             case While():
-                if statement.label is not None:
+                if self._checked and statement.label is not None:
                     self._loop_label_stack.append(statement.label)
-                output = ""
-                while True:
+                iterations = 0
+                while not (self._tiering and self._run_compiled_loop(statement, iterations)):
+                    iterations += 1
                     is_condition_satisfied = statement.condition.evaluate(self.variables)
                     if not isinstance(is_condition_satisfied, bool):
                         raise TypeError(f"Condition must evaluate to a boolean, got {type(is_condition_satisfied)}.")
+                    if self._tracer is not None:
+                        self._tracer.record_branch(statement, int(is_condition_satisfied))
                     if not is_condition_satisfied:
                         break
-                    output += self._evaluate_block(statement.body)
+                    self._evaluate_block(statement.body)
                     if self._current_break_label is not None:
                         break
+                if self._coverage is not None:
+                    # The last iteration only evaluated the condition, unless the body broke out.
+                    self._coverage.record_loop(statement, iterations - (self._current_break_label is None))
                 if statement.label is not None:
                     if self._current_break_label == statement.label:
                         self._current_break_label = None
-                    self._loop_label_stack.pop()
-                return output
+                    if self._checked:
+                        self._loop_label_stack.pop()
             case Do():
-                if statement.label is not None:
+                if self._checked and statement.label is not None:
                     self._loop_label_stack.append(statement.label)
-                output = ""
-                while True:
-                    output += self._evaluate_block(statement.body)
+                iterations = 0
+                while not (self._tiering and self._run_compiled_loop(statement, iterations)):
+                    iterations += 1
+                    self._evaluate_block(statement.body)
                     condition: Final = statement.condition
                     if condition is None:
                         raise ValueError("Do statement must have a condition.")
                     is_condition_satisfied = condition.evaluate(self.variables)
                     if not isinstance(is_condition_satisfied, bool):
                         raise TypeError(f"Condition must evaluate to a boolean, got {type(is_condition_satisfied)}.")
+                    if self._tracer is not None:
+                        self._tracer.record_branch(statement, int(is_condition_satisfied))
                     if not is_condition_satisfied or self._current_break_label is not None:
                         break
+                if self._coverage is not None:
+                    self._coverage.record_loop(statement, iterations)
                 if statement.label is not None:
                     if self._current_break_label == statement.label:
                         self._current_break_label = None
-                    self._loop_label_stack.pop()
-                return output
+                    if self._checked:
+                        self._loop_label_stack.pop()
             case Loop():
-                if statement.label is not None:
+                if self._checked and statement.label is not None:
                     self._loop_label_stack.append(statement.label)
-                output = ""
-                while True:
-                    output += self._evaluate_block(statement.body)
+                iterations = 0
+                while not (self._tiering and self._run_compiled_loop(statement, iterations)):
+                    iterations += 1
+                    self._evaluate_block(statement.body)
                     if self._current_break_label is not None:
                         break
+                if self._coverage is not None:
+                    self._coverage.record_loop(statement, iterations)
                 if statement.label is not None:
                     if self._current_break_label == statement.label:
                         self._current_break_label = None
-                    self._loop_label_stack.pop()
-                return output
+                    if self._checked:
+                        self._loop_label_stack.pop()
             case Break():
-                if statement.label not in self._loop_label_stack:
+                if self._checked and statement.label not in self._loop_label_stack:
                     raise InvalidBreakLabelError(statement.label)
                 self._current_break_label = statement.label
-                return ""  # No output.
             case DocumentedBlock():
-                return self._evaluate_block(statement.block)
+                self._evaluate_block(statement.block)
             case Match():
                 matched_value: Final = statement.value.evaluate(self.variables)
-                for arm in statement.arms:
-                    arm_value = arm.condition.evaluate(self.variables)
-                    if is_match_arm_condition_satisfied(matched_value, arm.operator, arm_value):
-                        return self._evaluate_block(arm.body)
-                raise UnexhaustiveMatchError()
+                matched_arm_index: Final = statement.dispatch.find_arm_index(matched_value, self.variables)
+                if matched_arm_index is None:
+                    raise UnexhaustiveMatchError()
+                if self._tracer is not None:
+                    self._tracer.record_branch(statement, matched_arm_index)
+                if self._coverage is not None:
+                    self._coverage.record_branch(statement, matched_arm_index)
+                self._evaluate_block(statement.arms[matched_arm_index].body)
             case _:
                 raise NotImplementedError(f"Statement type '{type(statement)}' not implemented.")
 
@@ -161,19 +276,138 @@ class Interpreter(StatementVisitor[str]):
     def variables(self) -> dict[str, Value]:
         return self._variables
 
-    def _evaluate_block(self, block: list[Statement]) -> str:
-        output = ""
+    @property
+    def output(self) -> OutputSink:
+        return self._output
+
+    @property
+    def statements_executed(self) -> int:
+        return self._statements_executed
+
+    @property
+    def memory_used(self) -> int:
+        # The approximate memory used by the variables and the buffered output in bytes.
+        if self._memory_limit is None:
+            return sum(map(value_size, self._variables.values())) + self._output.buffered_bytes
+        return self._variables_memory + self._output.buffered_bytes
+
+    @property
+    def peak_memory(self) -> Optional[int]:
+        # The highest `memory_used` seen while checking the memory limit, `None` without one.
+        return None if self._memory_limit is None else max(self._peak_memory, self.memory_used)
+
+    def _run_compiled_loop(self, loop: While | Do | Loop, iterations: int) -> bool:
+        # Called at every iteration boundary of an interpreted loop. Runs the rest of the
+        # loop as compiled code and returns `True` if the loop is (or was) hot and could be
+        # compiled for the current variable types. Recognized array loops (see
+        # `nessi.idioms`) run as a whole right away.
+        if iterations != 0 and iterations != HOT_LOOP_THRESHOLD:
+            return False
+        if iterations == 0 and isinstance(loop, While) and self._run_kernel(loop):
+            return True
+        compiled: Final = find_compiled_loop(
+            loop,
+            self._variables,
+            self._loop_label_stack if self._checked else None,
+            is_hot=iterations == HOT_LOOP_THRESHOLD,
+            element_type=self._element_type,
+        )
+        if compiled is None:
+            return False
+        self._statements_executed, self._current_break_label = compiled(
+            self._variables,
+            self._statements_executed,
+            self._next_limit(self._statements_executed),
+            self._check_limits,
+        )
+        if self._fuel is not None and self._statements_executed > self._fuel:
+            raise FuelExhaustedError(self._fuel)
+        if self._memory_limit is not None:
+            self._measure_memory()
+        return True
+
+    def _run_kernel(self, loop: While) -> bool:
+        kernel: Final = find_kernel(loop)
+        if kernel is None:
+            return False
+        # Kernels consist of a few C-level operations and don't check the time limit.
+        statements_executed: Final = kernel.run(
+            self._variables,
+            self._statements_executed,
+            sys.maxsize if self._fuel is None else self._fuel,
+        )
+        if statements_executed is None:
+            return False
+        self._statements_executed = statements_executed
+        if self._memory_limit is not None:
+            self._measure_memory()
+        return True
+
+    def _next_limit(self, statements_executed: int) -> int:
+        # The number of executed statements after which compiled code has to call
+        # `_check_limits()`.
+        limit = sys.maxsize if self._fuel is None else self._fuel
+        if self._deadline is not None or self._memory_limit is not None:
+            interval: Final = Interpreter._TIME_LIMIT_CHECK_INTERVAL
+            limit = min(limit, statements_executed - statements_executed % interval + interval - 1)
+        return limit
+
+    def _check_limits(self, statements_executed: int) -> int:
+        if self._fuel is not None and statements_executed > self._fuel:
+            raise FuelExhaustedError(self._fuel)
+        if self._deadline is not None and time.monotonic() > self._deadline:
+            raise TimeLimitExceededError(self._deadline - self._start_time)
+        if self._memory_limit is not None:
+            # Compiled code writes its variables back before calling this.
+            self._measure_memory()
+        return self._next_limit(statements_executed)
+
+    def _evaluate_block(self, block: Block) -> None:
         for statement in block:
-            output += self.visit(statement)
+            self.visit(statement)
             if self._current_break_label is not None:
                 break
-        return output
 
     def _store_value(self, name: str, value: Value) -> None:
         self._variables[name] = value
+        if self._tracer is not None:
+            self._tracer.record_write(name, value)
+        if self._memory_limit is not None:
+            self._account(name, value)
+
+    def _account(self, name: str, value: Value) -> None:
+        size: Final = value_size(value)
+        self._variables_memory += size - self._variable_sizes.get(name, 0)
+        self._variable_sizes[name] = size
+        self._check_memory()
+
+    def _account_element(self, array_name: str, old_value: Value, new_value: Value) -> None:
+        size_change: Final = sys.getsizeof(new_value) - sys.getsizeof(old_value)
+        if size_change != 0:
+            self._variable_sizes[array_name] = self._variable_sizes.get(array_name, 0) + size_change
+            self._variables_memory += size_change
+            self._check_memory()
+
+    def _measure_memory(self) -> None:
+        # Measures all variables again, after compiled code changed them.
+        self._variable_sizes.clear()
+        self._variable_sizes.update((name, value_size(value)) for name, value in self._variables.items())
+        self._variables_memory = sum(self._variable_sizes.values())
+        self._check_memory()
+
+    def _check_memory(self) -> None:
+        memory: Final = self._variables_memory + self._output.buffered_bytes
+        if memory > self._peak_memory:
+            self._peak_memory = memory
+        if self._memory_limit is not None and memory > self._memory_limit:
+            raise MemoryLimitExceededError(self._memory_limit)
 
-    def _get_input_value(self, name: str) -> Value:
-        value = self._input_values.get(name)
-        if value is None:
-            raise MissingValueForInputError(name)
-        return value
+    def _element_type(self, array: list[int] | list[float]) -> Optional[type]:
+        # The type of all elements of a list, or `None` if they have different types.
+        # Element assignments keep the type, so it is only determined once per list. The
+        # lists are kept alive, so that their ids aren't reused.
+        entry = self._element_types.get(id(array))
+        if entry is None:
+            types: Final = set(map(type, array))
+            entry = self._element_types[id(array)] = (array, types.pop() if len(types) == 1 else None)
+        return entry[1]
@@ -0,0 +1,334 @@
+import math
+import os
+import threading
+from abc import ABC
+from abc import abstractmethod
+from bisect import bisect_left
+from collections.abc import Iterator
+from collections.abc import Sequence
+from typing import TYPE_CHECKING
+from typing import Final
+from typing import NamedTuple
+from typing import Optional
+from typing import final
+from typing import override
+
+if TYPE_CHECKING:
+    from http.server import ThreadingHTTPServer
+
+# In-process metrics of the interpreter, exported in the Prometheus text format to a file
+# (e.g. for the node exporter's textfile collector) or over HTTP.
+#
+# Every thread updates its own cell of a metric, so updates take no locks and don't contend
+# on free-threaded builds. Exporting sums the cells of all threads. Metrics are per process:
+# `nessi.batch.run_jobs()` records the runs of its worker processes from their results.
+
+type Labels = tuple[str, ...]
+
+CONTENT_TYPE: Final = "text/plain; version=0.0.4; charset=utf-8"
+
+# Run durations from 100 µs to 10 s.
+DURATION_BUCKETS: Final = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 10.0)
+STATEMENT_BUCKETS: Final = (10, 100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000, 100_000_000)
+
+
+def _format_value(value: float) -> str:
+    if isinstance(value, int):
+        return str(value)
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(value)
+
+
+def _escape(label_value: str) -> str:
+    return label_value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+class Metric[T](ABC):
+    def __init__(self, name: str, help_: str, label_names: Sequence[str]) -> None:
+        self._name: Final = name
+        self._help: Final = help_
+        self._label_names: Final = tuple(label_names)
+        self._local: Final = threading.local()
+        self._cells: Final[list[dict[Labels, T]]] = []
+        self._cells_lock: Final = threading.Lock()
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    @property
+    def label_names(self) -> Labels:
+        return self._label_names
+
+    def _cell(self) -> dict[Labels, T]:
+        # The cell of the current thread.
+        cell: Optional[dict[Labels, T]] = getattr(self._local, "cell", None)
+        if cell is None:
+            cell = {}
+            with self._cells_lock:
+                self._cells.append(cell)
+            self._local.cell = cell
+        return cell
+
+    def _check_labels(self, labels: Labels) -> None:
+        if len(labels) != len(self._label_names):
+            raise ValueError(
+                f"Metric '{self._name}' has the labels ({', '.join(self._label_names)}), got {len(labels)} values."
+            )
+
+    def _cell_snapshots(self) -> list[dict[Labels, T]]:
+        with self._cells_lock:
+            cells: Final = list(self._cells)
+        return [dict(cell) for cell in cells]
+
+    def render(self) -> str:
+        lines: Final = [f"# HELP {self._name} {self._help}", f"# TYPE {self._name} {self.type_}"]
+        lines.extend(self._sample_lines())
+        return "\n".join(lines) + "\n"
+
+    @property
+    @abstractmethod
+    def type_(self) -> str:
+        pass
+
+    @abstractmethod
+    def _sample_lines(self) -> Iterator[str]:
+        pass
+
+
+@final
+class Counter(Metric[float]):
+    def inc(self, amount: float = 1, labels: Labels = ()) -> None:
+        cell: Final = self._cell()
+        if labels in cell:
+            cell[labels] += amount
+        else:
+            self._check_labels(labels)
+            cell[labels] = amount
+
+    def value(self, labels: Labels = ()) -> float:
+        return sum(cell.get(labels, 0) for cell in self._cell_snapshots())
+
+    def values(self) -> dict[Labels, float]:
+        totals: Final[dict[Labels, float]] = {}
+        for cell in self._cell_snapshots():
+            for labels, value in cell.items():
+                totals[labels] = totals.get(labels, 0) + value
+        return totals
+
+    @property
+    @override
+    def type_(self) -> str:
+        return "counter"
+
+    @override
+    def _sample_lines(self) -> Iterator[str]:
+        for labels, value in sorted(self.values().items()):
+            yield f"{self.name}{_format_labels(self.label_names, labels)} {_format_value(value)}"
+
+
+@final
+class HistogramSnapshot(NamedTuple):
+    # The cumulative count of observations per bucket (`<=` its upper bound), the last one
+    # for +Inf, i.e. all observations.
+    bucket_counts: list[int]
+    sum: float
+
+    @property
+    def observation_count(self) -> int:
+        return self.bucket_counts[-1]
+
+
+@final
+class Histogram(Metric[list[float]]):
+    def __init__(
+        self,
+        name: str,
+        help_: str,
+        label_names: Sequence[str],
+        *,
+        buckets: Sequence[float] = DURATION_BUCKETS,
+    ) -> None:
+        super().__init__(name, help_, label_names)
+        if list(buckets) != sorted(set(buckets)):
+            raise ValueError(f"The buckets of histogram '{name}' must be increasing.")
+        self._buckets: Final = tuple(buckets)
+
+    @property
+    def buckets(self) -> tuple[float, ...]:
+        return self._buckets
+
+    def observe(self, value: float, labels: Labels = ()) -> None:
+        cell: Final = self._cell()
+        counts = cell.get(labels)
+        if counts is None:
+            self._check_labels(labels)
+            # One count per bucket, one for +Inf and the sum of the observations.
+            counts = cell[labels] = [0.0] * (len(self._buckets) + 2)
+        counts[bisect_left(self._buckets, value)] += 1
+        counts[-1] += value
+
+    def snapshots(self) -> dict[Labels, HistogramSnapshot]:
+        totals: Final[dict[Labels, list[float]]] = {}
+        for cell in self._cell_snapshots():
+            for labels, counts in cell.items():
+                counts = list(counts)
+                total = totals.get(labels)
+                if total is None:
+                    totals[labels] = counts
+                else:
+                    totals[labels] = [a + b for a, b in zip(total, counts)]
+        snapshots: Final[dict[Labels, HistogramSnapshot]] = {}
+        for labels, counts in totals.items():
+            cumulative = 0
+            bucket_counts = []
+            for count in counts[:-1]:
+                cumulative += int(count)
+                bucket_counts.append(cumulative)
+            snapshots[labels] = HistogramSnapshot(bucket_counts, counts[-1])
+        return snapshots
+
+    def snapshot(self, labels: Labels = ()) -> HistogramSnapshot:
+        return self.snapshots().get(labels) or HistogramSnapshot([0] * (len(self._buckets) + 1), 0)
+
+    @property
+    @override
+    def type_(self) -> str:
+        return "histogram"
+
+    @override
+    def _sample_lines(self) -> Iterator[str]:
+        names: Final = (*self.label_names, "le")
+        bounds: Final = [_format_value(bound) for bound in self._buckets] + ["+Inf"]
+        for labels, snapshot in sorted(self.snapshots().items()):
+            for bound, count in zip(bounds, snapshot.bucket_counts):
+                yield f"{self.name}_bucket{_format_labels(names, (*labels, bound))} {count}"
+            yield f"{self.name}_sum{_format_labels(self.label_names, labels)} {_format_value(snapshot.sum)}"
+            yield f"{self.name}_count{_format_labels(self.label_names, labels)} {snapshot.observation_count}"
+
+
+@final
+class MetricsRegistry:
+    def __init__(self) -> None:
+        self._metrics: Final[dict[str, Metric]] = {}
+        self._lock: Final = threading.Lock()
+
+    def counter(self, name: str, help_: str, label_names: Sequence[str] = ()) -> Counter:
+        # Returns the registered counter with this name, or registers a new one.
+        metric: Final = self._register(Counter(name, help_, label_names))
+        if not isinstance(metric, Counter):
+            raise ValueError(f"Metric '{name}' is already registered as a {metric.type_}.")
+        return metric
+
+    def histogram(
+        self,
+        name: str,
+        help_: str,
+        label_names: Sequence[str] = (),
+        *,
+        buckets: Sequence[float] = DURATION_BUCKETS,
+    ) -> Histogram:
+        metric: Final = self._register(Histogram(name, help_, label_names, buckets=buckets))
+        if not isinstance(metric, Histogram):
+            raise ValueError(f"Metric '{name}' is already registered as a {metric.type_}.")
+        return metric
+
+    def _register(self, metric: Metric) -> Metric:
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def render(self) -> str:
+        # The metrics in the Prometheus text exposition format.
+        with self._lock:
+            metrics: Final = list(self._metrics.values())
+        return "".join(metric.render() for metric in metrics)
+
+    def write(self, path: str | os.PathLike[str]) -> None:
+        # Replaces the file atomically, so that scrapers never read a partial file.
+        # Imported here because they're slow to import and most processes never write metrics.
+        import tempfile
+        from pathlib import Path
+
+        path_: Final = Path(path)
+        descriptor, temporary_path = tempfile.mkstemp(dir=path_.parent, prefix=f".{path_.name}.", suffix=".tmp")
+        try:
+            with os.fdopen(descriptor, "w", encoding="utf-8") as file:
+                file.write(self.render())
+            os.replace(temporary_path, path_)
+        except BaseException:
+            os.unlink(temporary_path)
+            raise
+
+    def serve(self, port: int, host: str = "127.0.0.1") -> "ThreadingHTTPServer":
+        # Serves the metrics at `http://host:port/metrics` on a daemon thread until
+        # `shutdown()` is called on the returned server. Port 0 picks a free port (see
+        # `server_address`).
+        # Imported here because it's slow to import and most processes never serve metrics.
+        from http.server import BaseHTTPRequestHandler
+        from http.server import ThreadingHTTPServer
+
+        registry: Final = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                if self.path.split("?")[0] not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = registry.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format: str, *args: object) -> None:
+                pass
+
+        server: Final = ThreadingHTTPServer((host, port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="nessi-metrics", daemon=True).start()
+        return server
+
+
+REGISTRY: Final = MetricsRegistry()
+
+RUNS: Final = REGISTRY.counter("nessi_runs_total", "Number of program runs, including failed ones.")
+RUN_ERRORS: Final = REGISTRY.counter("nessi_run_errors_total", "Number of failed program runs.", ("type",))
+RUN_DURATION: Final = REGISTRY.histogram("nessi_run_duration_seconds", "Duration of program runs.")
+RUN_STATEMENTS: Final = REGISTRY.histogram(
+    "nessi_run_statements",
+    "Number of statements executed per program run.",
+    buckets=STATEMENT_BUCKETS,
+)
+OUTPUT_BYTES: Final = REGISTRY.counter("nessi_output_bytes_total", "UTF-8 size of the output of program runs.")
+CACHE_LOOKUPS: Final = REGISTRY.counter(
+    "nessi_cache_lookups_total",
+    "Lookups of compiled loops, array kernels, cached programs and cached runs.",
+    ("cache", "result"),
+)
+BATCH_JOBS: Final = REGISTRY.counter("nessi_batch_jobs_total", "Number of finished batch jobs.")
+BATCH_JOB_ERRORS: Final = REGISTRY.counter(
+    "nessi_batch_job_errors_total",
+    "Number of batch jobs that failed as a whole, e.g. because they could not be parsed.",
+)
+
+
+def record_run(seconds: float, statements_executed: int, output_bytes: int, error_type: Optional[str]) -> None:
+    RUNS.inc()
+    RUN_DURATION.observe(seconds)
+    RUN_STATEMENTS.observe(statements_executed)
+    if output_bytes:
+        OUTPUT_BYTES.inc(output_bytes)
+    if error_type is not None:
+        RUN_ERRORS.inc(labels=(error_type,))
+
+
+def record_cache_lookup(cache: str, is_hit: bool) -> None:
+    CACHE_LOOKUPS.inc(labels=(cache, "hit" if is_hit else "miss"))
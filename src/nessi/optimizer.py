@@ -0,0 +1,387 @@
+from collections import Counter
+from collections.abc import Callable
+from collections.abc import Set
+from typing import Final
+from typing import NamedTuple
+from typing import Optional
+from typing import final
+
+from nessi.analysis import assigned_variables
+from nessi.analysis import definitely_assigned_variables
+from nessi.analysis import expression_variables
+from nessi.analysis import reads_array_element
+from nessi.analysis import walk_expression
+from nessi.analysis import writes_array_elements
+from nessi.expressions import ArrayElement
+from nessi.expressions import BinaryExpression
+from nessi.expressions import Expression
+from nessi.expressions import Variable
+from nessi.statement_visitor import Statement
+from nessi.statements import Assign
+from nessi.statements import Block
+from nessi.statements import Do
+from nessi.statements import DocumentedBlock
+from nessi.statements import If
+from nessi.statements import Input
+from nessi.statements import Loop
+from nessi.statements import Match
+from nessi.statements import MatchArm
+from nessi.statements import While
+
+# Temporaries introduced by the optimizer start with a character that can't appear in
+# placeholders of `Print` statements, so they never clash with user-visible variables.
+TEMPORARY_PREFIX: Final = "$"
+
+# Expressions are compared structurally via their string representation, because `==`
+# on expressions builds a new comparison expression instead of comparing.
+type _Key = str
+
+
+def is_temporary(name: str) -> bool:
+    return name.startswith(TEMPORARY_PREFIX)
+
+
+def _is_compound(expression: Expression) -> bool:
+    # Only compound expressions are worth caching in a temporary.
+    return isinstance(expression, (BinaryExpression, ArrayElement))
+
+
+def _size(expression: Expression) -> int:
+    return sum(1 for _ in walk_expression(expression))
+
+
+def _replace(expression: Expression, replace: Callable[[Expression], Optional[Expression]]) -> Expression:
+    # Rebuilds the expression bottom-up. `replace` is consulted top-down first: if it
+    # returns a replacement for a node, that node's children are not visited.
+    replacement: Final = replace(expression)
+    if replacement is not None:
+        return replacement
+    match expression:
+        case BinaryExpression():
+            left: Final = _replace(expression.left, replace)
+            right: Final = _replace(expression.right, replace)
+            if left is expression.left and right is expression.right:
+                return expression
+            return BinaryExpression(left, expression.operator, right)
+        case ArrayElement():
+            index: Final = _replace(expression.index, replace)
+            return expression if index is expression.index else ArrayElement(expression.array_name, index)
+        case _:
+            return expression
+
+
+@final
+class _Kills(NamedTuple):
+    # Variables that have been rebound and whether any array element has been written
+    # since the shared expressions were computed.
+    variables: frozenset[str]
+    arrays: bool
+
+    def is_available(self, expression: Expression) -> bool:
+        if self.arrays and reads_array_element(expression):
+            return False
+        return self.variables.isdisjoint(expression_variables(expression))
+
+    def after(self, block: Block) -> "_Kills":
+        return _Kills(
+            self.variables | assigned_variables(block),
+            self.arrays or writes_array_elements(block),
+        )
+
+    def union(self, other: "_Kills") -> "_Kills":
+        return _Kills(self.variables | other.variables, self.arrays or other.arrays)
+
+
+@final
+class _RegionRewriter:
+    # Walks the statements that are executed after a common sub-expression has been
+    # computed. Counts the occurrences that are still available there and, if a
+    # substitution is given, replaces them with the temporary.
+    def __init__(self, substitution: Optional[tuple[_Key, str]]) -> None:
+        self._substitution = substitution
+        self.counts: Counter[_Key] = Counter()
+
+    def expression(self, expression: Expression, kills: _Kills) -> Expression:
+        for sub_expression in walk_expression(expression):
+            if _is_compound(sub_expression) and kills.is_available(sub_expression):
+                self.counts[str(sub_expression)] += 1
+        if self._substitution is None:
+            return expression
+        key, temporary = self._substitution
+
+        def replace(sub_expression: Expression) -> Optional[Expression]:
+            if str(sub_expression) == key and kills.is_available(sub_expression):
+                return Variable(temporary)
+            return None
+
+        return _replace(expression, replace)
+
+    def block(self, block: Block, kills: _Kills) -> tuple[Block, _Kills]:
+        rewritten: Final[list[Statement]] = []
+        for statement in block:
+            new_statement, kills = self.statement(statement, kills)
+            rewritten.append(new_statement)
+        return rewritten, kills
+
+    def statement(self, statement: Statement, kills: _Kills) -> tuple[Statement, _Kills]:
+        hidden: Final = statement.hidden_in_latex
+        match statement:
+            case Assign():
+                value: Final = self.expression(statement.value, kills)
+                if isinstance(statement.target, ArrayElement):
+                    index = self.expression(statement.target.index, kills)
+                    target = ArrayElement(statement.target.array_name, index)
+                    return Assign(target, value, hidden_in_latex=hidden), _Kills(kills.variables, True)
+                return (
+                    Assign(statement.target, value, hidden_in_latex=hidden),
+                    _Kills(kills.variables | {statement.target}, kills.arrays),
+                )
+            case Input():
+                return statement, _Kills(kills.variables | {statement.target}, kills.arrays)
+            case If():
+                condition: Final = self.expression(statement.condition, kills)
+                then_block, then_kills = self.block(statement.then_block, kills)
+                else_block, else_kills = self.block(statement.else_block, kills)
+                return (
+                    If(condition, hidden_in_latex=hidden).Then(*then_block).Else(*else_block),
+                    then_kills.union(else_kills),
+                )
+            case While():
+                # Everything the loop assigns is killed before the first evaluation of
+                # the condition, because the condition is re-evaluated after the body.
+                loop_kills = kills.after(statement.body)
+                loop_condition = self.expression(statement.condition, loop_kills)
+                body, _ = self.block(statement.body, loop_kills)
+                return While(loop_condition, label=statement.label, hidden_in_latex=hidden).Repeat(*body), loop_kills
+            case Do():
+                loop_kills = kills.after(statement.body)
+                body, _ = self.block(statement.body, loop_kills)
+                do: Final = Do(*body, label=statement.label, hidden_in_latex=hidden)
+                if statement.condition is None:
+                    return do, loop_kills
+                return do.While(self.expression(statement.condition, loop_kills)), loop_kills
+            case Loop():
+                loop_kills = kills.after(statement.body)
+                body, _ = self.block(statement.body, loop_kills)
+                return Loop(*body, label=statement.label, hidden_in_latex=hidden), loop_kills
+            case DocumentedBlock():
+                block, block_kills = self.block(statement.block, kills)
+                return DocumentedBlock(statement.docstring, block, hidden_in_latex=hidden), block_kills
+            case Match():
+                match_value: Final = self.expression(statement.value, kills)
+                arms: Final[list[MatchArm]] = []
+                match_kills = kills
+                for arm in statement.arms:
+                    arm_condition = self.expression(arm.condition, kills)
+                    arm_body, arm_kills = self.block(arm.body, kills)
+                    arms.append(MatchArm(arm.operator, arm_condition, arm_body))
+                    match_kills = match_kills.union(arm_kills)
+                return Match(match_value, arms, hidden_in_latex=hidden), match_kills
+            case _:
+                return statement, kills
+
+
+@final
+class Optimizer:
+    # Performs two dataflow-based rewrites on the statement tree:
+    #
+    # - Loop-invariant code motion: Sub-expressions of a loop condition (and of the
+    #   leading assignments of a `Do` body) that don't depend on anything the loop
+    #   assigns are computed once into a temporary in front of the loop.
+    # - Common sub-expression elimination: Sub-expressions that an `Assign` or an `If`
+    #   condition evaluates unconditionally and that are evaluated again (within the
+    #   statement or inside the branches of the `If`) before any of their inputs change
+    #   are computed once into a temporary in front of the statement.
+    #
+    # Only expressions that the original program is guaranteed to evaluate are moved, and
+    # only if nothing that the original program evaluates or executes before them can raise
+    # an error, print or loop forever: everything they are moved in front of only reads
+    # variables that are bound there and literals. So the rewritten program prints the same
+    # output and raises the same error as the original one, except that the temporaries
+    # count towards the fuel. The input program is not modified.
+    def __init__(self) -> None:
+        self._temporary_count = 0
+
+    def optimize_block(self, block: Block, defined: frozenset[str] = frozenset()) -> Block:
+        # `defined` are the variables that are bound whenever the block is executed.
+        optimized: Final[list[Statement]] = []
+        for statement in block:
+            optimized_statements = self._optimize_statement(statement, defined)
+            optimized.extend(optimized_statements)
+            defined |= definitely_assigned_variables(optimized_statements)
+        return optimized
+
+    def _new_temporary(self) -> str:
+        name: Final = f"{TEMPORARY_PREFIX}{self._temporary_count}"
+        self._temporary_count += 1
+        return name
+
+    def _optimize_statement(self, statement: Statement, defined: frozenset[str]) -> list[Statement]:
+        hidden: Final = statement.hidden_in_latex
+        match statement:
+            case While():
+                body: Final = self.optimize_block(statement.body, defined)
+                hoisted: Final[list[Statement]] = []
+                condition, _ = self._hoist(statement.condition, _loop_kills(body), hoisted, defined, True)
+                return [*hoisted, While(condition, label=statement.label, hidden_in_latex=hidden).Repeat(*body)]
+            case Do():
+                return self._optimize_do(statement, defined)
+            case Loop():
+                loop_body: Final = self.optimize_block(statement.body, defined)
+                return [Loop(*loop_body, label=statement.label, hidden_in_latex=hidden)]
+            case DocumentedBlock():
+                block: Final = self.optimize_block(statement.block, defined)
+                return [DocumentedBlock(statement.docstring, block, hidden_in_latex=hidden)]
+            case If():
+                optimized_if: Final = (
+                    If(statement.condition, hidden_in_latex=hidden)
+                    .Then(*self.optimize_block(statement.then_block, defined))
+                    .Else(*self.optimize_block(statement.else_block, defined))
+                )
+                return self._eliminate_common_sub_expressions(optimized_if, [statement.condition], defined)
+            case Assign():
+                anchors: Final = [statement.value]
+                if isinstance(statement.target, ArrayElement):
+                    anchors.append(statement.target.index)
+                return self._eliminate_common_sub_expressions(statement, anchors, defined)
+            case Match():
+                arms: Final = [
+                    MatchArm(arm.operator, arm.condition, self.optimize_block(arm.body, defined))
+                    for arm in statement.arms
+                ]
+                return [Match(statement.value, arms, hidden_in_latex=hidden)]
+            case _:
+                return [statement]
+
+    def _optimize_do(self, statement: Do, defined: frozenset[str]) -> list[Statement]:
+        body: Final = self.optimize_block(statement.body, defined)
+        kills: Final = _loop_kills(body)
+        hoisted: Final[list[Statement]] = []
+        # The leading assignments of the body are executed at least once, so their
+        # invariant parts can be computed in front of the loop, as long as nothing before
+        # them can fail.
+        new_body: Final[list[Statement]] = []
+        body_defined = set(defined)
+        is_safe = True
+        for body_statement in body:
+            if is_safe and isinstance(body_statement, Assign):
+                value, is_safe = self._hoist(body_statement.value, kills, hoisted, body_defined, is_safe)
+                target = body_statement.target
+                if isinstance(target, ArrayElement):
+                    index, _ = self._hoist(target.index, kills, hoisted, body_defined, is_safe)
+                    target = ArrayElement(target.array_name, index)
+                    # Storing the element fails for out-of-range indices.
+                    is_safe = False
+                else:
+                    body_defined.add(target)
+                new_body.append(Assign(target, value, hidden_in_latex=body_statement.hidden_in_latex))
+                continue
+            # Any other statement can fail, print, leave the loop early or loop forever.
+            is_safe = False
+            new_body.append(body_statement)
+        do: Final = Do(*new_body, label=statement.label, hidden_in_latex=statement.hidden_in_latex)
+        if statement.condition is None:
+            return [*hoisted, do]
+        condition, _ = self._hoist(statement.condition, kills, hoisted, body_defined, is_safe)
+        return [*hoisted, do.While(condition)]
+
+    def _hoist(
+        self,
+        expression: Expression,
+        kills: _Kills,
+        hoisted: list[Statement],
+        defined: Set[str],
+        is_safe: bool,
+    ) -> tuple[Expression, bool]:
+        # Replaces the maximal loop-invariant compound sub-expressions that are evaluated
+        # while `is_safe`, i.e. before anything that can fail, by temporaries whose
+        # assignments are appended to `hoisted`. Also returns whether the evaluation of the
+        # rewritten expression is still safe afterwards.
+        if is_safe and _is_compound(expression) and kills.is_available(expression):
+            key: Final = str(expression)
+            for statement in hoisted:
+                if isinstance(statement, Assign) and isinstance(statement.target, str) and str(statement.value) == key:
+                    return Variable(statement.target), True
+            temporary: Final = self._new_temporary()
+            hoisted.append(Assign(temporary, expression, hidden_in_latex=True))
+            return Variable(temporary), True
+        match expression:
+            case BinaryExpression():
+                left, is_safe = self._hoist(expression.left, kills, hoisted, defined, is_safe)
+                right, _ = self._hoist(expression.right, kills, hoisted, defined, is_safe)
+                if left is not expression.left or right is not expression.right:
+                    expression = BinaryExpression(left, expression.operator, right)
+                # Operators fail for unsupported operand types or divisions by zero.
+                return expression, False
+            case ArrayElement():
+                index, _ = self._hoist(expression.index, kills, hoisted, defined, is_safe)
+                if index is not expression.index:
+                    expression = ArrayElement(expression.array_name, index)
+                return expression, False
+            case Variable():
+                return expression, is_safe and expression.name in defined
+            case _:
+                return expression, is_safe
+
+    def _eliminate_common_sub_expressions(
+        self, statement: Statement, anchors: list[Expression], defined: frozenset[str]
+    ) -> list[Statement]:
+        # Repeatedly shares the smallest sub-expression that the statement evaluates
+        # unconditionally, before anything that can fail, and that occurs at least twice
+        # while still available. Sharing the smallest ones first makes larger expressions
+        # refer to the earlier temporaries.
+        computed: Final[list[Statement]] = []
+        no_kills: Final = _Kills(frozenset(), False)
+        while True:
+            counter = _RegionRewriter(substitution=None)
+            counter.statement(statement, no_kills)
+            anchor_keys = _safely_evaluated(anchors, defined)
+            candidates = [key for key in anchor_keys if counter.counts[key] >= 2]
+            if not candidates:
+                return [*computed, statement]
+            anchor_sub_expressions = {
+                str(sub_expression): sub_expression for anchor in anchors for sub_expression in walk_expression(anchor)
+            }
+            key = min(candidates, key=lambda candidate: (_size(anchor_sub_expressions[candidate]), candidate))
+            temporary = self._new_temporary()
+            computed.append(Assign(temporary, anchor_sub_expressions[key], hidden_in_latex=True))
+            defined |= {temporary}
+            rewriter = _RegionRewriter(substitution=(key, temporary))
+            statement, _ = rewriter.statement(statement, no_kills)
+            anchors = [rewriter.expression(anchor, no_kills) for anchor in anchors]
+
+
+def _loop_kills(body: Block) -> _Kills:
+    return _Kills(frozenset(assigned_variables(body)), writes_array_elements(body))
+
+
+def _safely_evaluated(expressions: list[Expression], defined: Set[str]) -> set[_Key]:
+    # The compound sub-expressions whose evaluation starts before anything that can fail,
+    # when the expressions are evaluated in order.
+    keys: Final[set[_Key]] = set()
+
+    def visit(expression: Expression, is_safe: bool) -> bool:
+        match expression:
+            case BinaryExpression():
+                if is_safe:
+                    keys.add(str(expression))
+                visit(expression.right, visit(expression.left, is_safe))
+                return False
+            case ArrayElement():
+                if is_safe:
+                    keys.add(str(expression))
+                visit(expression.index, is_safe)
+                return False
+            case Variable():
+                return is_safe and expression.name in defined
+            case _:
+                return is_safe
+
+    is_safe = True
+    for expression in expressions:
+        is_safe = visit(expression, is_safe)
+    return keys
+
+
+def optimize(block: Block) -> Block:
+    return Optimizer().optimize_block(block)
@@ -0,0 +1,227 @@
+from abc import ABC
+from abc import abstractmethod
+from collections import deque
+from typing import IO
+from typing import Final
+from typing import Optional
+from typing import Self
+from typing import TextIO
+from typing import final
+from typing import override
+
+from nessi.statements import Print
+
+
+@final
+class OutputLimitExceededError(RuntimeError):
+    def __init__(self, limit: int, unit: str) -> None:
+        super().__init__(f"Program output exceeded the limit of {limit} {unit}.")
+
+
+def encoded_length(text: str) -> int:
+    # The length of the text in UTF-8, without encoding the (usual) ASCII output.
+    return len(text) if text.isascii() else len(text.encode())
+
+
+class OutputSink(ABC):
+    # Receives the output of a running program, one executed `Print` statement at a time.
+    # `text` is the rendered output of the statement including its trailing newline.
+    @abstractmethod
+    def write(self, statement: Print, text: str) -> None:
+        pass
+
+    @property
+    def buffered_bytes(self) -> int:
+        # The approximate size of the output that the sink keeps in memory, e.g. for the
+        # memory limit of a run.
+        return 0
+
+
+@final
+class StringSink(OutputSink):
+    def __init__(self) -> None:
+        self._parts: Final[list[str]] = []
+        self._length = 0
+
+    @override
+    def write(self, statement: Print, text: str) -> None:
+        self._parts.append(text)
+        self._length += len(text)
+
+    @property
+    @override
+    def buffered_bytes(self) -> int:
+        return self._length
+
+    @property
+    def value(self) -> str:
+        return "".join(self._parts)
+
+
+@final
+class BoundedSink(OutputSink):
+    # Forwards the output to another sink and stops the program with an
+    # `OutputLimitExceededError` before the output grows beyond `max_bytes` (in UTF-8) or
+    # `max_lines`. The output of the `Print` statement that exceeds a limit is not forwarded.
+    def __init__(self, sink: OutputSink, *, max_bytes: Optional[int] = None, max_lines: Optional[int] = None) -> None:
+        self._sink: Final = sink
+        self._max_bytes: Final = max_bytes
+        self._max_lines: Final = max_lines
+        self._byte_count = 0
+        self._line_count = 0
+
+    @property
+    def sink(self) -> OutputSink:
+        return self._sink
+
+    @property
+    @override
+    def buffered_bytes(self) -> int:
+        return self._sink.buffered_bytes
+
+    @override
+    def write(self, statement: Print, text: str) -> None:
+        byte_count: Final = self._byte_count + encoded_length(text)
+        if self._max_bytes is not None and byte_count > self._max_bytes:
+            raise OutputLimitExceededError(self._max_bytes, "bytes")
+        # Printed values may contain line breaks themselves.
+        line_count: Final = self._line_count + text.count("\n")
+        if self._max_lines is not None and line_count > self._max_lines:
+            raise OutputLimitExceededError(self._max_lines, "lines")
+        self._byte_count = byte_count
+        self._line_count = line_count
+        self._sink.write(statement, text)
+
+
+@final
+class SpillingSink(OutputSink):
+    # Keeps the output in memory until it exceeds `memory_limit` bytes, and from then on
+    # writes it to an anonymous temporary file in `directory` (the system's default
+    # temporary directory if `None`), which is deleted on `close()`. Use `copy_to()` to
+    # transfer large outputs without loading them into memory.
+    def __init__(self, memory_limit: int = 1 << 20, *, directory: Optional[str] = None) -> None:
+        self._memory_limit: Final = memory_limit
+        self._directory: Final = directory
+        self._parts: Final[list[str]] = []
+        self._memory_size = 0
+        self._file: Optional[IO[str]] = None
+
+    @property
+    def is_spilled(self) -> bool:
+        return self._file is not None
+
+    @property
+    @override
+    def buffered_bytes(self) -> int:
+        return 0 if self._file is not None else self._memory_size
+
+    @override
+    def write(self, statement: Print, text: str) -> None:
+        if self._file is not None:
+            self._file.write(text)
+            return
+        self._parts.append(text)
+        self._memory_size += encoded_length(text)
+        if self._memory_size > self._memory_limit:
+            # Imported here because it's slow to import and most outputs are never spilled.
+            import tempfile
+
+            self._file = tempfile.TemporaryFile("w+", encoding="utf-8", newline="", dir=self._directory)
+            self._file.writelines(self._parts)
+            self._parts.clear()
+
+    @property
+    def value(self) -> str:
+        if self._file is None:
+            return "".join(self._parts)
+        self._file.seek(0)
+        try:
+            return self._file.read()
+        finally:
+            self._file.seek(0, 2)
+
+    def copy_to(self, target: TextIO) -> None:
+        if self._file is None:
+            target.writelines(self._parts)
+            return
+        import shutil
+
+        self._file.seek(0)
+        try:
+            shutil.copyfileobj(self._file, target)
+        finally:
+            self._file.seek(0, 2)
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, *_: object) -> None:
+        self.close()
+
+
+@final
+class HashingSink(OutputSink):
+    # Keeps only a running digest of the output (in UTF-8) and its first and last
+    # `kept_lines` lines, for comparing large outputs against expected ones:
+    #
+    #     sink.hexdigest == hashlib.sha256(expected_output.encode()).hexdigest()
+    def __init__(self, kept_lines: int = 10, *, algorithm: str = "sha256") -> None:
+        # Imported here because it's slow to import and most runs keep their output as text.
+        import hashlib
+
+        self._hash: Final = hashlib.new(algorithm)
+        self._kept_lines: Final = kept_lines
+        self._head: Final[list[str]] = []
+        self._tail: Final[deque[str]] = deque(maxlen=kept_lines)
+        self._byte_count = 0
+        self._line_count = 0
+
+    @override
+    def write(self, statement: Print, text: str) -> None:
+        data: Final = text.encode()
+        self._hash.update(data)
+        self._byte_count += len(data)
+        for line in text.splitlines(keepends=True):
+            self._line_count += 1
+            if len(self._head) < self._kept_lines:
+                self._head.append(line)
+            elif self._kept_lines > 0:
+                self._tail.append(line)
+
+    @property
+    @override
+    def buffered_bytes(self) -> int:
+        return sum(map(len, self._head)) + sum(map(len, self._tail))
+
+    @property
+    def hexdigest(self) -> str:
+        return self._hash.hexdigest()
+
+    @property
+    def byte_count(self) -> int:
+        return self._byte_count
+
+    @property
+    def line_count(self) -> int:
+        return self._line_count
+
+    @property
+    def head(self) -> list[str]:
+        return list(self._head)
+
+    @property
+    def tail(self) -> list[str]:
+        # The last lines after the first `kept_lines` ones.
+        return list(self._tail)
+
+    @property
+    def value(self) -> str:
+        # The complete output if no lines were dropped, otherwise the kept lines around a
+        # note on the number of omitted lines.
+        omitted: Final = self._line_count - len(self._head) - len(self._tail)
+        marker: Final = f"[... {omitted} lines omitted ...]\n" if omitted > 0 else ""
+        return "".join(self._head) + marker + "".join(self._tail)
@@ -1,34 +1,218 @@
+import time
+from typing import TYPE_CHECKING
 from typing import Final
+from typing import NamedTuple
+from typing import Optional
 from typing import final
 
-from nassi_shneiderman_generator.diagram import Diagram
-
-from nessi.diagram_generator import DiagramGenerator
+from nessi.analysis import walk_statements
 from nessi.interpreter import Interpreter
 from nessi.interpreter import Value
+from nessi.metrics import record_run
+from nessi.optimizer import optimize
+from nessi.output import BoundedSink
+from nessi.output import OutputSink
+from nessi.output import StringSink
+from nessi.output import encoded_length
 from nessi.statements import Block
+from nessi.validation import validate_block
+
+if TYPE_CHECKING:
+    from nassi_shneiderman_generator.diagram import Diagram
+
+    from nessi.coverage import Coverage
+    from nessi.tracing import Tracer
+
+
+@final
+class RunResult(NamedTuple):
+    output: str
+    variables: dict[str, Value]
+    statements_executed: int
+    # The approximate memory used by the variables and the buffered output at the end of
+    # the run, and at its peak if the run had a memory limit (see `Interpreter`).
+    memory_used: int = 0
+    peak_memory: Optional[int] = None
 
 
 @final
 class Program:
     def __init__(self, statements: Block) -> None:
-        self._statements = statements
-
-    def run(self, input_values: dict[str, Value], *, verbose: bool = False) -> str:
-        interpreter: Final = Interpreter(input_values)
-        output = ""
-        for statement in self._statements:
-            if verbose:
-                print(f"Executing statement: '{statement}'")
-            statement_output = statement.accept(interpreter)
-            if verbose:
-                print(f"Output: '{statement_output}'")
-                print(f"Variables in interpreter: {interpreter.variables}")
-                print()
-            output += statement_output
-
-        return output
-
-    def generate_diagram(self) -> Diagram:
+        self._statements: Final = tuple(statements)
+        for statement in walk_statements(self._statements):
+            statement.freeze()
+        self._is_validated = False
+
+    @property
+    def statements(self) -> Block:
+        return self._statements
+
+    def validate(self) -> None:
+        # Reports all structural errors at once by raising `ProgramValidationError`. Once a
+        # program has been validated, it is executed without the interpreter's structural
+        # checks. The statements must not be modified afterwards.
+        validate_block(self._statements)
+        self._is_validated = True
+
+    def optimized(self) -> "Program":
+        # Returns an equivalent program with loop-invariant and common sub-expressions
+        # computed only once. The temporaries it introduces show up in the variables of
+        # `RunResult` (see `nessi.optimizer.is_temporary()`).
+        return Program(optimize(self._statements))
+
+    def run(
+        self,
+        input_values: dict[str, Value],
+        *,
+        verbose: bool = False,
+        fuel: Optional[int] = None,
+        time_limit: Optional[float] = None,
+        tracer: Optional["Tracer"] = None,
+        tiering: bool = True,
+        output: Optional[OutputSink] = None,
+        max_output_bytes: Optional[int] = None,
+        max_output_lines: Optional[int] = None,
+        memory_limit: Optional[int] = None,
+        coverage: Optional["Coverage"] = None,
+    ) -> str:
+        return self.execute(
+            input_values,
+            verbose=verbose,
+            fuel=fuel,
+            time_limit=time_limit,
+            tracer=tracer,
+            tiering=tiering,
+            output=output,
+            max_output_bytes=max_output_bytes,
+            max_output_lines=max_output_lines,
+            memory_limit=memory_limit,
+            coverage=coverage,
+        ).output
+
+    def execute(
+        self,
+        input_values: dict[str, Value],
+        *,
+        verbose: bool = False,
+        fuel: Optional[int] = None,
+        time_limit: Optional[float] = None,
+        tracer: Optional["Tracer"] = None,
+        tiering: bool = True,
+        output: Optional[OutputSink] = None,
+        max_output_bytes: Optional[int] = None,
+        max_output_lines: Optional[int] = None,
+        memory_limit: Optional[int] = None,
+        coverage: Optional["Coverage"] = None,
+    ) -> RunResult:
+        # With a `tracer`, the executed statements, variable writes and branches are recorded
+        # (see `nessi.tracing`), and the trace is dumped to its `error_dump_path` on failure.
+        # `tiering=False` interprets hot loops instead of compiling them (see `nessi.tiering`).
+        # The output is returned in the `RunResult`, unless it is written to the given
+        # `output` sink instead (see `nessi.output`). Exceeding `max_output_bytes` (in UTF-8) or
+        # `max_output_lines` stops the program with an `OutputLimitExceededError`, exceeding
+        # `memory_limit` (in bytes) with a `MemoryLimitExceededError`. With a `coverage`, the
+        # covered statements and branches are recorded (see `nessi.coverage`).
+        # Every run is recorded in `nessi.metrics`.
+        result, error = self.try_execute(
+            input_values,
+            verbose=verbose,
+            fuel=fuel,
+            time_limit=time_limit,
+            tracer=tracer,
+            tiering=tiering,
+            output=output,
+            max_output_bytes=max_output_bytes,
+            max_output_lines=max_output_lines,
+            memory_limit=memory_limit,
+            coverage=coverage,
+        )
+        if error is not None:
+            raise error
+        return result
+
+    def try_execute(
+        self,
+        input_values: dict[str, Value],
+        *,
+        verbose: bool = False,
+        fuel: Optional[int] = None,
+        time_limit: Optional[float] = None,
+        tracer: Optional["Tracer"] = None,
+        tiering: bool = True,
+        output: Optional[OutputSink] = None,
+        max_output_bytes: Optional[int] = None,
+        max_output_lines: Optional[int] = None,
+        memory_limit: Optional[int] = None,
+        coverage: Optional["Coverage"] = None,
+    ) -> tuple[RunResult, Optional[Exception]]:
+        # Like `execute()`, but returns the error of a failed run instead of raising it, along
+        # with the output, variables and executed statements up to the error.
+        start: Final = time.perf_counter()
+        string_sink: Final = StringSink()
+        sink: OutputSink = string_sink if output is None else output
+        if max_output_bytes is not None or max_output_lines is not None:
+            sink = BoundedSink(sink, max_bytes=max_output_bytes, max_lines=max_output_lines)
+        try:
+            interpreter: Final = Interpreter(
+                input_values,
+                output=sink,
+                fuel=fuel,
+                time_limit=time_limit,
+                tracer=tracer,
+                checked=not self._is_validated,
+                tiering=tiering,
+                memory_limit=memory_limit,
+                coverage=coverage,
+            )
+        except Exception as error:
+            record_run(time.perf_counter() - start, 0, 0, type(error).__name__)
+            return RunResult("", {}, 0), error
+        output_length = 0
+        failure: Optional[Exception] = None
+        try:
+            for statement in self._statements:
+                if verbose:
+                    print(f"Executing statement: '{statement}'")
+                    output_length = len(string_sink.value)
+                statement.accept(interpreter)
+                if verbose:
+                    print(f"Output: '{string_sink.value[output_length:]}'")
+                    print(f"Variables in interpreter: {interpreter.variables}")
+                    print()
+        except Exception as error:
+            failure = error
+
+        result_output: Final = string_sink.value
+        record_run(
+            time.perf_counter() - start,
+            interpreter.statements_executed,
+            encoded_length(result_output),
+            None if failure is None else type(failure).__name__,
+        )
+        if failure is not None and tracer is not None and tracer.error_dump_path is not None:
+            tracer.dump(tracer.error_dump_path)
+        result: Final = RunResult(
+            result_output,
+            interpreter.variables,
+            interpreter.statements_executed,
+            interpreter.memory_used,
+            interpreter.peak_memory,
+        )
+        return result, failure
+
+    # The diagram backends are imported on first use, so that programs which are only
+    # executed don't pay for loading the diagram and LaTeX dependencies.
+
+    def generate_diagram(self) -> "Diagram":
+        from nassi_shneiderman_generator.diagram import Diagram
+
+        from nessi.diagram_generator import DiagramGenerator
+
         generator: Final = DiagramGenerator()
         return Diagram(generator.generate_diagram_for_block(self._statements))
+
+    def generate_svg(self) -> str:
+        from nessi.svg_generator import SvgGenerator
+
+        generator: Final = SvgGenerator()
+        return generator.generate_svg_for_block(self._statements)
@@ -0,0 +1,211 @@
+import hashlib
+import importlib.metadata
+import json
+import marshal
+import os
+import sys
+import tempfile
+import types
+from pathlib import Path
+from typing import Any
+from typing import Final
+from typing import Optional
+from typing import final
+from typing import override
+
+from nessi.metrics import record_cache_lookup
+from nessi.program import Program
+from nessi.serialization import SerializationError
+from nessi.serialization import deserialize_block
+from nessi.serialization import serialize_block
+from nessi.statements import Block
+from nessi.tiering import CODE_VERSION
+from nessi.tiering import LoopCodeStore
+from nessi.tiering import attach_loop_code_store
+from nessi.validation import ProgramValidationError
+
+# A persistent cache of prepared programs, like Python's `__pycache__`: worker processes
+# load the optimized statements and the code of the compiled loops (see `nessi.tiering`) of
+# a program that any process has prepared before, instead of optimizing and compiling it
+# again. Entries are keyed by a structural hash of the statements, the nessi version, the
+# version of the generated code and the Python version (the code is stored with `marshal`,
+# whose format changes between Python versions), so programs that are deserialized again
+# and again share an entry.
+#
+# Entries are files in the cache directory that are replaced atomically. Once the directory
+# grows beyond `max_bytes`, the least recently used entries are removed. Like `.pyc` files,
+# entries are trusted: the cache directory must only be writable by the user.
+
+CACHE_DIRECTORY_VARIABLE: Final = "NESSI_CACHE_DIR"
+
+_SUFFIX: Final = ".nessic"
+
+
+def _nessi_version() -> str:
+    try:
+        return importlib.metadata.version("nessi")
+    except importlib.metadata.PackageNotFoundError:
+        return "unknown"
+
+
+_CACHE_TAG: Final = f"nessi-{_nessi_version()}-{CODE_VERSION}-{sys.implementation.cache_tag}"
+
+
+def default_cache_directory() -> Path:
+    # `$NESSI_CACHE_DIR`, or `nessi` in the user's cache directory.
+    directory: Final = os.environ.get(CACHE_DIRECTORY_VARIABLE)
+    if directory:
+        return Path(directory)
+    cache_home: Final = os.environ.get("XDG_CACHE_HOME")
+    return (Path(cache_home) if cache_home else Path.home() / ".cache") / "nessi"
+
+
+def structural_hash(statements: Block) -> str:
+    # Equal for structurally equal statements, e.g. a program and its deserialized copy.
+    data: Final = json.dumps(serialize_block(statements), sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(f"{_CACHE_TAG}\n{data}".encode()).hexdigest()
+
+
+@final
+class _CacheEntry(LoopCodeStore):
+    # The cached form of a program. `block` is the serialized optimized program, if the
+    # program was optimized.
+    def __init__(
+        self,
+        cache: "ProgramCache",
+        key: str,
+        block: Optional[str],
+        loops: dict[str, Optional[types.CodeType]],
+    ) -> None:
+        self._cache: Final = cache
+        self._key: Final = key
+        self._block: Final = block
+        self._loops: Final = loops
+
+    @property
+    def block(self) -> Optional[str]:
+        return self._block
+
+    @override
+    def load(self, key: str) -> tuple[bool, Optional[types.CodeType]]:
+        return key in self._loops, self._loops.get(key)
+
+    @override
+    def store(self, key: str, code: Optional[types.CodeType]) -> None:
+        self._loops[key] = code
+        self.save()
+
+    def save(self) -> None:
+        self._cache._write(self._key, marshal.dumps({"block": self._block, "loops": dict(self._loops)}))
+
+
+@final
+class ProgramCache:
+    def __init__(
+        self,
+        directory: Optional[str | os.PathLike[str]] = None,
+        *,
+        max_bytes: int = 64 * 1024 * 1024,
+    ) -> None:
+        self._directory: Final = Path(directory) if directory is not None else default_cache_directory()
+        self._max_bytes: Final = max_bytes
+        # The number of bytes written since the size of the directory was last checked.
+        self._written_bytes: Optional[int] = None
+
+    @property
+    def directory(self) -> Path:
+        return self._directory
+
+    def load(self, program: Program, *, optimize: bool = False) -> Program:
+        # Returns the validated program (or its optimized version) whose compiled loops are
+        # loaded from and saved to the cache. Programs that are not valid are returned as
+        # they are and not cached, so that their runs report the errors as usual.
+        key: Final = structural_hash(program.statements) + ("-optimized" if optimize else "")
+        entry = self._read(key)
+        record_cache_lookup("programs", entry is not None)
+        prepared: Optional[Program] = None if optimize else program
+        if optimize and entry is not None and entry.block is not None:
+            try:
+                prepared = Program(deserialize_block(json.loads(entry.block)))
+            except (SerializationError, ValueError):
+                pass
+        if prepared is None:
+            entry = None  # Not cached or broken.
+            prepared = program.optimized()
+        try:
+            prepared.validate()
+        except ProgramValidationError:
+            return program
+        if entry is None:
+            block: Final = json.dumps(serialize_block(prepared.statements)) if optimize else None
+            entry = _CacheEntry(self, key, block, {})
+            entry.save()
+        attach_loop_code_store(prepared.statements, entry)
+        return prepared
+
+    def clear(self) -> None:
+        for path in self._entry_paths():
+            path.unlink(missing_ok=True)
+        self._written_bytes = 0
+
+    def _path(self, key: str) -> Path:
+        return self._directory / f"{key}{_SUFFIX}"
+
+    def _entry_paths(self) -> list[Path]:
+        try:
+            return [path for path in self._directory.iterdir() if path.suffix == _SUFFIX]
+        except FileNotFoundError:
+            return []
+
+    def _read(self, key: str) -> Optional[_CacheEntry]:
+        path: Final = self._path(key)
+        try:
+            data: Final = path.read_bytes()
+            # The modification time orders the entries for eviction.
+            os.utime(path)
+        except OSError:
+            return None
+        try:
+            content: Final[Any] = marshal.loads(data)
+        except (EOFError, ValueError, TypeError):
+            return None  # A truncated or foreign file, it's replaced on the next write.
+        if not isinstance(content, dict) or not isinstance(content.get("loops"), dict):
+            return None
+        return _CacheEntry(self, key, content.get("block"), content["loops"])
+
+    def _write(self, key: str, data: bytes) -> None:
+        # Failing to write only makes the cache less effective.
+        try:
+            self._directory.mkdir(parents=True, exist_ok=True)
+            descriptor, temporary_path = tempfile.mkstemp(dir=self._directory, prefix=f".{key}.", suffix=".tmp")
+            try:
+                with os.fdopen(descriptor, "wb") as file:
+                    file.write(data)
+                os.replace(temporary_path, self._path(key))
+            except BaseException:
+                os.unlink(temporary_path)
+                raise
+        except OSError:
+            return
+        if self._written_bytes is not None and self._written_bytes + len(data) < self._max_bytes // 8:
+            self._written_bytes += len(data)
+            return
+        self._written_bytes = 0
+        self._evict()
+
+    def _evict(self) -> None:
+        # Removes the least recently used entries until the directory fits into `max_bytes`.
+        entries: Final[list[tuple[float, int, Path]]] = []
+        for path in self._entry_paths():
+            try:
+                status = path.stat()
+            except FileNotFoundError:
+                continue  # Removed by another process.
+            entries.append((status.st_mtime, status.st_size, path))
+        total_size = sum(size for _, size, _ in entries)
+        entries.sort()
+        for _, size, path in entries:
+            if total_size <= self._max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total_size -= size
@@ -0,0 +1,144 @@
+import heapq
+import os
+from collections.abc import Callable
+from collections.abc import Iterable
+from collections.abc import Iterator
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import Executor
+from concurrent.futures import Future
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
+from typing import Final
+from typing import NamedTuple
+from typing import Optional
+from typing import final
+
+from nessi.batch import Job
+from nessi.batch import JobResult
+from nessi.batch import record_job_result
+from nessi.batch import run_job
+from nessi.batch import run_jobs
+from nessi.cost import estimate_cost
+
+# Orders batch jobs by their estimated cost (see `nessi.cost`) instead of running them in
+# arrival order, so that cheap jobs don't wait behind expensive ones:
+#
+# - "sjf" (shortest job first) minimizes the mean time until a job is done.
+# - "fair" shares the workers between the owners of the jobs (e.g. users or courses): the
+#   next job is the cheapest one of the owner whose jobs have cost the least so far.
+# - "pack" distributes the jobs over the workers up front so that all workers finish at
+#   about the same time (longest processing time first), minimizing the total run time.
+#   Every worker returns its results once all of its jobs are done.
+
+POLICIES: Final = ("sjf", "fair", "pack")
+
+# Rendering a diagram costs about as much as executing this many statements.
+_DIAGRAM_COST: Final = 5_000
+
+
+@final
+class CostedJob(NamedTuple):
+    cost: int
+    job: Job
+
+
+def job_cost(job: Job, *, default_size: int = 100) -> int:
+    statements: Final = job.program.statements
+    cost: Final = sum(
+        estimate_cost(statements, input_values, default_size=default_size) for input_values in job.input_sets
+    )
+    return cost + (0 if job.diagram_format is None else _DIAGRAM_COST)
+
+
+def _costed_jobs(jobs: Iterable[Job]) -> list[CostedJob]:
+    return [CostedJob(job_cost(job), job) for job in jobs]
+
+
+def shortest_job_first(jobs: Iterable[Job]) -> list[CostedJob]:
+    # Jobs with the same cost keep their order.
+    return sorted(_costed_jobs(jobs), key=lambda costed_job: costed_job.cost)
+
+
+def fair_share(jobs: Iterable[Job], owner: Callable[[Job], str]) -> list[CostedJob]:
+    queues: Final[dict[str, list[CostedJob]]] = {}
+    for costed_job in shortest_job_first(jobs):
+        queues.setdefault(owner(costed_job.job), []).append(costed_job)
+    # (cost so far, order of first appearance, owner, index of the next job)
+    owners: Final = [(0, order, name, 0) for order, name in enumerate(queues)]
+    order: Final[list[CostedJob]] = []
+    while owners:
+        served_cost, appearance, name, index = heapq.heappop(owners)
+        costed_job = queues[name][index]
+        order.append(costed_job)
+        if index + 1 < len(queues[name]):
+            heapq.heappush(owners, (served_cost + costed_job.cost, appearance, name, index + 1))
+    return order
+
+
+def pack_jobs(jobs: Iterable[Job], workers: int) -> list[list[CostedJob]]:
+    # Assigns the most expensive remaining job to the least loaded worker. Every worker's
+    # jobs are ordered shortest first.
+    bins: Final[list[list[CostedJob]]] = [[] for _ in range(workers)]
+    loads: Final = [(0, index) for index in range(workers)]
+    for costed_job in sorted(_costed_jobs(jobs), key=lambda costed_job: costed_job.cost, reverse=True):
+        load, index = heapq.heappop(loads)
+        bins[index].append(costed_job)
+        heapq.heappush(loads, (load + costed_job.cost, index))
+    for jobs_of_worker in bins:
+        jobs_of_worker.reverse()
+    return bins
+
+
+def _run_job_sequence(jobs: list[Job]) -> list[JobResult]:
+    return [run_job(job) for job in jobs]
+
+
+def _run_packed(bins: list[list[CostedJob]], *, threads: bool) -> Iterator[JobResult]:
+    worker_count: Final = max(1, len(bins))
+    executor: Final[Executor] = (
+        ThreadPoolExecutor(max_workers=worker_count) if threads else ProcessPoolExecutor(max_workers=worker_count)
+    )
+    with executor:
+        pending: set[Future[list[JobResult]]] = {
+            executor.submit(_run_job_sequence, [costed_job.job for costed_job in jobs_of_worker])
+            for jobs_of_worker in bins
+            if jobs_of_worker
+        }
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                for result in future.result():
+                    record_job_result(result, runs=not threads)
+                    yield result
+
+
+def run_scheduled_jobs(
+    jobs: Iterable[Job],
+    *,
+    policy: str = "sjf",
+    owner: Optional[Callable[[Job], str]] = None,
+    workers: Optional[int] = None,
+    threads: bool = False,
+) -> Iterator[JobResult]:
+    # Like `nessi.batch.run_jobs()`, but all jobs are read and scheduled by `policy` before
+    # the first one runs. The "fair" policy requires the `owner` of each job.
+    worker_count: Final = workers if workers is not None else os.process_cpu_count() or 1
+    match policy:
+        case "sjf":
+            order = shortest_job_first(jobs)
+        case "fair":
+            if owner is None:
+                raise ValueError("The fair-share policy requires the owner of each job.")
+            order = fair_share(jobs, owner)
+        case "pack":
+            return _run_packed(pack_jobs(jobs, worker_count), threads=threads)
+        case _:
+            raise ValueError(f"Unknown scheduling policy '{policy}', expected one of {', '.join(POLICIES)}.")
+    # With one pending job per worker, the jobs start in the scheduled order.
+    return run_jobs(
+        (costed_job.job for costed_job in order),
+        workers=worker_count,
+        max_pending=worker_count,
+        threads=threads,
+    )
@@ -0,0 +1,280 @@
+from typing import Any
+from typing import Final
+from typing import final
+
+from nessi.array_type import ArrayType
+from nessi.expressions import ArrayElement
+from nessi.expressions import BinaryExpression
+from nessi.expressions import Bool
+from nessi.expressions import Expression
+from nessi.expressions import Float
+from nessi.expressions import Integer
+from nessi.expressions import Operator
+from nessi.expressions import Variable
+from nessi.statement_visitor import Statement
+from nessi.statements import Assign
+from nessi.statements import Block
+from nessi.statements import Break
+from nessi.statements import Do
+from nessi.statements import DocumentedBlock
+from nessi.statements import If
+from nessi.statements import Input
+from nessi.statements import Loop
+from nessi.statements import Match
+from nessi.statements import MatchArm
+from nessi.statements import Print
+from nessi.statements import RelativeOperator
+from nessi.statements import While
+
+# Programs are serialized into plain JSON-compatible data: every statement and expression
+# becomes an object with a "kind" key, blocks become lists of statements.
+
+type Json = Any
+
+_SCALAR_TYPES: Final = {"int": int, "float": float, "bool": bool}
+
+
+@final
+class SerializationError(ValueError):
+    def __init__(self, message: str) -> None:
+        super().__init__(f"Invalid serialized program: {message}")
+
+
+def serialize_expression(expression: Expression) -> Json:
+    match expression:
+        case BinaryExpression():
+            return {
+                "kind": "Binary",
+                "operator": expression.operator.name,
+                "left": serialize_expression(expression.left),
+                "right": serialize_expression(expression.right),
+            }
+        case Variable():
+            return {"kind": "Variable", "name": expression.name}
+        case Bool():
+            return {"kind": "Bool", "value": expression.value}
+        case Integer():
+            return {"kind": "Integer", "value": expression.value}
+        case Float():
+            return {"kind": "Float", "value": expression.value}
+        case ArrayElement():
+            return {
+                "kind": "ArrayElement",
+                "array": expression.array_name,
+                "index": serialize_expression(expression.index),
+            }
+        case _:
+            raise NotImplementedError(f"Serialization of expression type '{type(expression)}' not implemented.")
+
+
+def _serialize_type(type_: type | ArrayType) -> Json:
+    if isinstance(type_, ArrayType):
+        return {"array": type_.type_.__name__, "length": type_.length}
+    return type_.__name__
+
+
+def serialize_statement(statement: Statement) -> Json:
+    data: dict[str, Json]
+    match statement:
+        case Input():
+            data = {"kind": "Input", "target": statement.target, "type": _serialize_type(statement.type_)}
+        case Print():
+            data = {"kind": "Print", "text": statement.text.text}
+        case Assign():
+            target: Final = (
+                statement.target
+                if isinstance(statement.target, str)
+                else {"array": statement.target.array_name, "index": serialize_expression(statement.target.index)}
+            )
+            data = {"kind": "Assign", "target": target, "value": serialize_expression(statement.value)}
+        case If():
+            data = {
+                "kind": "If",
+                "condition": serialize_expression(statement.condition),
+                "then": serialize_block(statement.then_block),
+                "else": serialize_block(statement.else_block),
+            }
+        case While():
+            data = {
+                "kind": "While",
+                "condition": serialize_expression(statement.condition),
+                "body": serialize_block(statement.body),
+                "label": statement.label,
+            }
+        case Do():
+            data = {
+                "kind": "Do",
+                "body": serialize_block(statement.body),
+                "condition": None if statement.condition is None else serialize_expression(statement.condition),
+                "label": statement.label,
+            }
+        case Loop():
+            data = {"kind": "Loop", "body": serialize_block(statement.body), "label": statement.label}
+        case Break():
+            data = {"kind": "Break", "label": statement.label}
+        case DocumentedBlock():
+            data = {
+                "kind": "DocumentedBlock",
+                "docstring": statement.docstring,
+                "block": serialize_block(statement.block),
+            }
+        case Match():
+            data = {
+                "kind": "Match",
+                "value": serialize_expression(statement.value),
+                "arms": [
+                    {
+                        "operator": arm.operator.name,
+                        "condition": serialize_expression(arm.condition),
+                        "body": serialize_block(arm.body),
+                    }
+                    for arm in statement.arms
+                ],
+            }
+        case _:
+            raise NotImplementedError(f"Serialization of statement type '{type(statement)}' not implemented.")
+    if statement.hidden_in_latex:
+        data["hidden_in_latex"] = True
+    return data
+
+
+def serialize_block(block: Block) -> Json:
+    return [serialize_statement(statement) for statement in block]
+
+
+def _get(data: Json, key: str, expected_type: type | tuple[type, ...]) -> Json:
+    if not isinstance(data, dict):
+        raise SerializationError(f"expected an object, got {data!r}")
+    if key not in data:
+        raise SerializationError(f"missing key '{key}' in {data!r}")
+    value: Final = data[key]
+    if not isinstance(value, expected_type):
+        raise SerializationError(f"unexpected value {value!r} for key '{key}'")
+    return value
+
+
+def _get_optional_label(data: Json) -> str | None:
+    return _get(data, "label", (str, type(None))) if "label" in data else None
+
+
+def deserialize_expression(data: Json) -> Expression:
+    kind: Final = _get(data, "kind", str)
+    match kind:
+        case "Binary":
+            operator_name: Final = _get(data, "operator", str)
+            if operator_name not in Operator.__members__:
+                raise SerializationError(f"unknown operator '{operator_name}'")
+            return BinaryExpression(
+                deserialize_expression(_get(data, "left", dict)),
+                Operator[operator_name],
+                deserialize_expression(_get(data, "right", dict)),
+            )
+        case "Variable":
+            return Variable(_get(data, "name", str))
+        case "Bool":
+            return Bool(_get(data, "value", bool))
+        case "Integer":
+            value: Final = _get(data, "value", int)
+            if isinstance(value, bool):
+                raise SerializationError(f"expected an integer, got {value!r}")
+            return Integer(value)
+        case "Float":
+            return Float(float(_get(data, "value", (int, float))))
+        case "ArrayElement":
+            return ArrayElement(_get(data, "array", str), deserialize_expression(_get(data, "index", dict)))
+        case _:
+            raise SerializationError(f"unknown expression kind '{kind}'")
+
+
+def _deserialize_scalar_type(name: Json) -> type:
+    if not isinstance(name, str) or name not in _SCALAR_TYPES:
+        raise SerializationError(f"unknown type {name!r}")
+    return _SCALAR_TYPES[name]
+
+
+def _deserialize_type(data: Json) -> type | ArrayType:
+    if isinstance(data, dict):
+        length: Final = _get(data, "length", (int, str))
+        return ArrayType(_deserialize_scalar_type(_get(data, "array", str)), length)
+    return _deserialize_scalar_type(data)
+
+
+def deserialize_statement(data: Json) -> Statement:
+    kind: Final = _get(data, "kind", str)
+    hidden_in_latex: Final = _get(data, "hidden_in_latex", bool) if "hidden_in_latex" in data else False
+    match kind:
+        case "Input":
+            return Input(
+                _get(data, "target", str),
+                _deserialize_type(_get(data, "type", (str, dict))),
+                hidden_in_latex=hidden_in_latex,
+            )
+        case "Print":
+            return Print(_get(data, "text", str), hidden_in_latex=hidden_in_latex)
+        case "Assign":
+            target_data: Final = _get(data, "target", (str, dict))
+            target: Final = (
+                target_data
+                if isinstance(target_data, str)
+                else ArrayElement(
+                    _get(target_data, "array", str),
+                    deserialize_expression(_get(target_data, "index", dict)),
+                )
+            )
+            return Assign(target, deserialize_expression(_get(data, "value", dict)), hidden_in_latex=hidden_in_latex)
+        case "If":
+            return (
+                If(deserialize_expression(_get(data, "condition", dict)), hidden_in_latex=hidden_in_latex)
+                .Then(*deserialize_block(_get(data, "then", list)))
+                .Else(*deserialize_block(data.get("else", [])))
+            )
+        case "While":
+            return While(
+                deserialize_expression(_get(data, "condition", dict)),
+                label=_get_optional_label(data),
+                hidden_in_latex=hidden_in_latex,
+            ).Repeat(*deserialize_block(_get(data, "body", list)))
+        case "Do":
+            do: Final = Do(
+                *deserialize_block(_get(data, "body", list)),
+                label=_get_optional_label(data),
+                hidden_in_latex=hidden_in_latex,
+            )
+            condition_data: Final = data.get("condition")
+            return do if condition_data is None else do.While(deserialize_expression(condition_data))
+        case "Loop":
+            return Loop(
+                *deserialize_block(_get(data, "body", list)),
+                label=_get_optional_label(data),
+                hidden_in_latex=hidden_in_latex,
+            )
+        case "Break":
+            return Break(_get(data, "label", str), hidden_in_latex=hidden_in_latex)
+        case "DocumentedBlock":
+            return DocumentedBlock(
+                _get(data, "docstring", str),
+                deserialize_block(_get(data, "block", list)),
+                hidden_in_latex=hidden_in_latex,
+            )
+        case "Match":
+            arms: list[MatchArm] = []
+            for arm_data in _get(data, "arms", list):
+                operator_name = _get(arm_data, "operator", str)
+                if operator_name not in RelativeOperator.__members__:
+                    raise SerializationError(f"unknown relative operator '{operator_name}'")
+                arms.append(
+                    MatchArm(
+                        RelativeOperator[operator_name],
+                        deserialize_expression(_get(arm_data, "condition", dict)),
+                        deserialize_block(_get(arm_data, "body", list)),
+                    )
+                )
+            return Match(deserialize_expression(_get(data, "value", dict)), arms, hidden_in_latex=hidden_in_latex)
+        case _:
+            raise SerializationError(f"unknown statement kind '{kind}'")
+
+
+def deserialize_block(data: Json) -> Block:
+    if not isinstance(data, list):
+        raise SerializationError(f"expected a list of statements, got {data!r}")
+    return [deserialize_statement(statement) for statement in data]
@@ -6,12 +6,23 @@ from typing import final
 class Statement(ABC):
     def __init__(self, *, hidden_in_latex: bool) -> None:
         self._hidden_in_latex = hidden_in_latex
+        self._is_frozen = False
 
     @final
     @property
     def hidden_in_latex(self) -> bool:
         return self._hidden_in_latex
 
+    @final
+    @property
+    def is_frozen(self) -> bool:
+        return self._is_frozen
+
+    @final
+    def freeze(self) -> None:
+        # Called by `Program` for all of its statements. Builder methods fail afterwards.
+        self._is_frozen = True
+
     @final
     def accept[T](self, visitor: "StatementVisitor[T]") -> T:
         return visitor.visit(self)
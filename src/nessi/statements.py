@@ -1,3 +1,6 @@
+import bisect
+import math
+from collections.abc import Sequence
 from enum import Enum
 from typing import Final
 from typing import Optional
@@ -16,7 +19,17 @@ from nessi.interpolated_string import InterpolatedString
 from nessi.statement_visitor import Statement
 from nessi.value import Value
 
-type Block = list[Statement]
+# Statements are immutable once they belong to a `Program`, so that a program can be run by
+# many threads at the same time. Blocks are stored as tuples, and the builder methods
+# (`If.Then()`, ...) of statements that have been frozen by a program raise
+# `FrozenStatementError`.
+type Block = Sequence[Statement]
+
+
+@final
+class FrozenStatementError(RuntimeError):
+    def __init__(self, statement: Statement) -> None:
+        super().__init__(f"{type(statement).__name__} statement belongs to a program and can't be modified.")
 
 
 @final
@@ -34,30 +47,6 @@ class Input(Statement):
     def type_(self) -> type | ArrayType:
         return self._type
 
-    def raise_if_not_assignable(self, value: Value, context: Context) -> None:
-        if (
-            isinstance(value, list)
-            and not isinstance(self._type, ArrayType)
-            and all(isinstance(value, self._type) for value in value)
-        ):
-            # This is okay, we will just consume the next value of the list.
-            return
-        if not isinstance(self._type, ArrayType):
-            if not isinstance(value, self._type):
-                raise TypeError(f"Cannot assign {value} to {self._target}: expected {self._type.__name__}")
-            return
-
-        # This is an array type.
-        if not isinstance(value, list):
-            raise TypeError(f"Cannot assign {value} to {self._target}: expected list")
-        array_length: Final = self._type.length if isinstance(self._type.length, int) else context[self._type.length]
-        if len(value) != array_length:
-            raise ValueError(
-                f"Cannot assign {value} to {self._target}: expected list of length {array_length}, got {len(value)}"
-            )
-        if not all(isinstance(item, self._type.type_) for item in value):
-            raise TypeError(f"Cannot assign {value} to {self._target}: expected list of {self._type.type_.__name__}")
-
     @override
     def __str__(self) -> str:
         return f"Input({self._target})"
@@ -124,15 +113,19 @@ class If(Statement):
     ) -> None:
         super().__init__(hidden_in_latex=hidden_in_latex)
         self._condition = condition
-        self._then: Block = []
-        self._else: Block = []
+        self._then: Block = ()
+        self._else: Block = ()
 
     def Then(self, *then: Statement) -> Self:
-        self._then = list(then)
+        if self.is_frozen:
+            raise FrozenStatementError(self)
+        self._then = then
         return self
 
     def Else(self, *else_: Statement) -> Self:
-        self._else = list(else_)
+        if self.is_frozen:
+            raise FrozenStatementError(self)
+        self._else = else_
         return self
 
     @property
@@ -165,11 +158,13 @@ class While(Statement):
     ) -> None:
         super().__init__(hidden_in_latex=hidden_in_latex)
         self._condition = condition
-        self._body: Block = []
+        self._body: Block = ()
         self._label = label
 
     def Repeat(self, *body: Statement) -> Self:
-        self._body = list(body)
+        if self.is_frozen:
+            raise FrozenStatementError(self)
+        self._body = body
         return self
 
     @property
@@ -199,11 +194,13 @@ class Do(Statement):
         hidden_in_latex: bool = False,
     ) -> None:
         super().__init__(hidden_in_latex=hidden_in_latex)
-        self._body = list(body)
+        self._body: Final = body
         self._condition: Optional[Expression] = None
         self._label = label
 
     def While(self, condition: Expression) -> Self:
+        if self.is_frozen:
+            raise FrozenStatementError(self)
         self._condition = condition
         return self
 
@@ -234,7 +231,7 @@ class Loop(Statement):
         hidden_in_latex: bool = False,
     ) -> None:
         super().__init__(hidden_in_latex=hidden_in_latex)
-        self._body = list(body)
+        self._body: Final = body
         self._label = label
 
     @property
@@ -271,7 +268,7 @@ class DocumentedBlock(Statement):
     def __init__(self, docstring: str, block: Block, *, hidden_in_latex: bool = False) -> None:
         super().__init__(hidden_in_latex=hidden_in_latex)
         self._docstring = docstring
-        self._block = block
+        self._block: Final = tuple(block)
 
     @property
     def docstring(self) -> str:
@@ -289,12 +286,13 @@ class DocumentedBlock(Statement):
 
 @final
 class RelativeOperator(Enum):
-    EQUALS = ("==", "=")
-    NOT_EQUALS = ("!=", r"\neq")
-    LESS_THAN = ("<", "<")
-    LESS_THAN_OR_EQUAL = ("<=", r"\leq")
-    GREATER_THAN = (">", ">")
-    GREATER_THAN_OR_EQUAL = (">=", r"\geq")
+    # (source, LaTeX, plain text)
+    EQUALS = ("==", "=", "=")
+    NOT_EQUALS = ("!=", r"\neq", "≠")
+    LESS_THAN = ("<", "<", "<")
+    LESS_THAN_OR_EQUAL = ("<=", r"\leq", "≤")
+    GREATER_THAN = (">", ">", ">")
+    GREATER_THAN_OR_EQUAL = (">=", r"\geq", "≥")
 
 
 @final
@@ -307,7 +305,7 @@ class MatchArm:
     ) -> None:
         self._operator = operator
         self._condition = condition
-        self._body = [body] if isinstance(body, Statement) else body
+        self._body: Final = (body,) if isinstance(body, Statement) else tuple(body)
 
     @property
     def operator(self) -> RelativeOperator:
@@ -344,27 +342,180 @@ def is_match_arm_condition_satisfied(
     raise ValueError(f"Unknown operator: {operator}")
 
 
+type _Number = int | float
+
+
+@final
+class _RangeTable:
+    # Arms of one relative operator with constant conditions, sorted by their constant.
+    # `_suffix_minimum[i]` is the smallest arm index among the constants `i:`, and
+    # `_prefix_minimum[i]` the smallest arm index among the constants `:i`.
+    def __init__(self, arms: list[tuple[_Number, int]]) -> None:
+        arms = sorted(arms)
+        self._constants: Final = [constant for constant, _ in arms]
+        self._suffix_minimum: Final[list[_Number]] = [math.inf] * (len(arms) + 1)
+        for i in reversed(range(len(arms))):
+            self._suffix_minimum[i] = min(arms[i][1], self._suffix_minimum[i + 1])
+        self._prefix_minimum: Final[list[_Number]] = [math.inf] * (len(arms) + 1)
+        for i, (_, index) in enumerate(arms):
+            self._prefix_minimum[i + 1] = min(index, self._prefix_minimum[i])
+
+    def first_greater_than(self, value: _Number) -> _Number:
+        return self._suffix_minimum[bisect.bisect_right(self._constants, value)]
+
+    def first_greater_than_or_equal(self, value: _Number) -> _Number:
+        return self._suffix_minimum[bisect.bisect_left(self._constants, value)]
+
+    def first_less_than(self, value: _Number) -> _Number:
+        return self._prefix_minimum[bisect.bisect_left(self._constants, value)]
+
+    def first_less_than_or_equal(self, value: _Number) -> _Number:
+        return self._prefix_minimum[bisect.bisect_right(self._constants, value)]
+
+
+@final
+class MatchDispatch:
+    # Precompiled lookup structure for the arms of a `Match` statement. Arms whose condition
+    # is a literal are looked up in a dict (`==`), via bisection (`<`, `<=`, `>`, `>=`) or
+    # by a short scan (`!=`). Only arms with non-constant conditions are evaluated, and only
+    # those that come before the first matching constant arm. The result is always the
+    # first arm that sequential evaluation would have chosen.
+    def __init__(self, arms: Sequence[MatchArm]) -> None:
+        self._arms: Final = arms
+        self._dynamic_arm_indices: Final[list[int]] = []
+        self._equal: Final[dict[_Number, int]] = {}
+        self._not_equal: Final[list[tuple[int, _Number]]] = []
+        ranges: Final[dict[RelativeOperator, list[tuple[_Number, int]]]] = {
+            RelativeOperator.LESS_THAN: [],
+            RelativeOperator.LESS_THAN_OR_EQUAL: [],
+            RelativeOperator.GREATER_THAN: [],
+            RelativeOperator.GREATER_THAN_OR_EQUAL: [],
+        }
+        for index, arm in enumerate(arms):
+            if not isinstance(arm.condition, (Integer, Float, Bool)):
+                self._dynamic_arm_indices.append(index)
+                continue
+            constant = arm.condition.value
+            if arm.operator == RelativeOperator.NOT_EQUALS:
+                self._not_equal.append((index, constant))
+            elif math.isnan(constant):
+                # NaN is neither equal to nor ordered relative to anything.
+                continue
+            elif arm.operator == RelativeOperator.EQUALS:
+                self._equal.setdefault(constant, index)
+            else:
+                ranges[arm.operator].append((constant, index))
+        # `value < constant` holds for all constants greater than the value and so on.
+        self._constants_greater: Final = _RangeTable(ranges[RelativeOperator.LESS_THAN])
+        self._constants_greater_or_equal: Final = _RangeTable(ranges[RelativeOperator.LESS_THAN_OR_EQUAL])
+        self._constants_less: Final = _RangeTable(ranges[RelativeOperator.GREATER_THAN])
+        self._constants_less_or_equal: Final = _RangeTable(ranges[RelativeOperator.GREATER_THAN_OR_EQUAL])
+        self._constants: Final = sorted(
+            {*self._equal, *(constant for _, constant in self._not_equal if not math.isnan(constant))}
+            | {constant for operator_ranges in ranges.values() for constant, _ in operator_ranges}
+        )
+
+    @property
+    def has_dynamic_arms(self) -> bool:
+        return bool(self._dynamic_arm_indices)
+
+    def find_arm(self, value: Value, context: Context) -> Optional[MatchArm]:
+        index: Final = self.find_arm_index(value, context)
+        return None if index is None else self._arms[index]
+
+    def find_arm_index(self, value: Value, context: Context) -> Optional[int]:
+        if not isinstance(value, (int, float)):
+            # Comparing fails anyway. Evaluate sequentially to raise the same error as before.
+            for index, arm in enumerate(self._arms):
+                if is_match_arm_condition_satisfied(value, arm.operator, arm.condition.evaluate(context)):
+                    return index
+            return None
+        constant_arm_index: Final = self._find_constant_arm_index(value)
+        for index in self._dynamic_arm_indices:
+            if index > constant_arm_index:
+                break
+            arm = self._arms[index]
+            if is_match_arm_condition_satisfied(value, arm.operator, arm.condition.evaluate(context)):
+                return index
+        return None if constant_arm_index == math.inf else int(constant_arm_index)
+
+    def find_unmatched_value(self, *, integers_only: bool) -> Optional[_Number]:
+        # Returns a value that no constant arm matches, or `None` if every value (every
+        # integer, respectively) is matched. NaN values are not considered. The constant
+        # arms' results only change at the constants, so it suffices to check the
+        # constants themselves and one value between and beyond each of them.
+        candidates: list[_Number] = []
+        if integers_only:
+            critical = sorted(
+                {
+                    integer
+                    for constant in self._constants
+                    if math.isfinite(constant)
+                    for integer in range(math.floor(constant) - 1, math.ceil(constant) + 2)
+                }
+            )
+            candidates = list(critical) if critical else [0]
+            candidates += [(low + high) // 2 for low, high in zip(critical, critical[1:])]
+        else:
+            candidates = [-math.inf, math.inf, *self._constants]
+            finite_constants = [constant for constant in self._constants if math.isfinite(constant)]
+            if finite_constants:
+                lowest, highest = finite_constants[0], finite_constants[-1]
+                candidates += [lowest - max(1, abs(lowest)), highest + max(1, abs(highest))]
+                candidates += [(low + high) / 2 for low, high in zip(finite_constants, finite_constants[1:])]
+            else:
+                candidates.append(0)
+        for candidate in candidates:
+            if self._find_constant_arm_index(candidate) == math.inf:
+                return candidate
+        return None
+
+    def _find_constant_arm_index(self, value: _Number) -> _Number:
+        # Returns the index of the first matching constant arm, or infinity if none matches.
+        best: _Number = self._equal.get(value, math.inf)
+        for index, constant in self._not_equal:
+            if index > best:
+                break
+            if value != constant:
+                best = index
+                break
+        if value == value:  # Not NaN. NaN doesn't satisfy any ordering comparison.
+            best = min(
+                best,
+                self._constants_greater.first_greater_than(value),
+                self._constants_greater_or_equal.first_greater_than_or_equal(value),
+                self._constants_less.first_less_than(value),
+                self._constants_less_or_equal.first_less_than_or_equal(value),
+            )
+        return best
+
+
 @final
 class Match(Statement):
     def __init__(
         self,
         value: Expression,
-        arms: list[MatchArm],
+        arms: Sequence[MatchArm],
         *,
         hidden_in_latex: bool = False,
     ) -> None:
         super().__init__(hidden_in_latex=hidden_in_latex)
         self._value = value
-        self._arms = arms
+        self._arms: Final = tuple(arms)
+        self._dispatch: Final = MatchDispatch(self._arms)
 
     @property
     def value(self) -> Expression:
         return self._value
 
     @property
-    def arms(self) -> list[MatchArm]:
+    def arms(self) -> Sequence[MatchArm]:
         return self._arms
 
+    @property
+    def dispatch(self) -> MatchDispatch:
+        return self._dispatch
+
     @override
     def __str__(self) -> str:
         arms_str: Final = ", ".join(
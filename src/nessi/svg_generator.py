@@ -0,0 +1,376 @@
+import functools
+import math
+import re
+from abc import ABC
+from abc import abstractmethod
+from html import escape
+from typing import Final
+from typing import NamedTuple
+from typing import final
+from typing import override
+
+from nessi.array_type import ArrayType
+from nessi.expressions import ArrayElement
+from nessi.statement_visitor import Statement
+from nessi.statement_visitor import StatementVisitor
+from nessi.statements import Assign
+from nessi.statements import Block
+from nessi.statements import Break
+from nessi.statements import Do
+from nessi.statements import DocumentedBlock
+from nessi.statements import If
+from nessi.statements import Input
+from nessi.statements import Loop
+from nessi.statements import Match
+from nessi.statements import Print
+from nessi.statements import While
+
+_FONT_SIZE: Final = 14
+_PADDING: Final = 6
+_ROW_HEIGHT: Final = 26
+_BASELINE: Final = 17
+_INDENT: Final = 20
+_CONTINUOUS_ITERATION_FOOTER: Final = 12
+_TERMINATION_ARROW: Final = 12
+
+# Approximate advance widths (in em) of a proportional sans-serif font. Characters that
+# are not listed use the default width. Monospaced text always uses the same width.
+_SANS_DEFAULT_WIDTH: Final = 0.556
+_SANS_WIDTHS: Final[dict[str, float]] = {
+    **dict.fromkeys(" !,.:;|ijlI'", 0.278),
+    **dict.fromkeys("()[]{}frt-", 0.333),
+    **dict.fromkeys('"*', 0.389),
+    **dict.fromkeys("sczJ?", 0.5),
+    **dict.fromkeys("=+<>≠≤≥·", 0.584),
+    **dict.fromkeys("ABEKPSVXY", 0.667),
+    **dict.fromkeys("CDHNRUw", 0.722),
+    **dict.fromkeys("GOQ", 0.778),
+    **dict.fromkeys("mM", 0.833),
+    **dict.fromkeys("W", 0.944),
+}
+_MONOSPACE_WIDTH: Final = 0.6
+
+
+@final
+class _Run(NamedTuple):
+    text: str
+    is_code: bool
+
+
+type _Text = tuple[_Run, ...]
+
+
+@functools.lru_cache(maxsize=4096)
+def _measure_run(text: str, is_code: bool) -> float:
+    if is_code:
+        return len(text) * _MONOSPACE_WIDTH * _FONT_SIZE
+    return sum(_SANS_WIDTHS.get(character, _SANS_DEFAULT_WIDTH) for character in text) * _FONT_SIZE
+
+
+def _measure(text: _Text) -> int:
+    return math.ceil(sum(_measure_run(run.text, run.is_code) for run in text))
+
+
+def _plain(text: str) -> _Text:
+    return (_Run(text, is_code=False),)
+
+
+def _code(text: str) -> _Text:
+    return (_Run(text, is_code=True),)
+
+
+class _Layout(ABC):
+    def __init__(self, width: int, height: int) -> None:
+        # Minimum size. Parents may render a node larger than that, but never smaller.
+        self.width = width
+        self.height = height
+
+    @abstractmethod
+    def render(self, x: int, y: int, width: int, height: int, output: list[str]) -> None:
+        pass
+
+
+def _render_rectangle(x: int, y: int, width: int, height: int, output: list[str]) -> None:
+    output.append(f'<rect x="{x}" y="{y}" width="{width}" height="{height}"/>')
+
+
+def _render_line(x1: int, y1: int, x2: int, y2: int, output: list[str]) -> None:
+    output.append(f'<line x1="{x1}" y1="{y1}" x2="{x2}" y2="{y2}"/>')
+
+
+def _render_text(x: int, y: int, text: _Text, output: list[str], *, anchor: str = "start") -> None:
+    runs: Final = "".join(
+        f'<tspan class="code">{escape(run.text)}</tspan>' if run.is_code else escape(run.text) for run in text
+    )
+    anchor_attribute: Final = "" if anchor == "start" else f' text-anchor="{anchor}"'
+    output.append(f'<text x="{x}" y="{y + _BASELINE}"{anchor_attribute}>{runs}</text>')
+
+
+@final
+class _Imperative(_Layout):
+    def __init__(self, text: _Text) -> None:
+        super().__init__(_measure(text) + 2 * _PADDING, _ROW_HEIGHT)
+        self._text = text
+
+    @override
+    def render(self, x: int, y: int, width: int, height: int, output: list[str]) -> None:
+        _render_rectangle(x, y, width, height, output)
+        _render_text(x + _PADDING, y, self._text, output)
+
+
+@final
+class _Serial(_Layout):
+    def __init__(self, children: list[_Layout]) -> None:
+        super().__init__(
+            max((child.width for child in children), default=2 * _PADDING),
+            sum(child.height for child in children) if children else _ROW_HEIGHT,
+        )
+        self._children = children
+
+    @override
+    def render(self, x: int, y: int, width: int, height: int, output: list[str]) -> None:
+        if not self._children:
+            _render_rectangle(x, y, width, height, output)
+            return
+        bottom: Final = y + height
+        for child in self._children[:-1]:
+            child.render(x, y, width, child.height, output)
+            y += child.height
+        # The last child absorbs any additional height.
+        self._children[-1].render(x, y, width, bottom - y, output)
+
+
+@final
+class _PreTestedIteration(_Layout):
+    def __init__(self, header: _Text, body: _Layout) -> None:
+        super().__init__(
+            max(_measure(header) + 2 * _PADDING, _INDENT + body.width),
+            _ROW_HEIGHT + body.height,
+        )
+        self._header = header
+        self._body = body
+
+    @override
+    def render(self, x: int, y: int, width: int, height: int, output: list[str]) -> None:
+        _render_rectangle(x, y, width, height, output)
+        _render_text(x + _PADDING, y, self._header, output)
+        self._body.render(x + _INDENT, y + _ROW_HEIGHT, width - _INDENT, height - _ROW_HEIGHT, output)
+
+
+@final
+class _PostTestedIteration(_Layout):
+    def __init__(self, footer: _Text, body: _Layout) -> None:
+        super().__init__(
+            max(_measure(footer) + 2 * _PADDING, _INDENT + body.width),
+            body.height + _ROW_HEIGHT,
+        )
+        self._footer = footer
+        self._body = body
+
+    @override
+    def render(self, x: int, y: int, width: int, height: int, output: list[str]) -> None:
+        _render_rectangle(x, y, width, height, output)
+        self._body.render(x + _INDENT, y, width - _INDENT, height - _ROW_HEIGHT, output)
+        _render_text(x + _PADDING, y + height - _ROW_HEIGHT, self._footer, output)
+
+
+@final
+class _ContinuousIteration(_Layout):
+    def __init__(self, body: _Layout) -> None:
+        super().__init__(_INDENT + body.width, body.height + _CONTINUOUS_ITERATION_FOOTER)
+        self._body = body
+
+    @override
+    def render(self, x: int, y: int, width: int, height: int, output: list[str]) -> None:
+        _render_rectangle(x, y, width, height, output)
+        self._body.render(x + _INDENT, y, width - _INDENT, height - _CONTINUOUS_ITERATION_FOOTER, output)
+
+
+@final
+class _Branch(NamedTuple):
+    label: _Text
+    body: _Layout
+
+
+@final
+class _Selective(_Layout):
+    # Used for dyadic, monadic and multiple exclusive selectives alike: The condition is
+    # written into the header triangle, the branches are laid out as columns below it. The
+    # single branch of a monadic selective spans the whole width, below one diagonal.
+    def __init__(self, condition: _Text, branches: list[_Branch]) -> None:
+        self._column_widths: Final = [
+            max(branch.body.width, _measure(branch.label) + 2 * _PADDING) for branch in branches
+        ]
+        super().__init__(
+            max(sum(self._column_widths), _measure(condition) + 4 * _PADDING),
+            2 * _ROW_HEIGHT + max((branch.body.height for branch in branches), default=0),
+        )
+        self._condition = condition
+        self._branches = branches
+
+    @override
+    def render(self, x: int, y: int, width: int, height: int, output: list[str]) -> None:
+        header_height: Final = 2 * _ROW_HEIGHT
+        _render_rectangle(x, y, width, header_height, output)
+        _render_text(x + width // 2, y, self._condition, output, anchor="middle")
+
+        # Distribute any additional width evenly across the columns.
+        extra_width: Final = width - sum(self._column_widths)
+        column_x = x
+        column_lefts: list[int] = []
+        for i, (branch, column_width) in enumerate(zip(self._branches, self._column_widths, strict=True)):
+            column_width += extra_width // len(self._branches) + (1 if i < extra_width % len(self._branches) else 0)
+            if i == len(self._branches) - 1:
+                column_width = x + width - column_x
+            column_lefts.append(column_x)
+            if len(self._branches) == 1:
+                # Below the low end of the diagonal.
+                _render_text(column_x + _PADDING, y + _ROW_HEIGHT, branch.label, output)
+            else:
+                _render_text(column_x + column_width // 2, y + _ROW_HEIGHT, branch.label, output, anchor="middle")
+            branch.body.render(column_x, y + header_height, column_width, height - header_height, output)
+            column_x += column_width
+
+        if len(column_lefts) == 1:
+            _render_line(x, y, x + width, y + header_height, output)
+            return
+        apex_x: Final = column_lefts[-1]
+        _render_line(x, y, apex_x, y + header_height, output)
+        _render_line(x + width, y, apex_x, y + header_height, output)
+        for column_left in column_lefts[1:-1]:
+            # Separators between the non-default columns start at the diagonal.
+            separator_top = y + round(header_height * (column_left - x) / max(apex_x - x, 1))
+            _render_line(column_left, separator_top, column_left, y + header_height, output)
+
+
+@final
+class _Termination(_Layout):
+    def __init__(self, label: _Text) -> None:
+        super().__init__(_TERMINATION_ARROW + _measure(label) + 2 * _PADDING, _ROW_HEIGHT)
+        self._label = label
+
+    @override
+    def render(self, x: int, y: int, width: int, height: int, output: list[str]) -> None:
+        _render_rectangle(x, y, width, height, output)
+        output.append(
+            f'<polyline points="{x + _TERMINATION_ARROW},{y} {x},{y + _ROW_HEIGHT // 2} '
+            + f'{x + _TERMINATION_ARROW},{y + _ROW_HEIGHT}"/>'
+        )
+        _render_text(x + _TERMINATION_ARROW + _PADDING, y, self._label, output)
+
+
+@final
+class _Block(_Layout):
+    def __init__(self, title: _Text, body: _Layout) -> None:
+        super().__init__(
+            max(_measure(title) + 2 * _PADDING, body.width + 2 * _PADDING),
+            _ROW_HEIGHT + body.height + _PADDING,
+        )
+        self._title = title
+        self._body = body
+
+    @override
+    def render(self, x: int, y: int, width: int, height: int, output: list[str]) -> None:
+        _render_rectangle(x, y, width, height, output)
+        _render_text(x + _PADDING, y, self._title, output)
+        self._body.render(
+            x + _PADDING,
+            y + _ROW_HEIGHT,
+            width - 2 * _PADDING,
+            height - _ROW_HEIGHT - _PADDING,
+            output,
+        )
+
+
+@final
+class SvgGenerator(StatementVisitor[_Layout]):
+    _PLACEHOLDER_PATTERN = re.compile(r"\{([^{}]+)}")
+
+    @override
+    def visit(self, statement: Statement) -> _Layout:
+        match statement:
+            case Input():
+                if isinstance(statement.type_, ArrayType):
+                    return _Imperative(
+                        _plain("Eingabe: ") + _code(f"{statement.target}[{statement.type_.length}]"),
+                    )
+                return _Imperative(_plain("Eingabe: ") + _code(statement.target))
+            case Print():
+                return _Imperative(_plain("Ausgabe: ") + SvgGenerator._placeholders_to_code(statement.text.text))
+            case Assign():
+                match statement.target:
+                    case str():
+                        target = statement.target
+                    case ArrayElement():
+                        target = statement.target.to_text()
+                    case _:
+                        raise NotImplementedError
+                return _Imperative(_code(f"{target} := {statement.value.to_text()}"))
+            case If():
+                condition: Final = _code(statement.condition.to_text()) + _plain("?")
+                branches: Final = [_Branch(_plain("ja"), self.generate_layout_for_block(statement.then_block))]
+                if statement.else_block:
+                    branches.append(_Branch(_plain("nein"), self.generate_layout_for_block(statement.else_block)))
+                return _Selective(condition, branches)
+            case While():
+                header: Final = _plain("" if statement.label is None else f"{statement.label}: ")
+                return _PreTestedIteration(
+                    header + _code(statement.condition.to_text()),
+                    self.generate_layout_for_block(statement.body),
+                )
+            case Do():
+                if statement.condition is None:
+                    raise ValueError("Do statement must have a condition.")
+                footer: Final = _plain("" if statement.label is None else f"{statement.label}: ")
+                return _PostTestedIteration(
+                    footer + _code(statement.condition.to_text()),
+                    self.generate_layout_for_block(statement.body),
+                )
+            case Loop():
+                return _ContinuousIteration(self.generate_layout_for_block(statement.body))
+            case Break():
+                return _Termination(_plain(statement.label))
+            case DocumentedBlock():
+                return _Block(_plain(statement.docstring), self.generate_layout_for_block(statement.block))
+            case Match():
+                return _Selective(
+                    _code(statement.value.to_text()),
+                    [
+                        _Branch(
+                            _code(f"{arm.operator.value[2]} {arm.condition.to_text()}"),
+                            self.generate_layout_for_block(arm.body),
+                        )
+                        for arm in statement.arms
+                    ],
+                )
+            case _:
+                raise NotImplementedError(f"SVG generation for {type(statement)} is not implemented.")
+
+    @staticmethod
+    def _placeholders_to_code(text: str) -> _Text:
+        runs: list[_Run] = []
+        for i, part in enumerate(SvgGenerator._PLACEHOLDER_PATTERN.split(text)):
+            # Splitting with a capturing group alternates between literal text and placeholders.
+            if part:
+                runs.append(_Run(part, is_code=i % 2 == 1))
+        return tuple(runs)
+
+    def generate_layout_for_block(self, block: Block) -> _Layout:
+        visible_statements: Final = [statement for statement in block if not statement.hidden_in_latex]
+        if len(visible_statements) == 1:
+            return self.visit(visible_statements[0])
+        return _Serial([self.visit(statement) for statement in visible_statements])
+
+    def generate_svg_for_block(self, block: Block) -> str:
+        layout: Final = self.generate_layout_for_block(block)
+        width: Final = layout.width + 1
+        height: Final = layout.height + 1
+        output: Final = [
+            f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+            + f'viewBox="-0.5 -0.5 {width} {height}" font-family="sans-serif" font-size="{_FONT_SIZE}">',
+            "<style>rect, line, polyline { fill: none; stroke: black; } .code { font-family: monospace; }</style>",
+            f'<rect x="0" y="0" width="{layout.width}" height="{layout.height}" style="fill: white"/>',
+        ]
+        layout.render(0, 0, layout.width, layout.height, output)
+        output.append("</svg>")
+        return "\n".join(output)
@@ -0,0 +1,454 @@
+import math
+import threading
+import types
+import weakref
+from abc import ABC
+from abc import abstractmethod
+from collections.abc import Callable
+from collections.abc import Sequence
+from typing import Final
+from typing import NamedTuple
+from typing import Optional
+from typing import final
+
+from nessi.analysis import contains_break
+from nessi.analysis import expression_variables
+from nessi.analysis import statement_expressions
+from nessi.analysis import walk_statements
+from nessi.buffer_array import BufferArray
+from nessi.context import Context
+from nessi.expressions import ArrayElement
+from nessi.expressions import BinaryExpression
+from nessi.expressions import Bool
+from nessi.expressions import Expression
+from nessi.expressions import Float
+from nessi.expressions import Integer
+from nessi.expressions import Operator
+from nessi.expressions import Variable
+from nessi.metrics import record_cache_lookup
+from nessi.statement_visitor import Statement
+from nessi.statements import Assign
+from nessi.statements import Block
+from nessi.statements import Break
+from nessi.statements import Do
+from nessi.statements import DocumentedBlock
+from nessi.statements import If
+from nessi.statements import Loop
+from nessi.statements import While
+from nessi.value import Value
+
+# Tiered execution of hot loops. The interpreter counts the iterations of every loop; once
+# a loop reaches `HOT_LOOP_THRESHOLD` iterations, it is translated into Python source code
+# that keeps the program's variables in Python locals and is specialized for the types the
+# variables have at that point. The interpreter then continues the loop in the compiled
+# code at the next iteration boundary. Later executions of the loop enter the compiled code
+# directly if the variables still have the same types (the guard), and compile another
+# specialization otherwise.
+#
+# Loops are only compiled if every expression in them has a statically known type under the
+# guarded variable types, and if the loop doesn't contain statements with side effects
+# beyond variables (`Input`, `Print`) or `Match` statements. Because the types are known,
+# the compiled code needs none of the interpreter's type checks, and every error it can
+# still raise (division by zero, array indices out of bounds) is raised with the same
+# message as by the interpreter.
+
+HOT_LOOP_THRESHOLD: Final = 32
+# Changes whenever the generated code changes, so that persisted code is compiled again.
+CODE_VERSION: Final = 2
+
+# `bool`, `int` or `float` for scalars, `list[bool]`, `list[int]` or `list[float]` for arrays.
+type _Type = type | types.GenericAlias
+type _Signature = tuple[_Type, ...]
+
+# compiled(variables, statements_executed, limit, check_limits) -> (statements_executed, break_label)
+# `check_limits(statements_executed)` is called whenever `statements_executed > limit` at
+# an iteration boundary. It raises if fuel or time is exhausted and returns the next limit.
+type CompiledLoop = Callable[[Context, int, int, Callable[[int], int]], tuple[int, Optional[str]]]
+# element_type(array) -> the type of all elements of the list, or `None` if they have different types
+type ElementType = Callable[[list[int] | list[float]], Optional[type]]
+
+_SCALAR_TYPES: Final = (bool, int, float)
+_ARITHMETIC_OPERATORS: Final = {
+    Operator.ADD: "+",
+    Operator.SUBTRACT: "-",
+    Operator.MULTIPLY: "*",
+    Operator.MODULUS: "%",
+}
+_COMPARISON_OPERATORS: Final = {
+    Operator.GREATER_THAN: ">",
+    Operator.LESS_THAN: "<",
+    Operator.EQUALS: "==",
+    Operator.NOT_EQUALS: "!=",
+    Operator.GREATER_THAN_OR_EQUAL: ">=",
+    Operator.LESS_THAN_OR_EQUAL: "<=",
+}
+
+
+class _NotCompilable(Exception):
+    pass
+
+
+def _read_index_error(index: int, array_name: str) -> Value:
+    raise IndexError(f"Index {index} out of bounds for array '{array_name}'")
+
+
+def _write_index_error(index: int, length: int) -> None:
+    raise IndexError(f"Array index {index} out of bounds for array of size {length}.")
+
+
+def _value_type(value: Value, element_type: ElementType) -> Optional[_Type]:
+    # Returns the type of a variable's value, or `None` if compiled code can't handle it.
+    if type(value) in _SCALAR_TYPES:
+        return type(value)
+    if isinstance(value, BufferArray) and value:
+        return list[value.element_type]
+    if isinstance(value, list) and value:
+        list_element_type: Final = element_type(value)
+        if list_element_type in _SCALAR_TYPES:
+            return list[list_element_type]
+    return None
+
+
+def _is_integral(type_: _Type) -> bool:
+    return type_ is int or type_ is bool
+
+
+def _is_supported(loop: Statement) -> bool:
+    return all(
+        isinstance(statement, (Assign, If, While, Do, Loop, Break, DocumentedBlock))
+        for statement in walk_statements([loop])
+    )
+
+
+def _written_arrays(loop: Statement) -> tuple[str, ...]:
+    return tuple(
+        sorted(
+            {
+                statement.target.array_name
+                for statement in walk_statements([loop])
+                if isinstance(statement, Assign) and isinstance(statement.target, ArrayElement)
+            }
+        )
+    )
+
+
+def _loop_variables(loop: Statement) -> tuple[str, ...]:
+    names: Final[set[str]] = set()
+    for statement in walk_statements([loop]):
+        for expression in statement_expressions(statement):
+            names.update(expression_variables(expression))
+        if isinstance(statement, Assign):
+            names.add(statement.target if isinstance(statement.target, str) else statement.target.array_name)
+    return tuple(sorted(names))
+
+
+@final
+class _CodeGenerator:
+    def __init__(self, types_: dict[str, _Type], outer_labels: Optional[Sequence[str]]) -> None:
+        # `outer_labels` are the labels of the interpreted loops around the compiled loop,
+        # `None` if break labels don't need to be checked (validated programs).
+        self._types = types_
+        self._outer_labels = outer_labels
+        self._locals: Final = {name: f"v{index}" for index, name in enumerate(types_)}
+        self._lines: Final[list[str]] = []
+        self._temporary_count = 0
+        self._loop_depth = 0
+
+    def generate(self, loop: Statement) -> str:
+        self._lines.append("def compiled_loop(_variables, _n, _limit, _check):")
+        for name, local in self._locals.items():
+            self._lines.append(f"    {local} = _variables[{name!r}]")
+        self._lines.append("    _break = None")
+        self._lines.append("    try:")
+        self._statement(loop, 2, ())
+        self._lines.append("    finally:")
+        # Write back all scalars, so that the variables are up to date even after an error.
+        # Arrays are modified in place.
+        for name, local in self._locals.items():
+            self._lines.append(f"        _variables[{name!r}] = {local}")
+        self._lines.append("    return _n, _break")
+        return "\n".join(self._lines) + "\n"
+
+    def _emit(self, indent: int, line: str) -> None:
+        self._lines.append("    " * indent + line)
+
+    def _temporary(self) -> str:
+        self._temporary_count += 1
+        return f"_t{self._temporary_count}"
+
+    def _expression(self, expression: Expression) -> tuple[str, _Type]:
+        match expression:
+            case Bool():
+                return repr(expression.value), bool
+            case Integer():
+                return f"({expression.value!r})", int
+            case Float() if math.isfinite(expression.value):
+                return f"({expression.value!r})", float
+            case Float():
+                return f"float({str(expression.value)!r})", float
+            case Variable():
+                return self._locals[expression.name], self._types[expression.name]
+            case ArrayElement():
+                array_type: Final = self._types[expression.array_name]
+                index_code, index_type = self._expression(expression.index)
+                if not isinstance(array_type, types.GenericAlias) or not _is_integral(index_type):
+                    raise _NotCompilable()
+                array: Final = self._locals[expression.array_name]
+                index: Final = self._temporary()
+                return (
+                    f"({array}[{index}] if 0 <= ({index} := {index_code}) < len({array}) "
+                    + f"else _read_index_error({index}, {expression.array_name!r}))",
+                    array_type.__args__[0],
+                )
+            case BinaryExpression():
+                left_code, left_type = self._expression(expression.left)
+                right_code, right_type = self._expression(expression.right)
+                if left_type not in _SCALAR_TYPES or right_type not in _SCALAR_TYPES:
+                    raise _NotCompilable()
+                integral: Final = _is_integral(left_type) and _is_integral(right_type)
+                operator: Final = expression.operator
+                if operator in _COMPARISON_OPERATORS:
+                    return f"({left_code} {_COMPARISON_OPERATORS[operator]} {right_code})", bool
+                if operator == Operator.DIVIDE:
+                    if integral:
+                        return f"({left_code} // {right_code})", int
+                    return f"({left_code} / {right_code})", float
+                if operator == Operator.MODULUS and left_type is float and right_type is float:
+                    raise _NotCompilable()  # The interpreter raises a `TypeError`.
+                return f"({left_code} {_ARITHMETIC_OPERATORS[operator]} {right_code})", int if integral else float
+            case _:
+                raise _NotCompilable()
+
+    def _condition(self, expression: Optional[Expression]) -> str:
+        if expression is None:
+            raise _NotCompilable()
+        code, type_ = self._expression(expression)
+        if type_ is not bool:
+            raise _NotCompilable()
+        return code
+
+    def _block(self, block: Block, indent: int, labels: tuple[str, ...]) -> None:
+        # Executed statements are counted once per run of statements that can't be left
+        # early, that is, up to and including the next statement that may break.
+        if not block:
+            self._emit(indent, "pass")
+        counted_until = 0
+        for index, statement in enumerate(block):
+            if index == counted_until:
+                counted_until = next(
+                    (end + 1 for end in range(index, len(block)) if contains_break([block[end]])),
+                    len(block),
+                )
+                self._emit(indent, f"_n += {counted_until - index}")
+            self._statement(statement, indent, labels)
+            if isinstance(statement, Break):
+                break  # The remaining statements are never executed.
+
+    def _statement(self, statement: Statement, indent: int, labels: tuple[str, ...]) -> None:
+        match statement:
+            case Assign(target=str() as target):
+                code, type_ = self._expression(statement.value)
+                if type_ != self._types[target]:
+                    raise _NotCompilable()
+                self._emit(indent, f"{self._locals[target]} = {code}")
+            case Assign(target=ArrayElement() as element):
+                value_code, value_type = self._expression(statement.value)
+                index_code, index_type = self._expression(element.index)
+                array_type: Final = types.GenericAlias(list, value_type)
+                if self._types[element.array_name] != array_type or not _is_integral(index_type):
+                    raise _NotCompilable()
+                array: Final = self._locals[element.array_name]
+                value: Final = self._temporary()
+                index: Final = self._temporary()
+                self._emit(indent, f"{value} = {value_code}")
+                self._emit(indent, f"{index} = {index_code}")
+                self._emit(indent, f"if not 0 <= {index} < len({array}):")
+                self._emit(indent + 1, f"_write_index_error({index}, len({array}))")
+                self._emit(indent, f"{array}[{index}] = {value}")
+            case If():
+                if self._outer_labels is not None and not statement.then_block:
+                    raise _NotCompilable()  # The interpreter raises a `ValueError`.
+                self._emit(indent, f"if {self._condition(statement.condition)}:")
+                self._block(statement.then_block, indent + 1, labels)
+                self._emit(indent, "else:")
+                self._block(statement.else_block, indent + 1, labels)
+            case While() | Do() | Loop():
+                self._loop(statement, indent, labels)
+            case Break():
+                if self._outer_labels is not None and statement.label not in (*self._outer_labels, *labels):
+                    raise _NotCompilable()  # The interpreter raises an `InvalidBreakLabelError`.
+                self._emit(indent, f"_break = {statement.label!r}")
+                self._emit(indent, "break")
+            case DocumentedBlock():
+                self._block(statement.block, indent, labels)
+            case _:
+                raise _NotCompilable()
+
+    def _loop(self, loop: While | Do | Loop, indent: int, labels: tuple[str, ...]) -> None:
+        body_labels: Final = labels if loop.label is None else (*labels, loop.label)
+        can_break: Final = contains_break(loop.body)
+        self._loop_depth += 1
+        self._emit(indent, "while True:")
+        self._emit(indent + 1, "if _n > _limit:")
+        # The limit checks may inspect the variables (see `Interpreter._check_limits()`).
+        for name, local in self._locals.items():
+            if not isinstance(self._types[name], types.GenericAlias):
+                self._emit(indent + 2, f"_variables[{name!r}] = {local}")
+        self._emit(indent + 2, "_limit = _check(_n)")
+        match loop:
+            case While():
+                self._emit(indent + 1, f"if not {self._condition(loop.condition)}:")
+                self._emit(indent + 2, "break")
+                self._block(loop.body, indent + 1, body_labels)
+            case Do():
+                condition: Final = self._condition(loop.condition)
+                if can_break:
+                    # The condition is evaluated even after a `Break` in the body, so the body
+                    # runs in a loop of its own that is left by the `Break`.
+                    self._emit(indent + 1, "while True:")
+                    self._block(loop.body, indent + 2, body_labels)
+                    self._emit(indent + 2, "break")
+                    self._emit(indent + 1, f"if not {condition} or _break is not None:")
+                else:
+                    self._block(loop.body, indent + 1, body_labels)
+                    self._emit(indent + 1, f"if not {condition}:")
+                self._emit(indent + 2, "break")
+            case Loop():
+                self._block(loop.body, indent + 1, body_labels)
+        self._loop_depth -= 1
+        if can_break:
+            if loop.label is not None:
+                self._emit(indent, f"if _break == {loop.label!r}:")
+                self._emit(indent + 1, "_break = None")
+            if self._loop_depth > 0:
+                # Leave the enclosing compiled loop as well, if the break targets an outer loop.
+                self._emit(indent, "if _break is not None:")
+                self._emit(indent + 1, "break")
+
+
+def compile_loop(loop: While | Do | Loop, types_: dict[str, _Type], outer_labels: Optional[Sequence[str]]) -> str:
+    # Returns the Python source code of the specialized loop. Raises `_NotCompilable`.
+    return _CodeGenerator(types_, outer_labels).generate(loop)
+
+
+@final
+class _LoopEntry(NamedTuple):
+    # `variables` is `None` if the loop contains statements that are never compiled.
+    variables: Optional[tuple[str, ...]]
+    written_arrays: tuple[str, ...]
+    specializations: dict[tuple[_Signature, Optional[tuple[str, ...]]], Optional[CompiledLoop]]
+
+
+# Compiled loops are shared by all interpreters (and threads) running the same statements.
+_compiled_loops: Final[weakref.WeakKeyDictionary[Statement, _LoopEntry]] = weakref.WeakKeyDictionary()
+_compiled_loops_lock: Final = threading.Lock()
+
+
+class LoopCodeStore(ABC):
+    # Keeps the code of compiled loops beyond the lifetime of the loop statements, e.g. on
+    # disk (see `nessi.program_cache`). Keys identify a loop within its program and the
+    # specialization; `None` code marks specializations that can't be compiled.
+    @abstractmethod
+    def load(self, key: str) -> tuple[bool, Optional[types.CodeType]]:
+        # Returns whether the key is stored and its code.
+        pass
+
+    @abstractmethod
+    def store(self, key: str, code: Optional[types.CodeType]) -> None:
+        pass
+
+
+_loop_code_stores: Final[weakref.WeakKeyDictionary[Statement, tuple[LoopCodeStore, int]]] = weakref.WeakKeyDictionary()
+
+
+def attach_loop_code_store(statements: Block, store: LoopCodeStore) -> None:
+    # Loads the compiled loops of the statements from `store` and saves newly compiled ones
+    # to it. Loops are identified by their position, so a store must only be attached to
+    # structurally equal statements.
+    loops: Final = (statement for statement in walk_statements(statements) if isinstance(statement, (While, Do, Loop)))
+    for index, loop in enumerate(loops):
+        _loop_code_stores[loop] = (store, index)
+
+
+def _code_key(index: int, types_: dict[str, _Type], outer_labels: Optional[Sequence[str]]) -> str:
+    signature: Final = ",".join(f"{name}:{type_!r}" for name, type_ in types_.items())
+    return f"{index}|{signature}|{None if outer_labels is None else tuple(outer_labels)!r}"
+
+
+def _compile(
+    loop: While | Do | Loop,
+    types_: dict[str, _Type],
+    outer_labels: Optional[Sequence[str]],
+) -> Optional[CompiledLoop]:
+    # Returns `None` if this specialization can't be compiled.
+    store: Optional[LoopCodeStore] = None
+    key = ""
+    is_stored = False
+    code: Optional[types.CodeType] = None
+    stored: Final = _loop_code_stores.get(loop)
+    if stored is not None:
+        store, index = stored
+        key = _code_key(index, types_, outer_labels)
+        is_stored, code = store.load(key)
+    if not is_stored:
+        try:
+            code = compile(compile_loop(loop, types_, outer_labels), f"<compiled loop {id(loop):#x}>", "exec")
+        except _NotCompilable:
+            code = None
+        if store is not None:
+            store.store(key, code)
+    if code is None:
+        return None
+    namespace: Final[dict[str, object]] = {
+        "_read_index_error": _read_index_error,
+        "_write_index_error": _write_index_error,
+    }
+    exec(code, namespace)
+    return namespace["compiled_loop"]  # type: ignore[return-value]
+
+
+def find_compiled_loop(
+    loop: While | Do | Loop,
+    variables: Context,
+    outer_labels: Optional[Sequence[str]],
+    *,
+    is_hot: bool,
+    element_type: ElementType,
+) -> Optional[CompiledLoop]:
+    # Returns the compiled loop specialized for the current variable types. Loops that have
+    # never been hot are not compiled unless `is_hot` is set. `outer_labels` are the labels
+    # of the interpreted loops around the loop, `None` for validated programs. The element
+    # types of lists are looked up with `element_type`, which the interpreter caches per list,
+    # so that entering a loop doesn't scan its arrays.
+    entry = _compiled_loops.get(loop)
+    if entry is None:
+        if not is_hot:
+            return None
+        entry = _LoopEntry(_loop_variables(loop) if _is_supported(loop) else None, _written_arrays(loop), {})
+        with _compiled_loops_lock:
+            entry = _compiled_loops.setdefault(loop, entry)
+    if entry.variables is None:
+        return None
+    types_: Final[dict[str, _Type]] = {}
+    for name in entry.variables:
+        type_ = _value_type(variables[name], element_type) if name in variables else None
+        if type_ is None:
+            return None  # The guard fails, keep interpreting.
+        types_[name] = type_
+    key: Final = (tuple(types_.values()), None if outer_labels is None else tuple(outer_labels))
+    is_cached: Final = key in entry.specializations
+    record_cache_lookup("compiled_loops", is_cached)
+    if not is_cached:
+        # `None` remembers that this specialization can't be compiled.
+        new_compiled: Final = _compile(loop, types_, outer_labels)
+        with _compiled_loops_lock:
+            entry.specializations.setdefault(key, new_compiled)
+    compiled: Final = entry.specializations[key]
+    if compiled is not None:
+        # Compiled code writes arrays in place. Read-only buffer arrays are copied first, like
+        # the interpreter does before the first write.
+        for name in entry.written_arrays:
+            value = variables[name]
+            if isinstance(value, BufferArray) and value.is_readonly:
+                variables[name] = list(value)
+    return compiled
@@ -0,0 +1,389 @@
+import hashlib
+import json
+import struct
+from collections import OrderedDict
+from collections.abc import Iterator
+from os import PathLike
+from typing import TYPE_CHECKING
+from typing import BinaryIO
+from typing import Final
+from typing import NamedTuple
+from typing import Optional
+from typing import final
+
+from nessi.analysis import statement_ids
+from nessi.buffer_array import BufferArray
+from nessi.serialization import serialize_block
+from nessi.statement_visitor import Statement
+from nessi.statements import Block
+from nessi.value import Value
+from nessi.value import is_array
+
+if TYPE_CHECKING:
+    from nessi.program import Program
+
+# Execution traces are stored in a ring buffer of fixed-size binary records, so that
+# recording a statement costs a dict lookup and a `pack_into()`, and a trace never takes
+# more than `capacity` records of memory. Statements are identified by their index in a
+# pre-order traversal of the program, variable names and string values by their id in a
+# table of interned strings. The table of string values keeps only the `capacity` most
+# recently recorded ones: older ones can't be referenced by any record in the buffer.
+#
+# Record layout (16 bytes): kind, value tag, variable id, argument, payload (int64 or double).
+#   statement:     argument = statement id
+#   branch:        argument = statement id, payload = branch taken (0/1 for conditions
+#                  and loop conditions, arm index for `Match`)
+#   write:         variable id, value tag and payload (the length for arrays, whose
+#                  elements are not recorded)
+#   element write: variable id, argument = index, value tag and payload
+
+_RECORD: Final = struct.Struct("<BBHIq")
+_FLOAT_RECORD: Final = struct.Struct("<BBHId")
+_HEADER: Final = struct.Struct("<8s32sQQII")
+_STRING_LENGTH: Final = struct.Struct("<I")
+_STRING_ID: Final = struct.Struct("<Q")
+_MAGIC: Final = b"NESSITR2"
+
+
+# Plain integers rather than enums, since they are packed on every recorded statement.
+class _Kind:
+    STATEMENT: Final = 0
+    BRANCH: Final = 1
+    WRITE: Final = 2
+    ELEMENT_WRITE: Final = 3
+
+
+class _Tag:
+    NONE: Final = 0
+    BOOL: Final = 1
+    INT: Final = 2
+    FLOAT: Final = 3
+    STRING: Final = 4  # Payload is the id of the interned string.
+    BIG_INT: Final = 5  # Payload is the id of the interned decimal representation.
+    LIST: Final = 6  # Payload is the length.
+
+
+_INT64_RANGE: Final = range(-(2**63), 2**63)
+
+
+@final
+class TraceMismatchError(ValueError):
+    def __init__(self) -> None:
+        super().__init__("Trace was not recorded for this program.")
+
+
+@final
+class InvalidTraceFileError(ValueError):
+    def __init__(self, message: str) -> None:
+        super().__init__(f"Invalid trace file: {message}")
+
+
+def _program_digest(statements: Block) -> bytes:
+    return hashlib.sha256(json.dumps(serialize_block(statements), sort_keys=True).encode()).digest()
+
+
+@final
+class Tracer:
+    # Opt-in recorder for `Program.execute(..., tracer=...)`. If `error_dump_path` is set,
+    # the trace is written to that file when a run fails. A tracer can be reused for
+    # several runs of the same program; the buffer then holds the most recent records.
+    def __init__(
+        self,
+        program: "Program",
+        *,
+        capacity: int = 65536,
+        error_dump_path: Optional[str | PathLike[str]] = None,
+    ) -> None:
+        if capacity <= 0:
+            raise ValueError(f"Trace capacity must be positive, got {capacity}.")
+        self._digest: Final = _program_digest(program.statements)
+        self._statement_ids: Final = statement_ids(program.statements)
+        self._capacity: Final = capacity
+        self._buffer: Final = bytearray(capacity * _RECORD.size)
+        self._records_written = 0
+        self._names: Final[dict[str, int]] = {}
+        # Least recently recorded first.
+        self._strings: Final[OrderedDict[str, int]] = OrderedDict()
+        self._string_count = 0
+        self._error_dump_path = error_dump_path
+
+    @property
+    def capacity(self) -> int:
+        return self._capacity
+
+    @property
+    def records_written(self) -> int:
+        return self._records_written
+
+    @property
+    def error_dump_path(self) -> Optional[str | PathLike[str]]:
+        return self._error_dump_path
+
+    def record_statement(self, statement: Statement) -> None:
+        # Inlined `_append()`, this is the hot path.
+        records_written: Final = self._records_written
+        _RECORD.pack_into(
+            self._buffer,
+            (records_written % self._capacity) * _RECORD.size,
+            _Kind.STATEMENT,
+            _Tag.NONE,
+            0,
+            self._statement_ids[statement],
+            0,
+        )
+        self._records_written = records_written + 1
+
+    def record_branch(self, statement: Statement, branch: int) -> None:
+        self._append(_RECORD, _Kind.BRANCH, _Tag.NONE, 0, self._statement_ids[statement], branch)
+
+    def record_write(self, name: str, value: Value) -> None:
+        self._append_value(_Kind.WRITE, self._name_id(name), 0, value)
+
+    def record_element_write(self, name: str, index: int, value: Value) -> None:
+        self._append_value(_Kind.ELEMENT_WRITE, self._name_id(name), index, value)
+
+    def dump(self, path: str | PathLike[str]) -> None:
+        with open(path, "wb") as file:
+            self._write(file)
+
+    def _write(self, file: BinaryIO) -> None:
+        file.write(
+            _HEADER.pack(
+                _MAGIC,
+                self._digest,
+                self._records_written,
+                min(self._records_written, self._capacity),
+                len(self._names),
+                len(self._strings),
+            )
+        )
+        for name in self._names:
+            _write_string(file, name)
+        for string, string_id in self._strings.items():
+            file.write(_STRING_ID.pack(string_id))
+            _write_string(file, string)
+        # Unroll the ring buffer, so that the records are stored in chronological order.
+        if self._records_written <= self._capacity:
+            file.write(self._buffer[: self._records_written * _RECORD.size])
+        else:
+            split: Final = (self._records_written % self._capacity) * _RECORD.size
+            file.write(self._buffer[split:])
+            file.write(self._buffer[:split])
+
+    def _name_id(self, name: str) -> int:
+        return self._names.setdefault(name, len(self._names))
+
+    def _append_value(self, kind: int, variable_id: int, argument: int, value: Value) -> None:
+        match value:
+            case bool():
+                self._append(_RECORD, kind, _Tag.BOOL, variable_id, argument, int(value))
+            case int() if value in _INT64_RANGE:
+                self._append(_RECORD, kind, _Tag.INT, variable_id, argument, value)
+            case int():
+                self._append(_RECORD, kind, _Tag.BIG_INT, variable_id, argument, self._string_id(str(value)))
+            case float():
+                self._append(_FLOAT_RECORD, kind, _Tag.FLOAT, variable_id, argument, value)
+            case str():
+                self._append(_RECORD, kind, _Tag.STRING, variable_id, argument, self._string_id(value))
+            case list() | BufferArray():
+                self._append(_RECORD, kind, _Tag.LIST, variable_id, argument, len(value))
+            case _:
+                self._append(_RECORD, kind, _Tag.NONE, variable_id, argument, 0)
+
+    def _string_id(self, string: str) -> int:
+        string_id = self._strings.get(string)
+        if string_id is not None:
+            self._strings.move_to_end(string)
+            return string_id
+        string_id = self._strings[string] = self._string_count
+        self._string_count += 1
+        if len(self._strings) > self._capacity:
+            self._strings.popitem(last=False)
+        return string_id
+
+    def _append(
+        self,
+        record: struct.Struct,
+        kind: int,
+        tag: int,
+        variable_id: int,
+        argument: int,
+        payload: int | float,
+    ) -> None:
+        offset: Final = (self._records_written % self._capacity) * _RECORD.size
+        record.pack_into(self._buffer, offset, kind, tag, variable_id, argument, payload)
+        self._records_written += 1
+
+
+@final
+class TraceEvent(NamedTuple):
+    kind: str  # "statement", "branch", "write" or "element_write"
+    statement: Optional[Statement] = None
+    branch: Optional[int] = None
+    variable: Optional[str] = None
+    index: Optional[int] = None
+    value: Optional[Value] = None
+
+
+@final
+class ReplayStep(NamedTuple):
+    # One executed statement (or re-evaluated loop condition) with the branch it took, the
+    # writes it made and the variables after these writes. Variables written before the
+    # start of the trace are missing, and the elements of arrays are `None` until they are
+    # assigned individually, since whole arrays are recorded by their length only.
+    statement: Statement
+    branch: Optional[int]
+    writes: list[TraceEvent]
+    variables: dict[str, Value]
+
+
+@final
+class Trace:
+    def __init__(
+        self,
+        *,
+        digest: bytes,
+        records_written: int,
+        names: list[str],
+        strings: dict[int, str],
+        records: bytes,
+    ) -> None:
+        self._digest = digest
+        self._records_written = records_written
+        self._names = names
+        self._strings = strings
+        self._records = records
+
+    @property
+    def records_written(self) -> int:
+        return self._records_written
+
+    @property
+    def record_count(self) -> int:
+        return len(self._records) // _RECORD.size
+
+    @property
+    def is_truncated(self) -> bool:
+        # True if older records have been overwritten by newer ones.
+        return self._records_written > self.record_count
+
+    def events(self, program: "Program") -> Iterator[TraceEvent]:
+        if _program_digest(program.statements) != self._digest:
+            raise TraceMismatchError()
+        statements: Final = list(statement_ids(program.statements))
+        for offset in range(0, len(self._records), _RECORD.size):
+            kind, tag, variable_id, argument, payload = _RECORD.unpack_from(self._records, offset)
+            if tag == _Tag.FLOAT:
+                payload = _FLOAT_RECORD.unpack_from(self._records, offset)[4]
+            match kind:
+                case _Kind.STATEMENT:
+                    yield TraceEvent("statement", statement=statements[argument])
+                case _Kind.BRANCH:
+                    yield TraceEvent("branch", statement=statements[argument], branch=payload)
+                case _Kind.WRITE:
+                    yield TraceEvent("write", variable=self._names[variable_id], value=self._decode(tag, payload))
+                case _Kind.ELEMENT_WRITE:
+                    yield TraceEvent(
+                        "element_write",
+                        variable=self._names[variable_id],
+                        index=argument,
+                        value=self._decode(tag, payload),
+                    )
+                case _:
+                    raise InvalidTraceFileError(f"unknown record kind {kind}")
+
+    def replay(self, program: "Program") -> Iterator[ReplayStep]:
+        variables: Final[dict[str, Value]] = {}
+        step: Optional[ReplayStep] = None
+        for event in self.events(program):
+            match event:
+                case TraceEvent(kind="statement", statement=Statement() as statement):
+                    if step is not None:
+                        yield step._replace(variables=_copy_variables(variables))
+                    step = ReplayStep(statement, None, [], {})
+                case TraceEvent(kind="branch", statement=Statement() as statement, branch=int() as branch):
+                    if step is not None and step.statement is statement and step.branch is None:
+                        step = step._replace(branch=branch)
+                    else:
+                        # A loop condition that is evaluated again after the loop body.
+                        if step is not None:
+                            yield step._replace(variables=_copy_variables(variables))
+                        step = ReplayStep(statement, branch, [], {})
+                case TraceEvent(kind="write", variable=str() as variable, value=value) if value is not None:
+                    if step is None:
+                        continue  # The trace starts in the middle of a statement.
+                    variables[variable] = value
+                    step.writes.append(event)
+                case TraceEvent(kind="element_write", variable=str() as variable, index=int() as index, value=value):
+                    if step is None:
+                        continue
+                    array = variables.get(variable)
+                    if isinstance(array, list) and index < len(array):
+                        array[index] = value  # type: ignore[unsupported-operation]
+                    step.writes.append(event)
+        if step is not None:
+            yield step._replace(variables=_copy_variables(variables))
+
+    def _string(self, string_id: int) -> str:
+        string: Final = self._strings.get(string_id)
+        if string is None:
+            raise InvalidTraceFileError(f"unknown string id {string_id}")
+        return string
+
+    def _decode(self, tag: int, payload: int | float) -> Value:
+        match tag:
+            case _Tag.BOOL:
+                return bool(payload)
+            case _Tag.INT | _Tag.FLOAT:
+                return payload
+            case _Tag.STRING:
+                return self._string(int(payload))
+            case _Tag.BIG_INT:
+                return int(self._string(int(payload)))
+            case _Tag.LIST:
+                return [None] * int(payload)  # type: ignore[return-value]  # Filled in by later element writes.
+            case _:
+                raise InvalidTraceFileError(f"unknown value tag {tag}")
+
+
+def _write_string(file: BinaryIO, string: str) -> None:
+    encoded: Final = string.encode()
+    file.write(_STRING_LENGTH.pack(len(encoded)))
+    file.write(encoded)
+
+
+def _read_string(file: BinaryIO) -> str:
+    (length,) = _STRING_LENGTH.unpack(_read_exactly(file, _STRING_LENGTH.size))
+    return _read_exactly(file, length).decode()
+
+
+def _copy_variables(variables: dict[str, Value]) -> dict[str, Value]:
+    return {name: list(value) if is_array(value) else value for name, value in variables.items()}
+
+
+def _read_exactly(file: BinaryIO, size: int) -> bytes:
+    data: Final = file.read(size)
+    if len(data) != size:
+        raise InvalidTraceFileError("unexpected end of file")
+    return data
+
+
+def load_trace(path: str | PathLike[str]) -> Trace:
+    with open(path, "rb") as file:
+        magic, digest, records_written, record_count, name_count, string_count = _HEADER.unpack(
+            _read_exactly(file, _HEADER.size)
+        )
+        if magic != _MAGIC:
+            raise InvalidTraceFileError("not a nessi trace")
+        names: Final = [_read_string(file) for _ in range(name_count)]
+        strings: Final[dict[int, str]] = {}
+        for _ in range(string_count):
+            (string_id,) = _STRING_ID.unpack(_read_exactly(file, _STRING_ID.size))
+            strings[string_id] = _read_string(file)
+        return Trace(
+            digest=digest,
+            records_written=records_written,
+            names=names,
+            strings=strings,
+            records=_read_exactly(file, record_count * _RECORD.size),
+        )
@@ -0,0 +1,135 @@
+from typing import Final
+from typing import NamedTuple
+from typing import final
+from typing import override
+
+from nessi.analysis import assigned_variables
+from nessi.analysis import expression_variables
+from nessi.analysis import statement_expressions
+from nessi.array_type import ArrayType
+from nessi.expressions import ArrayElement
+from nessi.statement_visitor import Statement
+from nessi.statements import Assign
+from nessi.statements import Block
+from nessi.statements import Break
+from nessi.statements import Do
+from nessi.statements import DocumentedBlock
+from nessi.statements import If
+from nessi.statements import Input
+from nessi.statements import Loop
+from nessi.statements import Match
+from nessi.statements import While
+
+# A single pass over a program that finds every error the interpreter would otherwise only
+# detect (one at a time) while executing the offending statement. Variables are tracked
+# with a "maybe assigned" analysis: a read is only reported if no path through the program
+# can have assigned the variable before. `Match` statements whose arms all compare against
+# literals must cover every integer, regardless of the values the matched expression can
+# actually take.
+
+
+@final
+class ValidationIssue(NamedTuple):
+    statement: Statement
+    message: str
+
+    @override
+    def __str__(self) -> str:
+        return f"{type(self.statement).__name__}: {self.message}"
+
+
+@final
+class ProgramValidationError(ValueError):
+    def __init__(self, issues: list[ValidationIssue]) -> None:
+        super().__init__(
+            f"Program has {len(issues)} structural error(s):\n" + "\n".join(f"  {issue}" for issue in issues)
+        )
+        self.issues: Final = issues
+
+
+@final
+class _Validator:
+    def __init__(self) -> None:
+        self.issues: Final[list[ValidationIssue]] = []
+
+    def validate_block(self, block: Block, labels: tuple[str, ...], assigned: frozenset[str]) -> frozenset[str]:
+        # Returns the variables that may have been assigned after the block.
+        for statement in block:
+            assigned = self._validate_statement(statement, labels, assigned)
+        return assigned
+
+    def _validate_statement(
+        self,
+        statement: Statement,
+        labels: tuple[str, ...],
+        assigned: frozenset[str],
+    ) -> frozenset[str]:
+        match statement:
+            case Input():
+                if isinstance(statement.type_, ArrayType) and isinstance(statement.type_.length, str):
+                    self._check_reads(statement, {statement.type_.length}, assigned)
+                return assigned | {statement.target}
+            case Assign():
+                self._check_expression_reads(statement, assigned)
+                if isinstance(statement.target, ArrayElement):
+                    self._check_reads(statement, {statement.target.array_name}, assigned)
+                    return assigned
+                return assigned | {statement.target}
+            case If():
+                self._check_expression_reads(statement, assigned)
+                if not statement.then_block:
+                    self._report(statement, "'then' block is empty")
+                return self.validate_block(statement.then_block, labels, assigned) | self.validate_block(
+                    statement.else_block, labels, assigned
+                )
+            case While() | Do() | Loop():
+                if isinstance(statement, Do) and statement.condition is None:
+                    self._report(statement, "missing loop condition")
+                # The body and the condition can run after earlier iterations of the body.
+                in_loop: Final = assigned | assigned_variables(statement.body)
+                self._check_expression_reads(statement, in_loop)
+                body_labels: Final = labels if statement.label is None else (*labels, statement.label)
+                return self.validate_block(statement.body, body_labels, in_loop)
+            case Break():
+                if statement.label not in labels:
+                    self._report(statement, f"unknown break label '{statement.label}'")
+                return assigned
+            case DocumentedBlock():
+                return self.validate_block(statement.block, labels, assigned)
+            case Match():
+                self._check_expression_reads(statement, assigned)
+                if not statement.dispatch.has_dynamic_arms:
+                    unmatched_value = statement.dispatch.find_unmatched_value(integers_only=True)
+                    if unmatched_value is not None:
+                        self._report(statement, f"not exhaustive, no arm matches the value {unmatched_value}")
+                after_arms = assigned
+                for arm in statement.arms:
+                    after_arms |= self.validate_block(arm.body, labels, assigned)
+                return after_arms
+            case _:
+                return assigned
+
+    def _check_expression_reads(self, statement: Statement, assigned: frozenset[str]) -> None:
+        read: Final[set[str]] = set()
+        for expression in statement_expressions(statement):
+            read.update(expression_variables(expression))
+        self._check_reads(statement, read, assigned)
+
+    def _check_reads(self, statement: Statement, read: set[str], assigned: frozenset[str]) -> None:
+        for name in sorted(read - assigned):
+            self._report(statement, f"variable '{name}' is read before it can have been assigned")
+
+    def _report(self, statement: Statement, message: str) -> None:
+        self.issues.append(ValidationIssue(statement, message))
+
+
+def find_validation_issues(block: Block) -> list[ValidationIssue]:
+    validator: Final = _Validator()
+    validator.validate_block(block, (), frozenset())
+    return validator.issues
+
+
+def validate_block(block: Block) -> None:
+    issues: Final = find_validation_issues(block)
+    if issues:
+        raise ProgramValidationError(issues)
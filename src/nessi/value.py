@@ -1 +1,20 @@
-type Value = int | float | str | bool | list[int] | list[float]
+import sys
+from typing import TypeIs
+
+from nessi.buffer_array import BufferArray
+
+type Array = list[int] | list[float] | BufferArray
+type Value = int | float | str | bool | Array
+
+
+def is_array(value: object) -> TypeIs[Array]:
+    return isinstance(value, (list, BufferArray))
+
+
+def value_size(value: Value) -> int:
+    # The approximate memory used by a value in bytes. The elements of a list are assumed to
+    # have the size of the first one. Buffer arrays are shared between runs and only count
+    # with the size of the wrapper.
+    if isinstance(value, list):
+        return sys.getsizeof(value) + (len(value) * sys.getsizeof(value[0]) if value else 0)
+    return sys.getsizeof(value)
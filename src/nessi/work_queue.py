@@ -0,0 +1,296 @@
+import hashlib
+import json
+import multiprocessing
+import os
+import socket
+import sqlite3
+import time
+import uuid
+from collections.abc import Iterable
+from collections.abc import Iterator
+from contextlib import contextmanager
+from types import TracebackType
+from typing import Final
+from typing import NamedTuple
+from typing import Optional
+from typing import Self
+from typing import final
+
+from nessi.batch import JobResult
+from nessi.batch import JsonJobRunner
+from nessi.batch import job_result_to_json
+
+# A work queue of batch jobs (JSONL lines, see `nessi.batch`) in an SQLite database, so that
+# worker processes on several machines with shared storage can run the jobs of one batch:
+#
+# - Workers lease jobs. A lease expires after the visibility timeout, e.g. because its worker
+#   died, and the job is then leased again. The visibility timeout should exceed the time
+#   limit of the jobs, otherwise slow jobs run more than once.
+# - A job is leased at most `max_attempts` times. A job whose last lease expired fails, so
+#   that a job that crashes its workers can't crash all of them.
+# - The first result of a job is kept. Results of jobs that ran more than once are ignored,
+#   so writing results is idempotent, and so is adding jobs (by their id, or their content
+#   for jobs without id).
+#
+# Leases and results are written in short transactions that lock the database. SQLite's
+# locking needs a file system with working POSIX locks, e.g. a local disk or NFSv4 with lock
+# support; the database must not be in WAL mode on network file systems.
+
+_SCHEMA: Final = """
+CREATE TABLE IF NOT EXISTS jobs (
+    number INTEGER PRIMARY KEY,
+    key TEXT NOT NULL UNIQUE,
+    line TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    lease_token TEXT,
+    lease_owner TEXT,
+    lease_expires REAL,
+    result TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_by_state ON jobs (state, number);
+"""
+
+
+@final
+class JobAttemptsExhaustedError(RuntimeError):
+    def __init__(self, attempts: int) -> None:
+        super().__init__(f"The job was leased {attempts} times without a result.")
+
+
+@final
+class Lease(NamedTuple):
+    # `number` is the position of the job in the queue.
+    number: int
+    key: str
+    line: str
+    token: str
+    attempt: int
+
+
+@final
+class QueueCounts(NamedTuple):
+    pending: int
+    leased: int
+    done: int
+    failed: int
+
+    @property
+    def is_finished(self) -> bool:
+        return self.pending == 0 and self.leased == 0
+
+
+def _job_key(line: str) -> str:
+    try:
+        data = json.loads(line)
+    except ValueError:
+        data = None
+    if isinstance(data, dict) and "id" in data:
+        return f"id:{data['id']}"
+    return f"sha256:{hashlib.sha256(line.encode()).hexdigest()}"
+
+
+def default_owner() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+@final
+class WorkQueue:
+    def __init__(
+        self,
+        path: str | os.PathLike[str],
+        *,
+        visibility_timeout: float = 300.0,
+        max_attempts: int = 3,
+    ) -> None:
+        if max_attempts <= 0:
+            raise ValueError(f"The maximum number of attempts must be positive, got {max_attempts}.")
+        self._visibility_timeout: Final = visibility_timeout
+        self._max_attempts: Final = max_attempts
+        # Transactions are started explicitly.
+        self._connection: Final = sqlite3.connect(path, timeout=60.0, isolation_level=None)
+        self._connection.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        self._connection.close()
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(
+        self,
+        exception_type: Optional[type[BaseException]],
+        exception: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        self.close()
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        # Takes the write lock right away, so that two workers never lease the same job.
+        self._connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield self._connection
+        except BaseException:
+            self._connection.execute("ROLLBACK")
+            raise
+        self._connection.execute("COMMIT")
+
+    def enqueue(self, lines: Iterable[str]) -> int:
+        # Adds the jobs that are not in the queue yet and returns how many were added.
+        added = 0
+        with self._transaction() as connection:
+            for line in lines:
+                line = line.strip()
+                if not line:
+                    continue
+                cursor = connection.execute(
+                    "INSERT OR IGNORE INTO jobs (key, line) VALUES (?, ?)",
+                    (_job_key(line), line),
+                )
+                added += cursor.rowcount
+        return added
+
+    def lease(self, owner: str, count: int = 1) -> list[Lease]:
+        # Leases up to `count` pending jobs or jobs whose lease expired, in queue order.
+        now: Final = time.time()
+        leases: Final[list[Lease]] = []
+        with self._transaction() as connection:
+            exhausted: Final = connection.execute(
+                "SELECT number, key, attempts FROM jobs "
+                + "WHERE state = 'leased' AND lease_expires <= ? AND attempts >= ?",
+                (now, self._max_attempts),
+            ).fetchall()
+            for number, key, attempts in exhausted:
+                error = JobAttemptsExhaustedError(attempts)
+                job_id = key.removeprefix("id:") if key.startswith("id:") else str(number)
+                result = JobResult(job_id, [], error=f"{type(error).__name__}: {error}")
+                connection.execute(
+                    "UPDATE jobs SET state = 'failed', result = ?, lease_token = NULL, lease_owner = NULL, "
+                    + "lease_expires = NULL WHERE number = ?",
+                    (json.dumps(job_result_to_json(result)), number),
+                )
+            rows: Final = connection.execute(
+                "SELECT number, key, line, attempts FROM jobs "
+                + "WHERE state = 'pending' OR (state = 'leased' AND lease_expires <= ?) ORDER BY number LIMIT ?",
+                (now, count),
+            ).fetchall()
+            for number, key, line, attempts in rows:
+                token = uuid.uuid4().hex
+                connection.execute(
+                    "UPDATE jobs SET state = 'leased', attempts = ?, lease_token = ?, lease_owner = ?, "
+                    + "lease_expires = ? WHERE number = ?",
+                    (attempts + 1, token, owner, now + self._visibility_timeout, number),
+                )
+                leases.append(Lease(number, key, line, token, attempts + 1))
+        return leases
+
+    def extend(self, lease: Lease) -> bool:
+        # Extends a lease by the visibility timeout, unless it expired and the job was leased
+        # again.
+        with self._transaction() as connection:
+            cursor: Final = connection.execute(
+                "UPDATE jobs SET lease_expires = ? WHERE number = ? AND state = 'leased' AND lease_token = ?",
+                (time.time() + self._visibility_timeout, lease.number, lease.token),
+            )
+            return cursor.rowcount == 1
+
+    def release(self, lease: Lease) -> None:
+        # Gives a leased job back without counting the attempt, e.g. when a worker stops.
+        with self._transaction() as connection:
+            connection.execute(
+                "UPDATE jobs SET state = 'pending', attempts = attempts - 1, lease_token = NULL, lease_owner = NULL, "
+                + "lease_expires = NULL WHERE number = ? AND state = 'leased' AND lease_token = ?",
+                (lease.number, lease.token),
+            )
+
+    def complete(self, lease: Lease, result: str) -> bool:
+        # Stores the result line of a leased job. Returns `False` if the job already has a
+        # result, which is kept. A result replaces the error of a job that failed because its
+        # leases expired.
+        with self._transaction() as connection:
+            cursor: Final = connection.execute(
+                "UPDATE jobs SET state = 'done', result = ?, lease_token = NULL, lease_owner = NULL, "
+                + "lease_expires = NULL WHERE number = ? AND state != 'done'",
+                (result, lease.number),
+            )
+            return cursor.rowcount == 1
+
+    def counts(self) -> QueueCounts:
+        counts: Final = dict(self._connection.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall())
+        return QueueCounts(
+            counts.get("pending", 0),
+            counts.get("leased", 0),
+            counts.get("done", 0),
+            counts.get("failed", 0),
+        )
+
+    def results(self) -> Iterator[str]:
+        # The result lines of the finished and failed jobs in queue order.
+        for (result,) in self._connection.execute(
+            "SELECT result FROM jobs WHERE result IS NOT NULL ORDER BY number"
+        ).fetchall():
+            yield result
+
+
+def run_worker(
+    path: str | os.PathLike[str],
+    *,
+    runner: Optional[JsonJobRunner] = None,
+    owner: Optional[str] = None,
+    visibility_timeout: float = 300.0,
+    max_attempts: int = 3,
+    poll_interval: float = 0.25,
+) -> int:
+    # Runs the jobs of the queue at `path` one at a time with `runner` until all jobs are
+    # finished, and returns the number of results it wrote. While other workers hold the last
+    # leases, it polls for expired ones every `poll_interval` seconds.
+    runner_: Final = runner if runner is not None else JsonJobRunner()
+    owner_: Final = owner if owner is not None else default_owner()
+    completed = 0
+    with WorkQueue(path, visibility_timeout=visibility_timeout, max_attempts=max_attempts) as queue:
+        while True:
+            leases = queue.lease(owner_)
+            if not leases:
+                if queue.counts().is_finished:
+                    return completed
+                time.sleep(poll_interval)
+                continue
+            for lease in leases:
+                if queue.complete(lease, runner_((lease.number, lease.line))):
+                    completed += 1
+
+
+def run_workers(
+    path: str | os.PathLike[str],
+    *,
+    workers: Optional[int] = None,
+    runner: Optional[JsonJobRunner] = None,
+    visibility_timeout: float = 300.0,
+    max_attempts: int = 3,
+    poll_interval: float = 0.25,
+) -> QueueCounts:
+    # Runs `workers` worker processes on this machine (see `run_worker()`) until the queue is
+    # finished and returns its final counts. Like separate machines, the workers share nothing
+    # but the queue: a worker that dies leaves its lease to expire.
+    worker_count: Final = workers if workers is not None else os.process_cpu_count() or 1
+    processes: Final = [
+        multiprocessing.Process(
+            target=run_worker,
+            args=(path,),
+            kwargs={
+                "runner": runner,
+                "visibility_timeout": visibility_timeout,
+                "max_attempts": max_attempts,
+                "poll_interval": poll_interval,
+            },
+            name=f"nessi-queue-worker-{index}",
+        )
+        for index in range(worker_count)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    with WorkQueue(path, visibility_timeout=visibility_timeout, max_attempts=max_attempts) as queue:
+        return queue.counts()
@@ -0,0 +1,96 @@
+import json
+import os
+import socket
+from os import PathLike
+from typing import Final
+from typing import Optional
+from typing import Self
+from typing import final
+
+from nessi.batch import Job
+from nessi.batch import JobResult
+from nessi.batch import RunOutcome
+from nessi.batch import job_result_from_json
+from nessi.batch import job_to_json
+from nessi.program import Program
+from nessi.value import Value
+
+# The client of `nessi.worker_server`. A client holds one connection, which occupies one
+# worker of the server until the client is closed.
+
+
+@final
+class WorkerConnectionError(ConnectionError):
+    def __init__(self, path: str | PathLike[str]) -> None:
+        super().__init__(f"The worker at '{path}' closed the connection without a result.")
+
+
+@final
+class WorkerJobError(RuntimeError):
+    def __init__(self, message: str) -> None:
+        super().__init__(f"Worker could not run the job: {message}")
+
+
+@final
+class WorkerClient:
+    def __init__(self, path: str | PathLike[str], *, timeout: Optional[float] = None) -> None:
+        # `timeout` applies to connecting and to waiting for each result, in seconds.
+        self._path: Final = path
+        self._socket: Final = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._socket.settimeout(timeout)
+        try:
+            self._socket.connect(os.fspath(path))
+        except OSError:
+            self._socket.close()
+            raise
+        self._reader: Final = self._socket.makefile("r", encoding="utf-8")
+
+    def run_json(self, line: str) -> str:
+        # Sends a job line in the format of `nessi batch` and returns the result line.
+        try:
+            self._socket.sendall(f"{line.rstrip('\n')}\n".encode())
+            result = self._reader.readline()
+        except (BrokenPipeError, ConnectionResetError) as error:
+            raise WorkerConnectionError(self._path) from error
+        if not result:
+            raise WorkerConnectionError(self._path)
+        return result.rstrip("\n")
+
+    def run_job(self, job: Job) -> JobResult:
+        return job_result_from_json(json.loads(self.run_json(json.dumps(job_to_json(job)))))
+
+    def run(
+        self,
+        program: Program,
+        input_values: dict[str, Value],
+        *,
+        fuel: Optional[int] = None,
+        time_limit: Optional[float] = None,
+        max_output_bytes: Optional[int] = None,
+        memory_limit: Optional[int] = None,
+    ) -> RunOutcome:
+        # Runs the program once. Errors of the program are reported in the outcome.
+        result: Final = self.run_job(
+            Job(
+                "",
+                program,
+                [input_values],
+                fuel=fuel,
+                time_limit=time_limit,
+                max_output_bytes=max_output_bytes,
+                memory_limit=memory_limit,
+            )
+        )
+        if result.error is not None:
+            raise WorkerJobError(result.error)
+        return result.runs[0]
+
+    def close(self) -> None:
+        self._reader.close()
+        self._socket.close()
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, *_: object) -> None:
+        self.close()
@@ -0,0 +1,147 @@
+import gc
+import json
+import os
+import resource
+import signal
+import socket
+import sys
+import traceback
+from os import PathLike
+from pathlib import Path
+from typing import Final
+from typing import NoReturn
+from typing import Optional
+from typing import final
+
+from nessi.batch import ExecutionCache
+from nessi.batch import JsonJobRunner
+from nessi.program_cache import ProgramCache
+
+# A long-lived server that runs jobs for short-lived clients (see `nessi.worker_client`), so
+# that they don't pay for starting Python and importing nessi. The server preloads nessi,
+# listens on a Unix-domain socket and forks worker processes that accept connections on the
+# shared socket. On a connection, every line is a job in the JSON format of `nessi batch`,
+# and the worker answers every job with one result line, in order.
+#
+# A connection occupies its worker until the client closes it. Workers are replaced when
+# they die and once they have run `max_jobs_per_worker` jobs (checked between connections),
+# so that no state can accumulate over many runs.
+
+# Run once before forking, so that everything that is initialized on first use is shared by
+# the workers.
+_WARM_UP_JOB: Final = {
+    "program": [
+        {"kind": "Input", "target": "n", "type": "int"},
+        {"kind": "Print", "text": "{n}"},
+    ],
+    "inputs": [{"n": 1}],
+}
+
+
+@final
+class WorkerServer:
+    def __init__(
+        self,
+        path: str | PathLike[str],
+        *,
+        workers: Optional[int] = None,
+        fuel: Optional[int] = None,
+        time_limit: Optional[float] = None,
+        max_output_bytes: Optional[int] = None,
+        memory_limit: Optional[int] = None,
+        max_jobs_per_worker: Optional[int] = 1000,
+        program_cache: Optional[ProgramCache] = None,
+        run_memory_limit: Optional[int] = None,
+        execution_cache: Optional[ExecutionCache] = None,
+    ) -> None:
+        # `fuel`, `time_limit`, `max_output_bytes` and `run_memory_limit` (see
+        # `Interpreter`) are the defaults for jobs that don't specify them. `memory_limit`
+        # limits the address space of every worker in bytes.
+        # With a `program_cache` (see `nessi.program_cache`), replaced and restarted workers
+        # don't compile the loops of known programs again. With an `execution_cache`, every
+        # worker shares the runs of equivalent programs until it is replaced.
+        self._path: Final = Path(path)
+        self._worker_count: Final = workers if workers is not None else os.process_cpu_count() or 1
+        self._runner: Final = JsonJobRunner(
+            fuel=fuel,
+            time_limit=time_limit,
+            max_output_bytes=max_output_bytes,
+            memory_limit=run_memory_limit,
+            program_cache=program_cache,
+            execution_cache=execution_cache,
+        )
+        self._memory_limit: Final = memory_limit
+        self._max_jobs_per_worker: Final = max_jobs_per_worker
+
+    def serve_forever(self) -> None:
+        # Runs until the process receives SIGTERM or SIGINT.
+        self._runner((0, json.dumps(_WARM_UP_JOB)))
+        self._path.unlink(missing_ok=True)
+        listener: Final = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        listener.bind(os.fspath(self._path))
+        listener.listen(128)
+        children: Final[set[int]] = set()
+        previous_handler: Final = signal.signal(signal.SIGTERM, _exit)
+        # The preloaded objects are never collected, so the workers don't copy their pages
+        # when the garbage collector touches them.
+        gc.freeze()
+        try:
+            while True:
+                while len(children) < self._worker_count:
+                    pid = os.fork()
+                    if pid == 0:
+                        self._run_worker(listener)
+                    children.add(pid)
+                pid, _ = os.wait()
+                children.discard(pid)
+        finally:
+            for pid in children:
+                os.kill(pid, signal.SIGTERM)
+            for pid in children:
+                os.waitpid(pid, 0)
+            listener.close()
+            self._path.unlink(missing_ok=True)
+            signal.signal(signal.SIGTERM, previous_handler)
+            gc.unfreeze()
+
+    def _run_worker(self, listener: socket.socket) -> NoReturn:
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        # The server stops the workers.
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        exit_code = 0
+        try:
+            if self._memory_limit is not None:
+                resource.setrlimit(resource.RLIMIT_AS, (self._memory_limit, self._memory_limit))
+            jobs = 0
+            while self._max_jobs_per_worker is None or jobs < self._max_jobs_per_worker:
+                connection, _ = listener.accept()
+                with connection:
+                    jobs += self._serve_connection(connection)
+        except BaseException:
+            traceback.print_exc()
+            exit_code = 1
+        # Don't run the server's cleanup in the worker.
+        os._exit(exit_code)
+
+    def _serve_connection(self, connection: socket.socket) -> int:
+        # Returns the number of jobs that were run.
+        jobs = 0
+        try:
+            with (
+                connection.makefile("r", encoding="utf-8") as reader,
+                connection.makefile("w", encoding="utf-8") as writer,
+            ):
+                for line_number, line in enumerate(reader, start=1):
+                    if not line.strip():
+                        continue
+                    writer.write(self._runner((line_number, line)) + "\n")
+                    writer.flush()
+                    jobs += 1
+        except (ConnectionError, UnicodeDecodeError) as error:
+            # The client went away or sent garbage; the next client gets a fresh connection.
+            print(f"Closing connection: {error}", file=sys.stderr)
+        return jobs
+
+
+def _exit(*_: object) -> NoReturn:
+    sys.exit(0)